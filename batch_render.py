@@ -0,0 +1,202 @@
+import argparse
+import json
+import math
+import os
+import sys
+from multiprocessing import Pool
+
+import numpy as np
+import pygame
+
+from camera import Camera
+from instancing import InstancedMesh
+from mesh import Mesh
+from quaternion import Quaternion
+from render_target import RenderTarget
+from renderer import render, RenderSettings
+from scene import get_cuboid_scene, load_scene
+from vector import Vector4, Vec4
+
+DEFAULT_FPS = 30
+# Writes the raw frame stream to standard output
+STDOUT_OUTPUT = "-"
+
+# The scene of main.py is used when no scene file is given, next to this module
+CUBOID_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cuboid.txt")
+
+# Scene and render target of the current worker process, set up once in init_worker
+WORKER_STATE: dict[str, object] = {}
+
+
+class CameraKeyframe:
+    time: float
+    position: np.ndarray
+    rotation: Quaternion
+    fov: float
+
+    def __init__(self, time: float, position: np.ndarray, rotation: Quaternion, fov: float):
+        self.time = time
+        self.position = position
+        self.rotation = rotation
+        self.fov = fov
+
+
+class CameraPath:
+    # Camera poses between keyframes are interpolated, positions and fov linearly and rotations along the
+    # shorter arc. Before the first and after the last keyframe the camera stays at that keyframe
+    keyframes: list[CameraKeyframe]
+
+    def __init__(self, keyframes: list[CameraKeyframe]):
+        if not keyframes:
+            raise ValueError("A camera path needs at least one keyframe")
+        self.keyframes = sorted(keyframes, key=lambda keyframe: keyframe.time)
+
+    @staticmethod
+    def read_camera_path_from_file(filename: str) -> 'CameraPath':
+        # JSON file like {"keyframes": [{"time": 0, "position": [0, 0, 0], "orientation": [0, 0, 0], "fov": 90}]},
+        # times in seconds and orientations as the rotations in degrees around x, y and z shown by the camera info
+        with open(filename, "r") as f:
+            description = json.load(f)
+        return CameraPath([CameraKeyframe(float(keyframe["time"]),
+                                          np.array(keyframe.get("position", (0, 0, 0)), dtype=float),
+                                          Quaternion.from_euler_angles(
+                                              Vector4.from_cords(*keyframe.get("orientation", (0, 0, 0)), 1)),
+                                          float(keyframe.get("fov", Camera.STARTING_FOV_DEGREES)))
+                           for keyframe in description["keyframes"]])
+
+    def get_duration(self) -> float:
+        return self.keyframes[-1].time - self.keyframes[0].time
+
+    def get_pose(self, time: float) -> tuple[np.ndarray, Quaternion, float]:
+        times = [keyframe.time for keyframe in self.keyframes]
+        index = int(np.searchsorted(times, time, side='right'))
+        if index == 0:
+            first = self.keyframes[0]
+            return first.position, first.rotation, first.fov
+        if index == len(self.keyframes):
+            last = self.keyframes[-1]
+            return last.position, last.rotation, last.fov
+
+        previous = self.keyframes[index - 1]
+        following = self.keyframes[index]
+        t = (time - previous.time) / (following.time - previous.time)
+        return ((1 - t) * previous.position + t * following.position,
+                previous.rotation.slerp(following.rotation, t),
+                (1 - t) * previous.fov + t * following.fov)
+
+    def get_frame_times(self, fps: float) -> list[float]:
+        frame_count = math.floor(self.get_duration() * fps + 1e-9) + 1
+        return [self.keyframes[0].time + frame / fps for frame in range(frame_count)]
+
+
+def is_image_sequence(output: str) -> bool:
+    # Image sequence outputs are file name patterns formatted with the frame number, like frames/{:05d}.png
+    return "{" in output
+
+
+def get_scene(scene_filename: str = None) -> tuple[list[Mesh], list[InstancedMesh]]:
+    # Shapes of one mesh file are instances sharing its arrays instead of copies of them
+    if scene_filename is None:
+        return get_cuboid_scene(CUBOID_FILENAME, instancing=True)
+    return load_scene(scene_filename, instance_meshes=True)
+
+
+def init_worker(scene_filename: str | None, width: int, height: int, image_pattern: str | None) -> None:
+    # The scene is loaded once per worker, mesh files come from their memory-mapped binary caches whose pages
+    # are shared between the workers and never copied
+    shapes, instanced_meshes = get_scene(scene_filename)
+    WORKER_STATE["shapes"] = shapes
+    WORKER_STATE["instanced_meshes"] = instanced_meshes
+    WORKER_STATE["render_target"] = RenderTarget(width, height)
+    WORKER_STATE["image_pattern"] = image_pattern
+
+
+def render_frame(task: tuple[int, np.ndarray, Quaternion, float]) -> tuple[int, np.ndarray | None]:
+    # Renders one pose of the path. Frames of an image sequence are written by the worker, other frames are
+    # returned as (height, width, 3) arrays
+    frame, position, rotation, fov = task
+    render_target = WORKER_STATE["render_target"]
+    camera = Camera(render_target.width, render_target.height)
+    camera.set_pose(Vec4(*position.tolist(), 1), rotation, fov)
+
+    # Levels of detail kept from the last frame of this worker would make the frame depend on which frames
+    # the worker rendered before, every frame selects its levels from scratch
+    for mesh in WORKER_STATE["shapes"]:
+        mesh.lod_level = 0
+    render(camera, WORKER_STATE["shapes"], render_target, settings=RenderSettings(),
+           instanced_meshes=WORKER_STATE["instanced_meshes"])
+    if WORKER_STATE["image_pattern"] is None:
+        return frame, render_target.color_buffer.transpose(1, 0, 2).copy()
+    pygame.image.save(pygame.surfarray.make_surface(render_target.color_buffer),
+                      WORKER_STATE["image_pattern"].format(frame))
+    return frame, None
+
+
+def write_frames(frames, stream) -> None:
+    # Frames arrive in frame order
+    for frame, pixels in frames:
+        if stream is not None:
+            stream.write(pixels.tobytes())
+
+
+def render_camera_path(camera_path: CameraPath,
+                       output: str,
+                       width: int,
+                       height: int,
+                       fps: float = DEFAULT_FPS,
+                       scene_filename: str = None,
+                       workers: int = None) -> int:
+    # Renders every frame of the path into an image sequence or a raw stream of (height, width, 3) RGB frames,
+    # in frame order either way. Frames are spread over a pool of worker processes, without workers they are
+    # rendered in this process. Returns the number of frames
+    workers = workers if workers is not None else os.cpu_count()
+    tasks = []
+    for frame, time in enumerate(camera_path.get_frame_times(fps)):
+        position, rotation, fov = camera_path.get_pose(time)
+        tasks.append((frame, position, rotation, fov))
+
+    image_pattern = output if is_image_sequence(output) else None
+    if image_pattern is not None and os.path.dirname(image_pattern):
+        os.makedirs(os.path.dirname(image_pattern), exist_ok=True)
+    init_arguments = (scene_filename, width, height, image_pattern)
+    # A pool restarts workers whose initializer failed forever, so errors in the scene are raised here first
+    if workers > 0:
+        get_scene(scene_filename)
+
+    stream = None
+    if image_pattern is None:
+        stream = sys.stdout.buffer if output == STDOUT_OUTPUT else open(output, "wb")
+    try:
+        if workers > 0:
+            with Pool(workers, initializer=init_worker, initargs=init_arguments) as pool:
+                write_frames(pool.imap(render_frame, tasks), stream)
+        else:
+            init_worker(*init_arguments)
+            write_frames(map(render_frame, tasks), stream)
+    finally:
+        if stream is not None and stream is not sys.stdout.buffer:
+            stream.close()
+    return len(tasks)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Render the frames of a camera path without a display")
+    parser.add_argument("camera_path", help="JSON camera path, see CameraPath.read_camera_path_from_file")
+    parser.add_argument("output", help="image file pattern like frames/{:05d}.png, or a file for the raw RGB "
+                                       f"frame stream, {STDOUT_OUTPUT} for standard output")
+    parser.add_argument("--scene", help="JSON scene, see scene.load_scene, defaults to the scene of main.py")
+    parser.add_argument("--width", type=int, default=720)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS)
+    parser.add_argument("--workers", type=int, help="worker processes, 0 renders in this process, "
+                                                    "defaults to the number of CPUs")
+    args = parser.parse_args()
+
+    frame_count = render_camera_path(CameraPath.read_camera_path_from_file(args.camera_path), args.output,
+                                     args.width, args.height, args.fps, args.scene, args.workers)
+    print(f"{frame_count} frames of {args.width}x{args.height} written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
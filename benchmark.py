@@ -0,0 +1,287 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from camera import Camera
+from clipping import clip_triangles_in_clip_space, triangle_clip_against_plane, triangles_clip_against_plane
+from depth_buffer import DepthBuffer, DEPTH_FLOAT64, STORAGE_TYPES
+from matrix import perspective_divide
+from mesh import Mesh, NUMPY_INDEX_TYPE
+from pipeline import get_visible_triangles_in_clip_space, update_shape, draw_shape, draw_shapes_front_to_back
+from quaternion import Quaternion
+from render_target import RenderTarget
+from vector import Vector4, Vec4, NUMPY_ARRAY_TYPE
+
+STAGES = ["transform_cull", "clip", "update_shape", "draw_shape", "draw_front_to_back"]
+
+# Camera poses as sequences of Camera methods applied to a fresh camera
+CAMERA_POSES = {
+    "origin": [],
+    "back": ["move_back"] * 10,
+    "turned": ["look_right"] * 2 + ["move_front"] * 4,
+}
+
+REGRESSION_THRESHOLD = 0.1
+
+# Calls per measurement of the scalar math microbenchmark
+SCALAR_MATH_CALLS = 1000
+
+
+def get_cuboid_grid(cuboid: Mesh, columns: int, rows: int, spacing: float = 3) -> list[Mesh]:
+    colors = [(127, 0, 127), (0, 255, 0), (0, 0, 255), (127, 127, 0)]
+    shapes = []
+    for i in range(rows):
+        for j in range(columns):
+            shape = cuboid.copy()
+            shape.set_offset(Vector4.from_cords((j - columns / 2) * spacing, 0, 1 + i * spacing, 1))
+            shape.set_color(colors[(i + j) % len(colors)])
+            shapes.append(shape)
+    return shapes
+
+
+def get_height_field_mesh(size: int, extent: float = 40, height: float = 2) -> Mesh:
+    # (size x size) quads below the camera, facing it, with 2 * size^2 triangles
+    xs, zs = np.meshgrid(np.linspace(-extent / 2, extent / 2, size + 1),
+                         np.linspace(2, 2 + extent, size + 1), indexing='ij')
+    vertices = np.ones(((size + 1) * (size + 1), 4), dtype=NUMPY_ARRAY_TYPE)
+    vertices[:, 0] = xs.ravel()
+    vertices[:, 1] = height + 0.5 * np.sin(xs.ravel()) * np.cos(zs.ravel())
+    vertices[:, 2] = zs.ravel()
+
+    i, j = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    v00 = (i * (size + 1) + j).ravel()
+    v01 = v00 + 1
+    v10 = v00 + size + 1
+    v11 = v10 + 1
+    faces = np.concatenate([np.stack([v00, v01, v10], axis=1),
+                            np.stack([v10, v01, v11], axis=1)]).astype(NUMPY_INDEX_TYPE)
+    return Mesh(vertices, faces, (90, 90, 90))
+
+
+def get_scenes(cuboid: Mesh, quick: bool) -> dict[str, list[Mesh]]:
+    scenes = {
+        "cuboids_4": get_cuboid_grid(cuboid, 2, 2, spacing=5),
+        "cuboids_64": get_cuboid_grid(cuboid, 8, 8),
+        "height_field_20k": [get_height_field_mesh(100)],
+    }
+    if not quick:
+        scenes["cuboids_1024"] = get_cuboid_grid(cuboid, 32, 32)
+        scenes["cuboids_4096"] = get_cuboid_grid(cuboid, 64, 64)
+        scenes["height_field_320k"] = [get_height_field_mesh(400)]
+    return scenes
+
+
+def get_camera(pose: list[str], width: int, height: int) -> Camera:
+    camera = Camera(width, height)
+    for action in pose:
+        getattr(camera, action)()
+    return camera
+
+
+def measure(function, repeat: int) -> tuple[float, object]:
+    # Best wall time of repeat runs after one warm-up run, and the result of the last run
+    best = float("inf")
+    result = function()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def get_rate(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else 0.0
+
+
+def benchmark_scene(shapes: list[Mesh],
+                    camera: Camera,
+                    width: int,
+                    height: int,
+                    repeat: int,
+                    depth_precision: str = DEPTH_FLOAT64,
+                    clear_free_depth: bool = False) -> dict[str, dict]:
+    faces = sum(mesh.faces.shape[0] for mesh in shapes)
+
+    transform_seconds, visible = measure(
+        lambda: [get_visible_triangles_in_clip_space(camera, mesh) for mesh in shapes], repeat)
+    visible_count = sum(triangles.shape[0] for triangles in visible)
+
+    clip_seconds, clipped = measure(lambda: [clip_triangles_in_clip_space(triangles) for triangles in visible], repeat)
+    clipped_count = sum(triangles.shape[0] for triangles in clipped)
+
+    update_seconds, _ = measure(lambda: [update_shape(camera, mesh) for mesh in shapes], repeat)
+
+    projected = [perspective_divide(triangles.copy()) for triangles in clipped]
+    render_target = RenderTarget(width, height,
+                                 depth_buffer=DepthBuffer(width, height, depth_precision, clear_free_depth))
+
+    def draw_shapes():
+        render_target.clear()
+        pixel_counts = [draw_shape(render_target.color_buffer, render_target.depth_buffer, triangles, mesh.color)
+                        for mesh, triangles in zip(shapes, projected)]
+        return sum(tested for tested, _ in pixel_counts), sum(written for _, written in pixel_counts)
+
+    draw_seconds, (pixels_tested, pixels_written) = measure(draw_shapes, repeat)
+    pixels_covered = render_target.get_pixels_covered()
+
+    def draw_shapes_sorted():
+        render_target.clear()
+        return draw_shapes_front_to_back(render_target.color_buffer, render_target.depth_buffer, projected,
+                                         [mesh.color for mesh in shapes])
+
+    sorted_seconds, (sorted_pixels_tested, sorted_pixels_written) = measure(draw_shapes_sorted, repeat)
+
+    return {
+        "transform_cull": {"seconds": transform_seconds, "triangles": faces,
+                           "triangles_per_second": get_rate(faces, transform_seconds)},
+        "clip": {"seconds": clip_seconds, "triangles": visible_count, "triangles_out": clipped_count,
+                 "triangles_per_second": get_rate(visible_count, clip_seconds)},
+        "update_shape": {"seconds": update_seconds, "triangles": faces,
+                         "triangles_per_second": get_rate(faces, update_seconds)},
+        "draw_shape": {"seconds": draw_seconds, "triangles": clipped_count,
+                       "triangles_per_second": get_rate(clipped_count, draw_seconds),
+                       "pixels_tested": pixels_tested, "pixels_written": pixels_written,
+                       "pixels_per_second": get_rate(pixels_tested, draw_seconds),
+                       "overdraw": get_rate(pixels_written, pixels_covered)},
+        "draw_front_to_back": {"seconds": sorted_seconds, "triangles": clipped_count,
+                               "triangles_per_second": get_rate(clipped_count, sorted_seconds),
+                               "pixels_tested": sorted_pixels_tested, "pixels_written": sorted_pixels_written,
+                               "pixels_per_second": get_rate(sorted_pixels_tested, sorted_seconds),
+                               "overdraw": get_rate(sorted_pixels_written, pixels_covered)},
+    }
+
+
+def benchmark_scalar_math(repeat: int, calls: int = SCALAR_MATH_CALLS) -> dict[str, dict]:
+    # Per-object operations of the camera and single triangle clipping, on the NumPy-backed Vector4 and
+    # Matrix4 or a one-triangle array and on their scalar counterparts. Seconds are per call
+    rotation = Quaternion.from_euler_angles(Vec4(10, 20, 30, 1))
+    a, b = Vector4.from_cords(1, 2, 3, 1), Vector4.from_cords(-2, 0.5, 4, 1)
+    scalar_a, scalar_b = Vec4.from_vector4(a), Vec4.from_vector4(b)
+    matrix, scalar_matrix = rotation.get_rotation_matrix(), rotation.get_rotation_mat4()
+    plane_p, plane_n = Vector4.from_cords(0, 0, 2, 1), Vector4.from_cords(0, 0, 1, 1)
+    scalar_plane_p, scalar_plane_n = Vec4.from_vector4(plane_p), Vec4.from_vector4(plane_n)
+    triangle = (Vec4(0, 0, 1, 1), Vec4(1, 0, 3, 1), Vec4(0, 1, 3, 1))
+    triangle_np = np.array([[[vertex.x, vertex.y, vertex.z, vertex.w] for vertex in triangle]], dtype=NUMPY_ARRAY_TYPE)
+
+    operations = {
+        "vector_arithmetic": (lambda: Vector4.cross_product_xyz(a + b * 0.5, a - b).get_normalized_xyz(),
+                              lambda: Vec4.cross_product_xyz(scalar_a + scalar_b * 0.5,
+                                                             scalar_a - scalar_b).get_normalized_xyz()),
+        "camera_move": (lambda: a + rotation.get_rotation_matrix().multiply_by_vector(b),
+                        lambda: scalar_a + rotation.get_rotation_mat4().multiply_by_vector(scalar_b)),
+        "matrix_product": (lambda: matrix.transpose().multiply_by_matrix(matrix),
+                           lambda: scalar_matrix.transpose().multiply_by_matrix(scalar_matrix)),
+        "triangle_clip": (lambda: triangles_clip_against_plane(plane_p, plane_n, triangle_np),
+                          lambda: triangle_clip_against_plane(scalar_plane_p, scalar_plane_n, triangle)),
+    }
+
+    results = {}
+    for name, (numpy_operation, scalar_operation) in operations.items():
+        numpy_seconds, _ = measure(lambda: [numpy_operation() for _ in range(calls)], repeat)
+        scalar_seconds, _ = measure(lambda: [scalar_operation() for _ in range(calls)], repeat)
+        results[name] = {"numpy_seconds": numpy_seconds / calls, "scalar_seconds": scalar_seconds / calls,
+                         "speedup": get_rate(numpy_seconds, scalar_seconds)}
+    return results
+
+
+def print_scalar_math_result(results: dict[str, dict]) -> None:
+    print("scalar_math")
+    for name, result in results.items():
+        print(f"  {name:<20}{result['numpy_seconds'] * 1e6:10.2f} us numpy{result['scalar_seconds'] * 1e6:10.2f} us "
+              f"scalar{result['speedup']:8.1f}x")
+
+
+def run_benchmarks(width: int,
+                   height: int,
+                   repeat: int,
+                   quick: bool,
+                   scene_filter: str = None,
+                   depth_precision: str = DEPTH_FLOAT64,
+                   clear_free_depth: bool = False) -> dict:
+    cuboid = Mesh.read_mesh_from_file("cuboid.txt")
+    results = {}
+    for scene_name, shapes in get_scenes(cuboid, quick).items():
+        if scene_filter is not None and scene_filter not in scene_name:
+            continue
+        for pose_name, pose in CAMERA_POSES.items():
+            camera = get_camera(pose, width, height)
+            key = f"{scene_name}/{pose_name}"
+            results[key] = benchmark_scene(shapes, camera, width, height, repeat, depth_precision, clear_free_depth)
+            print_result(key, results[key])
+
+    scalar_math = benchmark_scalar_math(repeat)
+    print_scalar_math_result(scalar_math)
+    return {
+        "metadata": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                     "width": width, "height": height, "repeat": repeat, "depth_precision": depth_precision,
+                     "clear_free_depth": clear_free_depth},
+        "results": results,
+        "scalar_math": scalar_math,
+    }
+
+
+def print_result(key: str, result: dict[str, dict]) -> None:
+    print(key)
+    for stage in STAGES:
+        stage_result = result[stage]
+        line = (f"  {stage:<20}{stage_result['seconds'] * 1000:10.2f} ms"
+                f"{stage_result['triangles_per_second']:14.0f} tri/s")
+        if "pixels_per_second" in stage_result:
+            line += f"{stage_result['pixels_per_second']:14.0f} px/s  overdraw {stage_result['overdraw']:.2f}"
+        print(line)
+
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float) -> list[str]:
+    # Returns a description of every stage that got slower than the baseline by more than threshold
+    regressions = []
+    for key, result in results["results"].items():
+        if key not in baseline["results"]:
+            continue
+        for stage in STAGES:
+            if stage not in result or stage not in baseline["results"][key]:
+                continue
+            seconds = result[stage]["seconds"]
+            baseline_seconds = baseline["results"][key][stage]["seconds"]
+            if baseline_seconds > 0 and seconds > baseline_seconds * (1 + threshold):
+                regressions.append(f"{key} {stage}: {baseline_seconds * 1000:.2f} ms -> {seconds * 1000:.2f} ms "
+                                   f"({seconds / baseline_seconds - 1:+.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the rendering pipeline stages")
+    parser.add_argument("--output", default="bench_output.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown of a stage reported as a regression")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the fastest one is reported")
+    parser.add_argument("--width", type=int, default=720)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--quick", action="store_true", help="only run the small scenes")
+    parser.add_argument("--scene", help="only run scenes whose name contains this text")
+    parser.add_argument("--depth-precision", choices=list(STORAGE_TYPES), default=DEPTH_FLOAT64)
+    parser.add_argument("--clear-free-depth", action="store_true", help="clear the depth buffer with frame tags")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.width, args.height, args.repeat, args.quick, args.scene, args.depth_precision,
+                             args.clear_free_depth)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
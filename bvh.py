@@ -0,0 +1,110 @@
+import numpy as np
+
+from frustum import get_boxes_outside_mask, get_boxes_inside_mask
+from mesh import Mesh
+
+BVH_LEAF_SIZE = 4
+
+
+class BVHNode:
+    bounding_box_min: np.ndarray
+    bounding_box_max: np.ndarray
+    left: 'BVHNode'
+    right: 'BVHNode'
+    shape_indices: np.ndarray
+
+    def __init__(self, shape_indices: np.ndarray, left: 'BVHNode' = None, right: 'BVHNode' = None):
+        self.shape_indices = shape_indices
+        self.left = left
+        self.right = right
+
+    def is_leaf(self) -> bool:
+        return self.left is None
+
+
+class SceneBVH:
+    # Bounding volume hierarchy over the bounding boxes of the scene shapes. Call refit after
+    # moving shapes, and build a new one after adding or removing shapes
+    shapes: list[Mesh]
+    shape_boxes_min: np.ndarray
+    shape_boxes_max: np.ndarray
+    root: BVHNode
+    leaf_size: int
+
+    def __init__(self, shapes: list[Mesh], leaf_size: int = BVH_LEAF_SIZE):
+        self.shapes = shapes
+        self.leaf_size = leaf_size
+        self.shape_boxes_min, self.shape_boxes_max = self.get_shape_boxes()
+        self.root = self.build(np.arange(len(shapes)), (self.shape_boxes_min + self.shape_boxes_max) / 2)
+        self.refit_node(self.root)
+
+    def get_shape_boxes(self) -> tuple[np.ndarray, np.ndarray]:
+        if not self.shapes:
+            return np.empty((0, 3)), np.empty((0, 3))
+        return (np.array([shape.bounding_box_min for shape in self.shapes]),
+                np.array([shape.bounding_box_max for shape in self.shapes]))
+
+    def build(self, shape_indices: np.ndarray, centers: np.ndarray) -> BVHNode:
+        if shape_indices.shape[0] <= self.leaf_size:
+            return BVHNode(shape_indices)
+
+        # Median split along the axis where the box centers spread the most
+        node_centers = centers[shape_indices]
+        axis = int(np.argmax(np.ptp(node_centers, axis=0)))
+        order = np.argsort(node_centers[:, axis], kind='stable')
+        half = shape_indices.shape[0] // 2
+        return BVHNode(shape_indices,
+                       self.build(shape_indices[order[:half]], centers),
+                       self.build(shape_indices[order[half:]], centers))
+
+    def refit(self) -> None:
+        self.shape_boxes_min, self.shape_boxes_max = self.get_shape_boxes()
+        self.refit_node(self.root)
+
+    def refit_node(self, node: BVHNode) -> None:
+        if node.is_leaf():
+            if node.shape_indices.shape[0] == 0:
+                node.bounding_box_min = np.full(3, np.inf)
+                node.bounding_box_max = np.full(3, -np.inf)
+            else:
+                node.bounding_box_min = self.shape_boxes_min[node.shape_indices].min(axis=0)
+                node.bounding_box_max = self.shape_boxes_max[node.shape_indices].max(axis=0)
+            return
+
+        self.refit_node(node.left)
+        self.refit_node(node.right)
+        node.bounding_box_min = np.minimum(node.left.bounding_box_min, node.right.bounding_box_min)
+        node.bounding_box_max = np.maximum(node.left.bounding_box_max, node.right.bounding_box_max)
+
+    def get_visible_shape_indices(self, frustum_planes: np.ndarray) -> np.ndarray:
+        # Subtrees outside the frustum are skipped and subtrees inside it are taken whole without further
+        # tests, the shapes of intersected leaves are tested one by one. Indices are sorted, so shapes keep
+        # their drawing order
+        visible = []
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            if np.any(node.bounding_box_min > node.bounding_box_max):
+                # Only empty shapes below
+                continue
+            box_min = node.bounding_box_min[np.newaxis]
+            box_max = node.bounding_box_max[np.newaxis]
+            if get_boxes_outside_mask(frustum_planes, box_min, box_max)[0]:
+                continue
+            if get_boxes_inside_mask(frustum_planes, box_min, box_max)[0]:
+                visible.append(node.shape_indices)
+                continue
+            if node.is_leaf():
+                outside_mask = get_boxes_outside_mask(frustum_planes, self.shape_boxes_min[node.shape_indices],
+                                                      self.shape_boxes_max[node.shape_indices])
+                visible.append(node.shape_indices[~outside_mask])
+                continue
+            nodes.append(node.left)
+            nodes.append(node.right)
+
+        if not visible:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(visible))
+
+    def get_visible_shapes(self, frustum_planes: np.ndarray) -> list[Mesh]:
+        return [self.shapes[i] for i in self.get_visible_shape_indices(frustum_planes)]
@@ -1,21 +1,22 @@
 import math
 
-from matrix import Matrix4, get_rotation_matrix, get_translation_matrix
-from vector import Vector4
+from matrix import Matrix4, Mat4
+from quaternion import Quaternion
+from vector import Vector4, Vec4
 
 
 class Camera:
-    STARTING_POSITION = Vector4.from_cords(0, 0, 0, 1)
+    STARTING_POSITION = Vec4(0, 0, 0, 1)
     POSITION_DELTA = 0.5
-    X_POSITION_DELTA_VECTOR = Vector4.from_cords(POSITION_DELTA, 0, 0, 1)
-    Y_POSITION_DELTA_VECTOR = Vector4.from_cords(0, POSITION_DELTA, 0, 1)
-    Z_POSITION_DELTA_VECTOR = Vector4.from_cords(0, 0, POSITION_DELTA, 1)
+    X_POSITION_DELTA_VECTOR = Vec4(POSITION_DELTA, 0, 0, 1)
+    Y_POSITION_DELTA_VECTOR = Vec4(0, POSITION_DELTA, 0, 1)
+    Z_POSITION_DELTA_VECTOR = Vec4(0, 0, POSITION_DELTA, 1)
 
-    STARTING_ORIENTATION = Vector4.from_cords(0, 0, 0, 1)
+    STARTING_ORIENTATION = Vec4(0, 0, 0, 1)
     ORIENTATION_DELTA = 10
-    X_ORIENTATION_DELTA = Vector4.from_cords(ORIENTATION_DELTA, 0, 0, 1)
-    Y_ORIENTATION_DELTA = Vector4.from_cords(0, ORIENTATION_DELTA, 0, 1)
-    Z_ORIENTATION_DELTA = Vector4.from_cords(0, 0, ORIENTATION_DELTA, 1)
+    X_ORIENTATION_DELTA = Vec4(ORIENTATION_DELTA, 0, 0, 1)
+    Y_ORIENTATION_DELTA = Vec4(0, ORIENTATION_DELTA, 0, 1)
+    Z_ORIENTATION_DELTA = Vec4(0, 0, ORIENTATION_DELTA, 1)
 
     FOV_DELTA = 10
     STARTING_FOV_DEGREES = 90
@@ -26,14 +27,13 @@ class Camera:
     Z_NEAR = 0.00001
 
     fov: int
-    position: Vector4
-    orientation: Vector4
-
-    BASE_VIEW_MATRIX = Matrix4.from_list([[1, 0, 0, 0],
-                                          [0, 1, 0, 0],
-                                          [0, 0, 1, 0],
-                                          [0, 0, 0, 1]])
-    view_matrix: Matrix4
+    # Eye position in world space. Position, orientation and rotation are scalar values, so the per-event
+    # updates allocate no arrays, only the cached matrices are converted to NumPy for the batch paths
+    position: Vec4
+    # Sum of the rotations in degrees around the camera axes, only shown to the user. The rotation itself is
+    # the camera-to-world quaternion
+    orientation: Vec4
+    rotation: Quaternion
 
     screen_width: int
     screen_height: int
@@ -41,123 +41,131 @@ class Camera:
 
     delta_time: float
 
+    # Incremented on every change of the position, rotation or field of view. The view, projection and
+    # view-projection matrices are computed again only when asked for after a change
+    version: int
+    matrices_version: int
+    view_matrix: Matrix4
+    projection_matrix: Matrix4
+    view_projection_matrix: Matrix4
+
     def __init__(self, screen_width: int, screen_height: int):
         self.position = self.STARTING_POSITION.copy()
         self.orientation = self.STARTING_ORIENTATION.copy()
+        self.rotation = Quaternion.from_euler_angles(self.STARTING_ORIENTATION)
         self.fov = self.STARTING_FOV_DEGREES
         self.screen_width = screen_width
         self.screen_height = screen_height
         self.aspect_ratio = self.screen_width / self.screen_height
-        self.view_matrix = (get_rotation_matrix(self.STARTING_ORIENTATION)
-                            .multiply_by_matrix(get_translation_matrix(self.STARTING_POSITION * (-1)))
-                            .multiply_by_matrix(self.BASE_VIEW_MATRIX))
 
         self.delta_time = 1
 
+        self.version = 0
+        self.matrices_version = -1
+
     def zoom_in(self):
         self.fov -= self.FOV_DELTA * self.delta_time
         self.fov = max(self.fov, self.MIN_FOV)
+        self.version += 1
 
     def zoom_out(self):
         self.fov += self.FOV_DELTA * self.delta_time
         self.fov = min(self.fov, self.MAX_FOV)
+        self.version += 1
 
     def rotate_right(self):
-        z_orientation_delta = self.Z_ORIENTATION_DELTA * self.delta_time
-
-        self.orientation.set_offset(z_orientation_delta)
-        self.update_view_matrix(z_orientation_delta)
+        self.rotate(self.Z_ORIENTATION_DELTA * self.delta_time)
 
     def rotate_left(self):
-        z_orientation_delta = self.Z_ORIENTATION_DELTA * self.delta_time * (-1)
-
-        self.orientation.set_offset(z_orientation_delta)
-        self.update_view_matrix(z_orientation_delta)
+        self.rotate(self.Z_ORIENTATION_DELTA * self.delta_time * (-1))
 
     def look_up(self):
-        x_orientation_delta = self.X_ORIENTATION_DELTA * self.delta_time
-
-        self.orientation.set_offset(x_orientation_delta)
-        self.update_view_matrix(x_orientation_delta)
+        self.rotate(self.X_ORIENTATION_DELTA * self.delta_time)
 
     def look_down(self):
-        x_orientation_delta = self.X_ORIENTATION_DELTA * self.delta_time * (-1)
-
-        self.orientation.set_offset(x_orientation_delta)
-        self.update_view_matrix(x_orientation_delta)
+        self.rotate(self.X_ORIENTATION_DELTA * self.delta_time * (-1))
 
     def look_right(self):
-        y_orientation_delta = self.Y_ORIENTATION_DELTA * self.delta_time
-
-        self.orientation.set_offset(y_orientation_delta)
-        self.update_view_matrix(y_orientation_delta)
+        self.rotate(self.Y_ORIENTATION_DELTA * self.delta_time)
 
     def look_left(self):
-        y_orientation_delta = self.Y_ORIENTATION_DELTA * self.delta_time * (-1)
-
-        self.orientation.set_offset(y_orientation_delta)
-        self.update_view_matrix(y_orientation_delta)
+        self.rotate(self.Y_ORIENTATION_DELTA * self.delta_time * (-1))
 
     def move_right(self):
-        orientation = self.orientation * self.delta_time
-        x_orientation_delta = self.X_POSITION_DELTA_VECTOR * self.delta_time
-
-        self.position += get_rotation_matrix(orientation).multiply_by_vector(x_orientation_delta)
-        self.update_view_matrix(translation_delta=x_orientation_delta * (-1))
+        self.move(self.X_POSITION_DELTA_VECTOR * self.delta_time)
 
     def move_left(self):
-        orientation = self.orientation * self.delta_time
-        y_orientation_delta = self.X_POSITION_DELTA_VECTOR * self.delta_time
-
-        self.position -= get_rotation_matrix(orientation).multiply_by_vector(y_orientation_delta)
-        self.update_view_matrix(translation_delta=y_orientation_delta)
+        self.move(self.X_POSITION_DELTA_VECTOR * self.delta_time * (-1))
 
     def move_front(self):
-        orientation = self.orientation * self.delta_time
-        z_orientation_delta = self.Z_POSITION_DELTA_VECTOR * self.delta_time
-
-        self.position += get_rotation_matrix(orientation).multiply_by_vector(z_orientation_delta)
-        self.update_view_matrix(translation_delta=z_orientation_delta * (-1))
+        self.move(self.Z_POSITION_DELTA_VECTOR * self.delta_time)
 
     def move_back(self):
-        orientation = self.orientation * self.delta_time
-        z_orientation_delta = self.Z_POSITION_DELTA_VECTOR * self.delta_time
-
-        self.position -= get_rotation_matrix(orientation).multiply_by_vector(z_orientation_delta)
-        self.update_view_matrix(translation_delta=z_orientation_delta)
+        self.move(self.Z_POSITION_DELTA_VECTOR * self.delta_time * (-1))
 
     def move_up(self):
-        orientation = self.orientation * self.delta_time
-        y_position_delta = self.Y_POSITION_DELTA_VECTOR * self.delta_time
-
-        self.position -= get_rotation_matrix(orientation).multiply_by_vector(y_position_delta)
-        self.update_view_matrix(translation_delta=y_position_delta)
+        self.move(self.Y_POSITION_DELTA_VECTOR * self.delta_time * (-1))
 
     def move_down(self):
-        orientation = self.orientation * self.delta_time
-        y_position_delta = self.Y_POSITION_DELTA_VECTOR * self.delta_time
+        self.move(self.Y_POSITION_DELTA_VECTOR * self.delta_time)
+
+    def rotate(self, orientation_delta: Vec4):
+        # Rotates around the camera's own axes, angles in degrees
+        self.orientation = self.orientation + orientation_delta
+        self.rotation = self.rotation.multiply(Quaternion.from_euler_angles(orientation_delta))
+        self.version += 1
+
+    def move(self, translation_delta: Vec4):
+        # Moves along the camera's own axes
+        self.position = self.position + self.rotation.get_rotation_mat4().multiply_by_vector(translation_delta)
+        self.version += 1
+
+    def set_pose(self, position: Vec4, rotation: Quaternion, fov: float):
+        # Places the camera directly, like a camera path does. orientation only sums the rotations of the
+        # look and rotate methods and is left as it is
+        self.position = position.copy()
+        self.rotation = rotation.copy()
+        self.fov = fov
+        self.version += 1
+
+    def update_matrices(self):
+        if self.matrices_version == self.version:
+            return
+        # The view matrix is the inverse of the camera-to-world transform
+        inverse_rotation = self.rotation.get_rotation_mat4().transpose()
+        view_matrix = inverse_rotation.multiply_by_matrix(Mat4.from_translation(self.position * (-1)))
+        projection_matrix = self.get_perspective_projection_mat4()
+        self.view_matrix = view_matrix.to_matrix4()
+        self.projection_matrix = projection_matrix.to_matrix4()
+        self.view_projection_matrix = projection_matrix.multiply_by_matrix(view_matrix).to_matrix4()
+        self.matrices_version = self.version
+
+    def get_view_matrix(self) -> Matrix4:
+        self.update_matrices()
+        return self.view_matrix
 
-        self.position += get_rotation_matrix(orientation).multiply_by_vector(y_position_delta)
-        self.update_view_matrix(translation_delta=y_position_delta * (-1))
+    def get_projection_matrix(self) -> Matrix4:
+        self.update_matrices()
+        return self.projection_matrix
 
-    def get_view_matrix(self):
-        return self.view_matrix
+    def get_view_projection_matrix(self) -> Matrix4:
+        self.update_matrices()
+        return self.view_projection_matrix
 
-    def update_view_matrix(self, orientation_delta: Vector4 = None, translation_delta: Vector4 = None):
-        if orientation_delta is not None:
-            self.view_matrix = get_rotation_matrix(orientation_delta).transpose().multiply_by_matrix(
-                self.view_matrix)
-        if translation_delta is not None:
-            self.view_matrix = get_translation_matrix(translation_delta).multiply_by_matrix(self.view_matrix)
+    def get_eye_position(self) -> Vector4:
+        return self.position.to_vector4()
 
-    def get_perspective_projection_matrix(self):
+    def get_perspective_projection_mat4(self) -> Mat4:
         f = 1 / math.tan(math.radians(self.fov / 2))
         q = self.Z_FAR / (self.Z_FAR - self.Z_NEAR)
-        projection_matrix = Matrix4.from_list([[f / self.aspect_ratio, 0, 0, 0],
-                                               [0, f, 0, 0],
-                                               [0, 0, q, -q * self.Z_NEAR],
-                                               [0, 0, 1, 0]])
-        return projection_matrix
+        return Mat4((f / self.aspect_ratio, 0.0, 0.0, 0.0,
+                     0.0, f, 0.0, 0.0,
+                     0.0, 0.0, q, -q * self.Z_NEAR,
+                     0.0, 0.0, 1.0, 0.0))
+
+    def get_perspective_projection_matrix(self) -> Matrix4:
+        # Builds a new matrix, get_projection_matrix returns the cached one
+        return self.get_perspective_projection_mat4().to_matrix4()
 
     # https://en.wikipedia.org/wiki/Euler_angles#Conversion_to_other_orientation_representations
     # def get_rotation_matrix(self) -> Matrix4:
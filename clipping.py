@@ -1,25 +1,44 @@
-from vector import Vector4
+import numpy as np
 
+from frame_stats import FrameStats
+from vector import Vector4, Vec4
 
-def get_intersection_point_of_line_with_a_plane(plane_p: Vector4,
-                                                plane_n: Vector4,
-                                                line_start: Vector4,
-                                                line_end: Vector4):
+
+def get_vec4(vector: Vector4 | Vec4) -> Vec4:
+    return Vec4.from_vector4(vector) if isinstance(vector, Vector4) else vector
+
+
+def get_intersection_point_of_line_with_a_plane(plane_p: Vector4 | Vec4,
+                                                plane_n: Vector4 | Vec4,
+                                                line_start: Vector4 | Vec4,
+                                                line_end: Vector4 | Vec4) -> Vector4 | Vec4:
+    # Vector4 points are converted at the boundary, the result has the type of line_start
+    if isinstance(line_start, Vector4):
+        return get_intersection_point_of_line_with_a_plane(get_vec4(plane_p), get_vec4(plane_n), get_vec4(line_start),
+                                                           get_vec4(line_end)).to_vector4()
+    plane_p, plane_n, line_end = get_vec4(plane_p), get_vec4(plane_n), get_vec4(line_end)
     plane_n = plane_n.get_normalized_xyz()
 
-    plane_d = -Vector4.dot_product_xyz(plane_n, plane_p)
-    ad = Vector4.dot_product_xyz(line_start, plane_n)
-    bd = Vector4.dot_product_xyz(line_end, plane_n)
+    plane_d = -Vec4.dot_product_xyz(plane_n, plane_p)
+    ad = Vec4.dot_product_xyz(line_start, plane_n)
+    bd = Vec4.dot_product_xyz(line_end, plane_n)
     t = (-plane_d - ad) / (bd - ad)
     return line_start + (line_end - line_start) * t
 
 
-def triangle_clip_against_plane(plane_p: Vector4,
-                                plane_n: Vector4,
-                                triangle: tuple[Vector4, Vector4, Vector4]
-                                ) -> list[tuple[Vector4, Vector4, Vector4]]:
-    def get_signed_distance(point: Vector4):
-        return Vector4.dot_product_xyz(plane_n, point) - Vector4.dot_product_xyz(plane_n, plane_p)
+def triangle_clip_against_plane(plane_p: Vector4 | Vec4,
+                                plane_n: Vector4 | Vec4,
+                                triangle: tuple[Vec4, Vec4, Vec4] | tuple[Vector4, Vector4, Vector4]
+                                ) -> list[tuple[Vec4, Vec4, Vec4]] | list[tuple[Vector4, Vector4, Vector4]]:
+    # Clips a single triangle in scalar arithmetic, triangles_clip_against_plane clips arrays of them.
+    # Triangles of Vector4 points are clipped as Vec4 and returned as Vector4 again
+    if isinstance(triangle[0], Vector4):
+        return [tuple(point.to_vector4() for point in clipped)
+                for clipped in triangle_clip_against_plane(plane_p, plane_n, tuple(map(get_vec4, triangle)))]
+    plane_p, plane_n = get_vec4(plane_p), get_vec4(plane_n)
+
+    def get_signed_distance(point: Vec4):
+        return Vec4.dot_product_xyz(plane_n, point) - Vec4.dot_product_xyz(plane_n, plane_p)
 
     p0_dist = get_signed_distance(triangle[0])
     p1_dist = get_signed_distance(triangle[1])
@@ -75,3 +94,187 @@ def triangle_clip_against_plane(plane_p: Vector4,
         return [(p00, p10, p20), (p01, p11, p21)]
 
     raise Exception("Not expected to end up here")
+
+
+def get_intersection_points_of_lines_with_a_plane(plane_p: Vector4,
+                                                  plane_n: Vector4,
+                                                  lines_start: np.ndarray,
+                                                  lines_end: np.ndarray) -> np.ndarray:
+    plane_n = plane_n.get_normalized_xyz()
+    n = plane_n.vector_np[:3, 0]
+
+    plane_d = -Vector4.dot_product_xyz(plane_n, plane_p)
+    ad = (lines_start[:, :3] * n).sum(axis=1)
+    bd = (lines_end[:, :3] * n).sum(axis=1)
+    t = (-plane_d - ad) / (bd - ad)
+
+    intersection_points = lines_start.copy()
+    intersection_points[:, :3] += (lines_end[:, :3] - lines_start[:, :3]) * t[:, np.newaxis]
+    return intersection_points
+
+
+def get_intersection_points_of_lines_with_a_homogeneous_plane(lines_start: np.ndarray,
+                                                              lines_end: np.ndarray,
+                                                              start_distances: np.ndarray,
+                                                              end_distances: np.ndarray) -> np.ndarray:
+    # Distances are linear in clip space, so all components are interpolated
+    t = start_distances / (start_distances - end_distances)
+    return lines_start + (lines_end - lines_start) * t[:, np.newaxis]
+
+
+# Number of triangles produced for a triangle with 0, 1, 2 or 3 vertices inside the plane
+OUTPUT_TRIANGLES_COUNT = np.array([0, 1, 2, 1])
+
+
+def clip_triangles_by_distances(triangles: np.ndarray,
+                                distances: np.ndarray,
+                                get_intersection_points) -> np.ndarray:
+    # get_intersection_points(lines_start, lines_end, start_distances, end_distances) returns
+    # the points where each line crosses the plane, a vertex is inside when its distance is >= 0
+    inside = distances >= 0
+    inside_count = inside.sum(axis=1)
+
+    if np.all(inside_count == 3):
+        return triangles
+
+    output_count = OUTPUT_TRIANGLES_COUNT[inside_count]
+    output_offset = np.cumsum(output_count) - output_count
+    clipped_triangles = np.empty((output_count.sum(), 3, triangles.shape[2]), dtype=triangles.dtype)
+
+    # Inside points first, both groups keep their original order
+    order = np.argsort(~inside, axis=1, kind='stable')
+    sorted_triangles = np.take_along_axis(triangles, order[:, :, np.newaxis], axis=1)
+    sorted_distances = np.take_along_axis(distances, order, axis=1)
+
+    all_inside = inside_count == 3
+    clipped_triangles[output_offset[all_inside]] = triangles[all_inside]
+
+    one_inside = inside_count == 1
+    points = sorted_triangles[one_inside]
+    points_distances = sorted_distances[one_inside]
+    offset = output_offset[one_inside]
+    clipped_triangles[offset, 0] = points[:, 0]
+    clipped_triangles[offset, 1] = get_intersection_points(points[:, 0], points[:, 1],
+                                                           points_distances[:, 0], points_distances[:, 1])
+    clipped_triangles[offset, 2] = get_intersection_points(points[:, 0], points[:, 2],
+                                                           points_distances[:, 0], points_distances[:, 2])
+
+    two_inside = inside_count == 2
+    points = sorted_triangles[two_inside]
+    points_distances = sorted_distances[two_inside]
+    offset = output_offset[two_inside]
+    p20 = get_intersection_points(points[:, 0], points[:, 2], points_distances[:, 0], points_distances[:, 2])
+    p11 = get_intersection_points(points[:, 1], points[:, 2], points_distances[:, 1], points_distances[:, 2])
+    clipped_triangles[offset, 0] = points[:, 0]
+    clipped_triangles[offset, 1] = points[:, 1]
+    clipped_triangles[offset, 2] = p20
+    clipped_triangles[offset + 1, 0] = points[:, 1]
+    clipped_triangles[offset + 1, 1] = p11
+    clipped_triangles[offset + 1, 2] = p20
+
+    return clipped_triangles
+
+
+def triangles_clip_against_plane(plane_p: Vector4,
+                                 plane_n: Vector4,
+                                 triangles: np.ndarray) -> np.ndarray:
+    # Batched version of triangle_clip_against_plane over an (N, 3, 4) array,
+    # output triangles keep the order and vertex winding of the scalar version
+    n = plane_n.vector_np[:3, 0]
+    distances = (triangles[:, :, :3] * n).sum(axis=2) - Vector4.dot_product_xyz(plane_n, plane_p)
+
+    def get_intersection_points(lines_start, lines_end, start_distances, end_distances):
+        return get_intersection_points_of_lines_with_a_plane(plane_p, plane_n, lines_start, lines_end)
+
+    return clip_triangles_by_distances(triangles, distances, get_intersection_points)
+
+
+def triangles_clip_against_homogeneous_plane(plane: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    # Clips (N, 3, 4) clip-space triangles against the half-space plane . v >= 0. Components after the
+    # fourth are vertex attributes, interpolated like the position
+    return clip_triangles_by_distances(triangles, triangles[:, :, :4] @ plane,
+                                       get_intersection_points_of_lines_with_a_homogeneous_plane)
+
+
+# Half-spaces plane . v >= 0 in clip space, the side planes are widened by the guard band factor
+NEAR_PLANE = np.array([0, 0, 1, 0], dtype=float)
+GUARD_BAND = 2.0
+
+
+def get_side_planes(guard_band: float = 1.0) -> list[np.ndarray]:
+    return [np.array([1, 0, 0, guard_band], dtype=float),
+            np.array([-1, 0, 0, guard_band], dtype=float),
+            np.array([0, 1, 0, guard_band], dtype=float),
+            np.array([0, -1, 0, guard_band], dtype=float)]
+
+
+def get_outside_view_mask(triangles: np.ndarray) -> np.ndarray:
+    # Triangles with all vertices outside one of the screen edge planes can not be visible
+    outside = np.zeros(triangles.shape[0], dtype=bool)
+    for plane in get_side_planes():
+        outside |= np.all(triangles[:, :, :4] @ plane < 0, axis=1)
+    return outside
+
+
+def get_triangles_to_clip_mask(triangles: np.ndarray, guard_band: float = GUARD_BAND) -> np.ndarray:
+    to_clip = np.any(triangles[:, :, :4] @ NEAR_PLANE < 0, axis=1)
+    for plane in get_side_planes(guard_band):
+        to_clip |= np.any(triangles[:, :, :4] @ plane < 0, axis=1)
+    return to_clip
+
+
+def clip_triangles_in_clip_space(triangles: np.ndarray,
+                                 guard_band: float = GUARD_BAND,
+                                 frame_stats: FrameStats = None) -> np.ndarray:
+    # Only triangles crossing the near plane or leaving the guard band are split, triangles
+    # partially outside the screen but within the guard band are left to the rasterizer scissor
+    outside_view = get_outside_view_mask(triangles)
+    triangles = triangles[~outside_view]
+    to_clip = get_triangles_to_clip_mask(triangles, guard_band)
+
+    clipped_triangles = triangles[to_clip]
+    clipped_triangles = triangles_clip_against_homogeneous_plane(NEAR_PLANE, clipped_triangles)
+    for plane in get_side_planes(guard_band):
+        clipped_triangles = triangles_clip_against_homogeneous_plane(plane, clipped_triangles)
+
+    if frame_stats is not None:
+        frame_stats.add_clipping(int(np.count_nonzero(outside_view)), int(np.count_nonzero(to_clip)),
+                                 clipped_triangles.shape[0])
+    return np.concatenate([triangles[~to_clip], clipped_triangles])
+
+
+def clip_lines_in_clip_space(lines: np.ndarray, guard_band: float = GUARD_BAND) -> np.ndarray:
+    # Clips (N, 2, K) clip-space line segments against the near plane and the guard band, segments entirely
+    # outside one of the planes are dropped and the outside end of the others is moved onto the plane. Like
+    # triangles only the segments leaving a plane are clipped
+    planes = [NEAR_PLANE] + get_side_planes(guard_band)
+    # One bit per plane an end is outside of
+    outside = lines[:, :, :4].reshape(-1, 4) @ np.stack(planes, axis=1) < 0
+    codes = np.packbits(outside, axis=1)[:, 0].reshape(lines.shape[0], 2)
+    kept = (codes[:, 0] & codes[:, 1]) == 0
+    # Boolean indexing copies, so the input is never modified
+    lines = lines[kept]
+    to_clip = (codes[kept, 0] | codes[kept, 1]) != 0
+    if not np.any(to_clip):
+        return lines
+
+    clipped_lines = lines[to_clip]
+    for plane in planes:
+        distances = clipped_lines[:, :, :4] @ plane
+        kept = np.any(distances >= 0, axis=1)
+        clipped_lines = clipped_lines[kept]
+        distances = distances[kept]
+        for end in (0, 1):
+            crossing = distances[:, end] < 0
+            clipped_lines[crossing, end] = get_intersection_points_of_lines_with_a_homogeneous_plane(
+                clipped_lines[crossing, 1 - end], clipped_lines[crossing, end],
+                distances[crossing, 1 - end], distances[crossing, end])
+    return np.concatenate([lines[~to_clip], clipped_lines])
+
+
+def get_points_in_view_mask(points: np.ndarray) -> np.ndarray:
+    # (N, K) clip-space points in front of the near plane and inside the screen edges
+    inside = points[:, :4] @ NEAR_PLANE >= 0
+    for plane in get_side_planes():
+        inside &= points[:, :4] @ plane >= 0
+    return inside
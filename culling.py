@@ -0,0 +1,14 @@
+import numpy as np
+
+from mesh import Mesh
+from vector import Vector4
+
+
+def get_backface_culling_mask(face_normals: np.ndarray,
+                              face_points: np.ndarray,
+                              eye_position: np.ndarray) -> np.ndarray:
+    return np.einsum('ij,ij->i', face_normals, face_points - eye_position) > 0
+
+
+def get_visible_faces_mask(mesh: Mesh, eye_position: Vector4) -> np.ndarray:
+    return get_backface_culling_mask(mesh.face_normals, mesh.get_face_points(), eye_position.vector_np[:3, 0])
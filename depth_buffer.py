@@ -0,0 +1,128 @@
+import numpy as np
+
+from camera import Camera
+
+DEPTH_FLOAT64 = "float64"
+DEPTH_FLOAT32 = "float32"
+DEPTH_UINT16 = "uint16"
+# 24-bit values kept in 32-bit words
+DEPTH_UINT24 = "uint24"
+
+STORAGE_TYPES = {DEPTH_FLOAT64: np.float64, DEPTH_FLOAT32: np.float32, DEPTH_UINT16: np.uint16, DEPTH_UINT24: np.uint32}
+INTEGER_BITS = {DEPTH_UINT16: 16, DEPTH_UINT24: 24}
+
+# Frame tags wrap around after this many clear-free frames, then the tags are cleared once
+MAX_FRAME_TAG = np.iinfo(np.uint16).max
+
+
+class DepthBuffer:
+    # Depth of the nearest fragment per pixel, stored row-major and indexed [y, x] so that scanline spans are
+    # contiguous. Like the scanline rasterizer's depth buffer it has one spare row and column.
+    # Float precisions store the depth itself, integer precisions store it quantized linearly over
+    # [0, depth_range] with the largest value meaning empty. Depths are compared after quantization, so
+    # fragments nearer by less than one step tie and the earliest wins.
+    # In clear-free mode every texel carries the tag of the frame that wrote it and a full clear only starts a
+    # new frame, texels with an older tag read as empty
+    width: int
+    height: int
+    precision: str
+    depth_range: float
+    clear_free: bool
+
+    values: np.ndarray
+    empty_value: float | int
+    frame_tags: np.ndarray | None
+    frame: int
+
+    def __init__(self,
+                 width: int,
+                 height: int,
+                 precision: str = DEPTH_FLOAT64,
+                 clear_free: bool = False,
+                 depth_range: float = Camera.Z_FAR,
+                 values: np.ndarray = None):
+        if precision not in STORAGE_TYPES:
+            raise ValueError(f"Unknown depth precision {precision}, expected one of {', '.join(STORAGE_TYPES)}")
+        self.width = width
+        self.height = height
+        self.precision = precision
+        self.depth_range = depth_range
+        self.clear_free = clear_free
+
+        # Given values are used as they are, like buffers shared with other processes
+        self.empty_value = (2 ** INTEGER_BITS[precision] - 1) if precision in INTEGER_BITS else np.inf
+        self.values = (values if values is not None
+                       else np.full((height + 1, width + 1), self.empty_value, dtype=STORAGE_TYPES[precision]))
+        if self.values.shape != (height + 1, width + 1) or self.values.dtype != STORAGE_TYPES[precision]:
+            raise ValueError(f"Depth values must be a ({height + 1}, {width + 1}) {STORAGE_TYPES[precision].__name__} "
+                             f"array")
+        # Tags start below the first frame, so every texel reads as empty
+        self.frame_tags = np.zeros(self.values.shape, dtype=np.uint16) if clear_free else None
+        self.frame = 1
+
+    def clear(self, rect: tuple[int, int, int, int] = None) -> None:
+        # Clears the inclusive rectangle (min_x, min_y, max_x, max_y) or the whole buffer
+        if rect is not None:
+            min_x, min_y, max_x, max_y = rect
+            self.values[min_y:max_y + 1, min_x:max_x + 1] = self.empty_value
+            return
+        if not self.clear_free:
+            self.values.fill(self.empty_value)
+            return
+
+        self.frame += 1
+        if self.frame > MAX_FRAME_TAG:
+            self.frame_tags.fill(0)
+            self.frame = 1
+
+    def encode(self, depths: np.ndarray) -> np.ndarray:
+        if self.precision not in INTEGER_BITS:
+            return depths.astype(self.values.dtype)
+        steps = self.empty_value - 1
+        with np.errstate(invalid='ignore'):
+            quantized = np.rint(np.clip(depths / self.depth_range, 0, 1) * steps)
+        return np.where(np.isfinite(depths), quantized, self.empty_value).astype(self.values.dtype)
+
+    def decode(self, values: np.ndarray) -> np.ndarray:
+        if self.precision not in INTEGER_BITS:
+            return values.astype(np.float64, copy=False)
+        steps = self.empty_value - 1
+        return np.where(values == self.empty_value, np.inf, values * (self.depth_range / steps))
+
+    def get_flat_indices(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return ys * self.values.shape[1] + xs
+
+    def get_values(self, flat_indices: np.ndarray) -> np.ndarray:
+        values = self.values.reshape(-1)[flat_indices]
+        if self.frame_tags is None:
+            return values
+        return np.where(self.frame_tags.reshape(-1)[flat_indices] == self.frame, values, self.empty_value)
+
+    def set_values(self, flat_indices: np.ndarray, values: np.ndarray) -> None:
+        self.values.reshape(-1)[flat_indices] = values
+        if self.frame_tags is not None:
+            self.frame_tags.reshape(-1)[flat_indices] = self.frame
+
+    def write_depth(self, x: int, y: int, depth: float) -> bool:
+        # Depth test and write of a single fragment, for the per-pixel reference rasterizer
+        flat_indices = self.get_flat_indices(np.array([x]), np.array([y]))
+        encoded = self.encode(np.array([depth], dtype=np.float64))
+        if not encoded[0] < self.get_values(flat_indices)[0]:
+            return False
+        self.set_values(flat_indices, encoded)
+        return True
+
+    def get_depths(self) -> np.ndarray:
+        # (width, height) depths indexed [x, y] like the color buffer, inf where nothing was drawn. A view of the
+        # buffer when the depth is stored as it is, do not modify it
+        values = self.values[:self.height, :self.width]
+        if self.frame_tags is not None:
+            values = np.where(self.frame_tags[:self.height, :self.width] == self.frame, values, self.empty_value)
+        return self.decode(values).T
+
+    def get_covered_count(self) -> int:
+        values = self.values[:self.height, :self.width]
+        covered = values != self.empty_value
+        if self.frame_tags is not None:
+            covered &= self.frame_tags[:self.height, :self.width] == self.frame
+        return int(np.count_nonzero(covered))
@@ -1,60 +1,91 @@
+from functools import cache
+
 import numpy as np
 import pygame
 
 from camera import Camera
-from shape import Shape
+from depth_buffer import DepthBuffer, DEPTH_FLOAT32
+from frame_stats import FrameStats, FrameStatsHistory, STAGES
+from pipeline import TransformCache
+from render_target import RenderTarget
 
 SCREEN_WIDTH = 720
 SCREEN_HEIGHT = 720
 
-FONT = pygame.font.Font(pygame.font.get_default_font(), 12)
+
+@cache
+def get_font() -> pygame.font.Font:
+    # Created on first use, so importing this module does not need pygame.init()
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return pygame.font.Font(pygame.font.get_default_font(), 12)
 
 
 def draw_camera_info(camera: Camera,
-                     screen: pygame.Surface):
+                     screen: pygame.Surface) -> pygame.Rect:
+    # Returns the area of the screen drawn over
+    font = get_font()
     cx, cy, cz = camera.position.get_x(), camera.position.get_y(), camera.position.get_z()
-    text_surface_camera_position = FONT.render(f'x={cx:.2f} y={cy:.2f} z={cz:.2f}', True, [0, 0, 0])
+    text_surface_camera_position = font.render(f'x={cx:.2f} y={cy:.2f} z={cz:.2f}', True, [0, 0, 0])
     coord_text_width = text_surface_camera_position.get_width()
     coord_text_height = text_surface_camera_position.get_height()
-    screen.blit(text_surface_camera_position, dest=[screen.get_width() - coord_text_width, 0])
+    position_rect = screen.blit(text_surface_camera_position, dest=[screen.get_width() - coord_text_width, 0])
 
     o_x, o_y, o_z = camera.orientation.get_x(), camera.orientation.get_y(), camera.orientation.get_z()
-    text_surface_camera_orientation = FONT.render(f'o_x={o_x:.2f} o_y={o_y:.2f} o_z={o_z:.2f}', True,
+    text_surface_camera_orientation = font.render(f'o_x={o_x:.2f} o_y={o_y:.2f} o_z={o_z:.2f}', True,
                                                   [0, 0, 0])
     orientation_text_width = text_surface_camera_orientation.get_width()
-    screen.blit(text_surface_camera_orientation, dest=[screen.get_width() - orientation_text_width, coord_text_height])
-
-
-DEPTH_BUFFER = np.empty((SCREEN_WIDTH + 1, SCREEN_HEIGHT + 1), dtype=float)
-
-
-def draw_shape(screen: pygame.Surface, shape: Shape):
-    for triangle in shape.triangles:
-        point0, point1, point2 = triangle
-
-        x1 = (point0.get_x() + 1) * screen.get_width() / 2
-        y1 = (point0.get_y() + 1) * screen.get_height() / 2
-        z1 = point0.get_w()
-
-        x2 = (point1.get_x() + 1) * screen.get_width() / 2
-        y2 = (point1.get_y() + 1) * screen.get_height() / 2
-        z2 = point1.get_w()
-
-        x3 = (point2.get_x() + 1) * screen.get_width() / 2
-        y3 = (point2.get_y() + 1) * screen.get_height() / 2
-        z3 = point2.get_w()
-
-        draw_triangle(screen, x1, y1, z1, x2, y2, z2, x3, y3, z3, shape.color)
-        #
-        # pygame.draw.line(screen, [255, 0, 0], (x1, y1), (x2, y2))
-        #
-        # pygame.draw.line(screen, [255, 0, 0], (x2, y2), (x3, y3))
-        #
-        # pygame.draw.line(screen, [255, 0, 0], (x3, y3), (x1, y1))
-        #
-
-
-def draw_triangle(screen: pygame.Surface, x1, y1, z1, x2, y2, z2, x3, y3, z3, color: tuple[int, int, int]):
+    orientation_rect = screen.blit(text_surface_camera_orientation,
+                                   dest=[screen.get_width() - orientation_text_width, coord_text_height])
+    return position_rect.union(orientation_rect)
+
+
+def draw_performance_hud(screen: pygame.Surface,
+                         frame_stats: FrameStats,
+                         stats_history: FrameStatsHistory = None) -> pygame.Rect:
+    # Counters of the current frame, timings averaged over the history when there is one. Returns the area
+    # of the screen drawn over
+    font = get_font()
+    lines = [f'shapes submitted={frame_stats.shapes_submitted} culled={frame_stats.shapes_culled} '
+             f'occluded={frame_stats.shapes_occluded} occluders={frame_stats.occluders}',
+             f'tris submitted={frame_stats.triangles_submitted} culled={frame_stats.triangles_culled} '
+             f'rejected={frame_stats.triangles_rejected}',
+             f'tris clipped={frame_stats.triangles_clipped} generated={frame_stats.triangles_generated_by_clipping} '
+             f'rasterized={frame_stats.triangles_rasterized}',
+             f'px tested={frame_stats.pixels_tested} written={frame_stats.pixels_written} '
+             f'overdraw={frame_stats.get_overdraw_ratio():.2f} '
+             f'depth complexity={frame_stats.get_depth_complexity():.2f} '
+             f'resolution={frame_stats.render_width}x{frame_stats.render_height}']
+
+    if stats_history is not None and stats_history.frames:
+        lines.append(' '.join(f'{stage}={stats_history.get_average_stage_seconds(stage) * 1000:.1f}ms'
+                              for stage in STAGES))
+        lines.append(f'frame avg={stats_history.get_average("frame_seconds") * 1000:.1f}ms '
+                     f'p50={stats_history.get_frame_seconds_percentile(50) * 1000:.1f}ms '
+                     f'p95={stats_history.get_frame_seconds_percentile(95) * 1000:.1f}ms '
+                     f'p99={stats_history.get_frame_seconds_percentile(99) * 1000:.1f}ms')
+    else:
+        lines.append(' '.join(f'{stage}={seconds * 1000:.1f}ms'
+                              for stage, seconds in frame_stats.stage_seconds.items()))
+
+    hud_rect = pygame.Rect(0, 0, 0, 0)
+    for line in lines:
+        text_surface = font.render(line, True, [0, 0, 0], [255, 255, 255])
+        hud_rect = hud_rect.union(screen.blit(text_surface, dest=[0, hud_rect.bottom]))
+    return hud_rect
+
+
+# The depth buffer is never cleared as a whole, a new frame only advances its frame tag
+RENDER_TARGET = RenderTarget(SCREEN_WIDTH, SCREEN_HEIGHT,
+                             depth_buffer=DepthBuffer(SCREEN_WIDTH, SCREEN_HEIGHT, DEPTH_FLOAT32, clear_free=True))
+TRANSFORM_CACHE = TransformCache()
+
+
+def draw_triangle(color_buffer: np.ndarray,
+                  depth_buffer: DepthBuffer,
+                  x1, y1, z1, x2, y2, z2, x3, y3, z3,
+                  color: tuple[int, int, int]):
+    # Per-pixel scanline reference of rasterize_triangles, the color buffer is indexed [x, y]
     x1, y1, z1, x2, y2, z2, x3, y3, z3 = map(int, [x1, y1, z1, x2, y2, z2, x3, y3, z3])
 
     if y2 < y1:
@@ -70,17 +101,21 @@ def draw_triangle(screen: pygame.Surface, x1, y1, z1, x2, y2, z2, x3, y3, z3, co
         x2, x3 = x3, x2
         z2, z3 = z3, z2
 
+    # Triangles inside the clipping guard band may reach outside the screen, so rows and spans are scissored
+    max_x = depth_buffer.width - 1
+    max_y = depth_buffer.height - 1
+
     def draw_horizontal_line(y, x_start, x_end, z_start, z_end):
         if x_start > x_end:
             x_start, x_end = x_end, x_start
             z_start, z_end = z_end, z_start
         t_step = 1 / (x_end - x_start) if x_end != x_start else -1000
-        t = 0
-        for x in range(x_start, x_end + 1):
+        x_first = max(x_start, 0)
+        t = (x_first - x_start) * t_step
+        for x in range(x_first, min(x_end, max_x) + 1):
             z = (1 - t) * z_start + t * z_end
-            if z < DEPTH_BUFFER[x, y]:
-                screen.set_at((x, y), color)
-                DEPTH_BUFFER[x, y] = z
+            if depth_buffer.write_depth(x, y, z):
+                color_buffer[x, y] = color
             t += t_step
 
     dy1 = y2 - y1
@@ -97,7 +132,7 @@ def draw_triangle(screen: pygame.Surface, x1, y1, z1, x2, y2, z2, x3, y3, z3, co
     dz1_step = dz1 / abs(dy1) if dy1 != 0 else 0
     dz2_step = dz2 / abs(dy2) if dy2 != 0 else 0
 
-    for i in range(y1, y2 + 1):
+    for i in range(max(y1, 0), min(y2, max_y) + 1):
         ax = int(x1 + (i - y1) * dax_step)
         bx = int(x1 + (i - y1) * dbx_step)
 
@@ -114,7 +149,7 @@ def draw_triangle(screen: pygame.Surface, x1, y1, z1, x2, y2, z2, x3, y3, z3, co
 
     dz1_step = dz1 / abs(dy1) if dy1 != 0 else 0
 
-    for i in range(y2, y3 + 1):
+    for i in range(max(y2, 0), min(y3, max_y) + 1):
         ax = int(x2 + (i - y2) * dax_step)
         bx = int(x1 + (i - y1) * dbx_step)
 
@@ -0,0 +1,134 @@
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+STAGES = ["transform_cull", "clip", "raster", "present"]
+
+
+class FrameStats:
+    # Counters and stage timings of one frame, filled in by the pipeline while the frame is rendered
+    shapes_submitted: int
+    shapes_culled: int
+    shapes_occluded: int
+    occluders: int
+    triangles_submitted: int
+    triangles_culled: int
+    triangles_rejected: int
+    triangles_clipped: int
+    triangles_generated_by_clipping: int
+    triangles_rasterized: int
+    pixels_tested: int
+    pixels_written: int
+    pixels_covered: int
+    # Size of the render target, smaller than the screen under dynamic resolution
+    render_width: int
+    render_height: int
+    stage_seconds: dict[str, float]
+    frame_seconds: float
+
+    def __init__(self):
+        self.reset()
+
+    def __str__(self):
+        stage_times = " ".join(f'{stage}={seconds * 1000:.2f}ms' for stage, seconds in self.stage_seconds.items())
+        return (f'shapes={self.shapes_submitted} shapes_culled={self.shapes_culled} '
+                f'shapes_occluded={self.shapes_occluded} occluders={self.occluders} '
+                f'submitted={self.triangles_submitted} culled={self.triangles_culled} '
+                f'rejected={self.triangles_rejected} clipped={self.triangles_clipped} '
+                f'generated={self.triangles_generated_by_clipping} rasterized={self.triangles_rasterized} '
+                f'tested={self.pixels_tested} written={self.pixels_written} '
+                f'overdraw={self.get_overdraw_ratio():.2f} resolution={self.render_width}x{self.render_height} '
+                f'{stage_times}')
+
+    def reset(self) -> None:
+        self.shapes_submitted = 0
+        self.shapes_culled = 0
+        self.shapes_occluded = 0
+        self.occluders = 0
+        self.triangles_submitted = 0
+        self.triangles_culled = 0
+        self.triangles_rejected = 0
+        self.triangles_clipped = 0
+        self.triangles_generated_by_clipping = 0
+        self.triangles_rasterized = 0
+        self.pixels_tested = 0
+        self.pixels_written = 0
+        self.pixels_covered = 0
+        self.render_width = 0
+        self.render_height = 0
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self.frame_seconds = 0.0
+
+    def add_shape_culling(self, submitted: int, visible: int) -> None:
+        self.shapes_submitted += submitted
+        self.shapes_culled += submitted - visible
+
+    def add_occlusion_culling(self, occluded: int, occluders: int) -> None:
+        self.shapes_occluded += occluded
+        self.occluders += occluders
+
+    def add_culling(self, visible_mask: np.ndarray) -> None:
+        faces_visible = int(np.count_nonzero(visible_mask))
+        self.triangles_submitted += visible_mask.shape[0]
+        self.triangles_culled += visible_mask.shape[0] - faces_visible
+
+    def add_clipping(self, rejected: int, clipped: int, generated: int) -> None:
+        self.triangles_rejected += rejected
+        self.triangles_clipped += clipped
+        self.triangles_generated_by_clipping += generated
+
+    def add_raster(self, triangles: int, pixels_tested: int, pixels_written: int) -> None:
+        self.triangles_rasterized += triangles
+        self.pixels_tested += pixels_tested
+        self.pixels_written += pixels_written
+
+    def get_faces_visible(self) -> int:
+        return self.triangles_submitted - self.triangles_culled
+
+    def get_overdraw_ratio(self) -> float:
+        # Depth test passes per covered pixel, 1 means every pixel was written exactly once
+        return self.pixels_written / self.pixels_covered if self.pixels_covered > 0 else 0.0
+
+    def get_depth_complexity(self) -> float:
+        # Depth tests per covered pixel, early rejection of hidden spans lowers it
+        return self.pixels_tested / self.pixels_covered if self.pixels_covered > 0 else 0.0
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + time.perf_counter() - start
+
+
+def measure_stage(frame_stats: FrameStats, stage: str):
+    return frame_stats.measure(stage) if frame_stats is not None else nullcontext()
+
+
+class FrameStatsHistory:
+    # Rolling window over the stats of the last frames
+    frames: deque[FrameStats]
+
+    def __init__(self, size: int = 120):
+        self.frames = deque(maxlen=size)
+
+    def add(self, frame_stats: FrameStats) -> None:
+        self.frames.append(frame_stats)
+
+    def get_average(self, counter: str) -> float:
+        if not self.frames:
+            return 0.0
+        return sum(getattr(frame_stats, counter) for frame_stats in self.frames) / len(self.frames)
+
+    def get_average_stage_seconds(self, stage: str) -> float:
+        if not self.frames:
+            return 0.0
+        return sum(frame_stats.stage_seconds.get(stage, 0.0) for frame_stats in self.frames) / len(self.frames)
+
+    def get_frame_seconds_percentile(self, percentile: float) -> float:
+        if not self.frames:
+            return 0.0
+        return float(np.percentile([frame_stats.frame_seconds for frame_stats in self.frames], percentile))
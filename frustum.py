@@ -0,0 +1,40 @@
+import numpy as np
+
+from camera import Camera
+
+# Half-spaces plane . v >= 0 in clip space: left, right, bottom, top, near and far
+CLIP_SPACE_FRUSTUM_PLANES = np.array([[1, 0, 0, 1],
+                                      [-1, 0, 0, 1],
+                                      [0, 1, 0, 1],
+                                      [0, -1, 0, 1],
+                                      [0, 0, 1, 0],
+                                      [0, 0, -1, 1]], dtype=float)
+
+
+def get_frustum_planes(camera: Camera) -> np.ndarray:
+    # (6, 4) world-space planes (a, b, c, d) with a * x + b * y + c * z + d >= 0 inside the camera frustum,
+    # given by fov, aspect_ratio, Z_NEAR and Z_FAR through the view-projection matrix
+    view_projection_matrix = camera.get_view_projection_matrix()
+    return CLIP_SPACE_FRUSTUM_PLANES @ view_projection_matrix.matrix_np
+
+
+def get_boxes_outside_mask(planes: np.ndarray, boxes_min: np.ndarray, boxes_max: np.ndarray) -> np.ndarray:
+    # (K,) mask of the (K, 3) axis-aligned boxes lying completely behind one of the planes
+    centers = (boxes_min + boxes_max) / 2
+    extents = (boxes_max - boxes_min) / 2
+    farthest_distances = centers @ planes[:, :3].T + extents @ np.abs(planes[:, :3]).T + planes[:, 3]
+    return np.any(farthest_distances < 0, axis=1)
+
+
+def get_boxes_inside_mask(planes: np.ndarray, boxes_min: np.ndarray, boxes_max: np.ndarray) -> np.ndarray:
+    # (K,) mask of the (K, 3) axis-aligned boxes lying completely in front of all planes
+    centers = (boxes_min + boxes_max) / 2
+    extents = (boxes_max - boxes_min) / 2
+    nearest_distances = centers @ planes[:, :3].T - extents @ np.abs(planes[:, :3]).T + planes[:, 3]
+    return np.all(nearest_distances >= 0, axis=1)
+
+
+def get_spheres_outside_mask(planes: np.ndarray, centers: np.ndarray, radii: np.ndarray) -> np.ndarray:
+    normals_length = np.linalg.norm(planes[:, :3], axis=1)
+    distances = (centers @ planes[:, :3].T + planes[:, 3]) / normals_length
+    return np.any(distances < -radii[:, np.newaxis], axis=1)
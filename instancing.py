@@ -0,0 +1,50 @@
+import numpy as np
+
+from matrix import Matrix4
+from mesh import Mesh
+from vector import NUMPY_ARRAY_TYPE
+
+BOX_CORNERS = np.array([[x, y, z, 1] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=NUMPY_ARRAY_TYPE)
+
+
+class InstancedMesh:
+    # One mesh drawn many times, each instance with its own (4, 4) model matrix and color. The mesh is kept
+    # in object space and shared by all instances
+    mesh: Mesh
+    model_matrices: np.ndarray
+    colors: np.ndarray
+
+    def __init__(self, mesh: Mesh, model_matrices: np.ndarray = None, colors: np.ndarray = None):
+        self.mesh = mesh
+        self.model_matrices = (model_matrices if model_matrices is not None
+                               else np.empty((0, 4, 4), dtype=NUMPY_ARRAY_TYPE))
+        self.colors = (np.asarray(colors, dtype=np.uint8) if colors is not None
+                       else np.empty((0, 3), dtype=np.uint8))
+        if self.model_matrices.ndim != 3 or self.model_matrices.shape[1:] != (4, 4):
+            raise ValueError("Model matrices must be an (I, 4, 4) array")
+        if self.colors.shape != (self.model_matrices.shape[0], 3):
+            raise ValueError("Colors must be an (I, 3) array")
+
+    def get_instance_count(self) -> int:
+        return self.model_matrices.shape[0]
+
+    def add_instance(self, model_matrix: Matrix4, color: tuple[int, int, int]) -> None:
+        # Reallocates both arrays, build the arrays directly when placing many instances
+        self.model_matrices = np.concatenate([self.model_matrices, model_matrix.matrix_np[np.newaxis]])
+        self.colors = np.concatenate([self.colors, np.array([color], dtype=np.uint8)])
+
+    def get_bounding_boxes(self) -> tuple[np.ndarray, np.ndarray]:
+        # (I, 3) world-space boxes around the transformed bounding box of the mesh
+        if self.mesh.vertices.shape[0] == 0:
+            return (np.full((self.get_instance_count(), 3), np.inf),
+                    np.full((self.get_instance_count(), 3), -np.inf))
+        corners = BOX_CORNERS.copy()
+        corners[:, :3] = self.mesh.bounding_box_min + BOX_CORNERS[:, :3] * (self.mesh.bounding_box_max
+                                                                              - self.mesh.bounding_box_min)
+        world_corners = np.einsum('ijk,ck->icj', self.model_matrices, corners)[:, :, :3]
+        return world_corners.min(axis=1), world_corners.max(axis=1)
+
+    def get_eye_positions(self, eye_position: np.ndarray) -> np.ndarray:
+        # (I, 3) eye position in the object space of every instance
+        eye = np.append(eye_position, 1.0)
+        return np.einsum('ijk,k->ij', np.linalg.inv(self.model_matrices), eye)[:, :3]
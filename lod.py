@@ -0,0 +1,47 @@
+import math
+
+import numpy as np
+
+from camera import Camera
+from mesh import Mesh
+
+# Projected bounding sphere radius in pixels below which level k + 1 is used instead of level k
+LOD_SCREEN_RADII = [120, 60, 30, 15]
+# Relative margin around every threshold, a level only changes once the radius leaves the margin
+LOD_HYSTERESIS = 0.2
+
+
+def get_projected_radius(camera: Camera, mesh: Mesh, screen_height: int) -> float:
+    # Radius of the bounding sphere on screen in pixels, infinite when the camera is inside the sphere
+    distance = float(np.linalg.norm(mesh.bounding_sphere_center - camera.get_eye_position().vector_np[:3, 0]))
+    if distance <= mesh.bounding_sphere_radius:
+        return math.inf
+    focal_length = 1 / math.tan(math.radians(camera.fov / 2))
+    return mesh.bounding_sphere_radius / distance * focal_length * screen_height / 2
+
+
+def get_lod_level(projected_radius: float,
+                  current_level: int,
+                  level_count: int,
+                  screen_radii: list[float] = None,
+                  hysteresis: float = LOD_HYSTERESIS) -> int:
+    screen_radii = screen_radii if screen_radii is not None else LOD_SCREEN_RADII
+    max_level = min(level_count - 1, len(screen_radii))
+    level = min(current_level, max_level)
+    while level < max_level and projected_radius < screen_radii[level] * (1 - hysteresis):
+        level += 1
+    while level > 0 and projected_radius > screen_radii[level - 1] * (1 + hysteresis):
+        level -= 1
+    return level
+
+
+def select_lods(camera: Camera, shapes: list[Mesh], screen_height: int) -> list[Mesh]:
+    # Replaces every shape by its level of detail for its current size on screen and remembers the level
+    # on the shape for the hysteresis of the next frame
+    selected = []
+    for mesh in shapes:
+        if mesh.lods:
+            mesh.lod_level = get_lod_level(get_projected_radius(camera, mesh, screen_height), mesh.lod_level,
+                                           len(mesh.lods) + 1)
+        selected.append(mesh.get_lod(mesh.lod_level))
+    return selected
@@ -3,100 +3,136 @@ import pygame
 pygame.init()
 
 import sys
-from itertools import chain
-
-import numpy as np
+import time
 
+from bvh import SceneBVH
 from camera import Camera
-from clipping import triangle_clip_against_plane
-from drawing import draw_camera_info, draw_shape, SCREEN_WIDTH, SCREEN_HEIGHT, DEPTH_BUFFER
-from shape import Shape
-from vector import Vector4
-
-
-def update_shape(camera: Camera, shape: Shape) -> Shape:
-    view_matrix = camera.get_view_matrix()
-    perspective_projection_matrix = camera.get_perspective_projection_matrix()
-
-    triangles_after_view_matrix: list[tuple[Vector4, Vector4, Vector4]] = []
-    for triangle in shape.triangles:
-        updated_triangle: tuple[Vector4, Vector4, Vector4] = (view_matrix.multiply_by_vector(triangle[0]),
-                                                              view_matrix.multiply_by_vector(triangle[1]),
-                                                              view_matrix.multiply_by_vector(triangle[2]))
-        triangles_after_view_matrix.append(updated_triangle)
-
-    visible_triangles = []
-
-    for triangle_after_view_matrix in triangles_after_view_matrix:
-        edge1 = triangle_after_view_matrix[1] - triangle_after_view_matrix[0]
-        edge2 = triangle_after_view_matrix[2] - triangle_after_view_matrix[0]
-        normal = Vector4.cross_product_xyz(edge1, edge2)
-        normal = normal.get_normalized_xyz()
-
-        dot_product = Vector4.dot_product_xyz(normal, triangle_after_view_matrix[0])
-        if dot_product > 0:
-            visible_triangles.append(triangle_after_view_matrix)
-
-    clipped_triangles_z = clip_triangles_against_plane(visible_triangles,
-                                                       Vector4.from_cords(0, 0, camera.Z_NEAR, 1),
-                                                       Vector4.from_cords(0, 0, 1, 1))
-
-    triangles_after_perspective_projection = []
-    for clipped_triangle_z in clipped_triangles_z:
-        perspective_projected_triangle = (
-            perspective_projection_matrix.multiply_by_vector(clipped_triangle_z[0]),
-            perspective_projection_matrix.multiply_by_vector(clipped_triangle_z[1]),
-            perspective_projection_matrix.multiply_by_vector(clipped_triangle_z[2])
-        )
-        triangles_after_perspective_projection.append(perspective_projected_triangle)
-
-    clipped_triangles = triangles_after_perspective_projection
-    clipped_triangles = clip_triangles_against_plane(clipped_triangles,
-                                                     Vector4.from_cords(-1, 0, 0, 1),
-                                                     Vector4.from_cords(1, 0, 0, 1))
-    clipped_triangles = clip_triangles_against_plane(clipped_triangles,
-                                                     Vector4.from_cords(1, 0, 0, 1),
-                                                     Vector4.from_cords(-1, 0, 0, 1))
-    clipped_triangles = clip_triangles_against_plane(clipped_triangles,
-                                                     Vector4.from_cords(0, -1, 0, 1),
-                                                     Vector4.from_cords(0, 1, 0, 1))
-    clipped_triangles = clip_triangles_against_plane(clipped_triangles,
-                                                     Vector4.from_cords(0, 1, 0, 1),
-                                                     Vector4.from_cords(0, -1, 0, 1))
-
-    return Shape(clipped_triangles, shape.color)
-
-
-def clip_triangles_against_plane(triangles: list[tuple[Vector4, Vector4, Vector4]],
-                                 plane_p: Vector4,
-                                 plane_n: Vector4) -> list[tuple[Vector4, Vector4, Vector4]]:
-    clipped_triangles = chain.from_iterable(triangle_clip_against_plane(plane_p, plane_n, triangle)
-                                            for triangle in triangles)
-    return list(clipped_triangles)
-
-
-def draw(camera: Camera, screen: pygame.Surface, shapes: list[Shape]):
-    screen.fill((255, 255, 255))
-    DEPTH_BUFFER.fill(np.inf)
-
-    for shape in shapes:
-        shape = update_shape(camera, shape)
-        draw_shape(screen, shape)
-    draw_camera_info(camera, screen)
-    pygame.display.update()
-
-
-def continous_program_loop(camera: Camera, screen: pygame.Surface, shapes: list[Shape]):
+from drawing import draw_camera_info, draw_performance_hud, SCREEN_WIDTH, SCREEN_HEIGHT, RENDER_TARGET, \
+    TRANSFORM_CACHE
+from frame_stats import FrameStats, FrameStatsHistory, measure_stage
+from instancing import InstancedMesh
+from mesh import Mesh
+from preview import get_next_render_mode
+from render_target import RenderTarget
+from renderer import render, get_dirty_rect, RenderSettings
+from resolution import DynamicResolution
+from scene import get_cuboid_scene
+from tiled_rasterizer import TiledRasterizer
+
+
+def get_render_target(tiled_rasterizer: TiledRasterizer = None) -> RenderTarget:
+    return tiled_rasterizer.render_target if tiled_rasterizer is not None else RENDER_TARGET
+
+
+def present(camera: Camera,
+            screen: pygame.Surface,
+            render_target: RenderTarget,
+            settings: RenderSettings,
+            frame_stats: FrameStats,
+            stats_history: FrameStatsHistory = None,
+            rects: list[pygame.Rect] = None,
+            overlay_rects: list[pygame.Rect] = None) -> None:
+    # Copies the frame, or only the given rectangles of it, to the screen and draws the overlays on top.
+    # overlay_rects holds the areas the overlays were drawn over and is updated in place, they are copied
+    # again as well so that overlays that shrank or were hidden leave nothing behind. Frames rendered at a
+    # lower resolution are stretched over the whole screen
+    if render_target.width != screen.get_width() or render_target.height != screen.get_height():
+        pygame.transform.scale(pygame.surfarray.make_surface(render_target.color_buffer), screen.get_size(), screen)
+        rects = None
+    elif rects is None:
+        pygame.surfarray.blit_array(screen, render_target.color_buffer)
+    else:
+        rects = [rect.clip(screen.get_rect()) for rect in rects + (overlay_rects if overlay_rects is not None else [])]
+        for rect in rects:
+            if rect.width > 0 and rect.height > 0:
+                pygame.surfarray.blit_array(screen.subsurface(rect),
+                                            render_target.color_buffer[rect.left:rect.right, rect.top:rect.bottom])
+
+    new_overlay_rects = [draw_camera_info(camera, screen)]
+    if settings.show_hud:
+        new_overlay_rects.append(draw_performance_hud(screen, frame_stats, stats_history))
+
+    if rects is None:
+        pygame.display.update()
+    else:
+        pygame.display.update(rects + new_overlay_rects)
+    if overlay_rects is not None:
+        overlay_rects[:] = new_overlay_rects
+
+
+def draw(camera: Camera,
+         screen: pygame.Surface,
+         shapes: list[Mesh],
+         settings: RenderSettings = None,
+         tiled_rasterizer: TiledRasterizer = None,
+         stats_history: FrameStatsHistory = None,
+         scene_bvh: SceneBVH = None,
+         instanced_meshes: list[InstancedMesh] = None,
+         dirty_rect: tuple[int, int, int, int] = None,
+         overlay_rects: list[pygame.Rect] = None,
+         render_target: RenderTarget = None) -> FrameStats:
+    # With a dirty rectangle only that part of the frame is rendered again and presented. The frame is rendered
+    # into the given render target when there is one, without a tiled rasterizer it may be smaller than the screen
+    settings = settings if settings is not None else RenderSettings()
+    frame_stats = FrameStats()
+    frame_start = time.perf_counter()
+
+    render_target = render_target if render_target is not None else get_render_target(tiled_rasterizer)
+    render_target = render(camera, shapes, render_target, frame_stats, tiled_rasterizer,
+                           settings, scene_bvh=scene_bvh, instanced_meshes=instanced_meshes, dirty_rect=dirty_rect,
+                           transform_cache=TRANSFORM_CACHE)
+    with measure_stage(frame_stats, "present"):
+        rects = None
+        if dirty_rect is not None and tiled_rasterizer is None:
+            min_x, min_y, max_x, max_y = dirty_rect
+            rects = [pygame.Rect(min_x, min_y, max_x - min_x + 1, max_y - min_y + 1)]
+        present(camera, screen, render_target, settings, frame_stats, stats_history, rects, overlay_rects)
+
+    frame_stats.frame_seconds = time.perf_counter() - frame_start
+    if stats_history is not None:
+        stats_history.add(frame_stats)
+    return frame_stats
+
+
+def continous_program_loop(camera: Camera,
+                           screen: pygame.Surface,
+                           shapes: list[Mesh],
+                           tiled_rasterizer: TiledRasterizer = None,
+                           scene_bvh: SceneBVH = None,
+                           instanced_meshes: list[InstancedMesh] = None):
+    # The render resolution follows the frame times, the tiled rasterizer always renders at the full resolution
     clock = pygame.time.Clock()
     fps = 60
     delta_time = 0
+    stats_history = FrameStatsHistory()
+    settings = RenderSettings()
+    dynamic_resolution = DynamicResolution(SCREEN_WIDTH, SCREEN_HEIGHT, 1 / fps) if tiled_rasterizer is None else None
+
+    def draw_frame() -> None:
+        render_target = dynamic_resolution.get_render_target() if dynamic_resolution is not None else None
+        frame_stats = draw(camera, screen, shapes, settings, tiled_rasterizer, stats_history, scene_bvh,
+                           instanced_meshes, render_target=render_target)
+        if dynamic_resolution is not None:
+            dynamic_resolution.add_frame_time(frame_stats.frame_seconds)
 
     running = True
-    draw(camera, screen, shapes)
+    draw_frame()
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+                settings.show_hud = not settings.show_hud
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_o:
+                settings.front_to_back = not settings.front_to_back
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_i:
+                settings.occlusion_culling = not settings.occlusion_culling
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_l:
+                settings.level_of_detail = not settings.level_of_detail
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                settings.subpixel_rasterization = not settings.subpixel_rasterization
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_m:
+                settings.render_mode = get_next_render_mode(settings.render_mode)
 
         keys = pygame.key.get_pressed()
 
@@ -132,7 +168,7 @@ def continous_program_loop(camera: Camera, screen: pygame.Surface, shapes: list[
         if keys[pygame.K_c]:
             camera.zoom_out()
 
-        draw(camera, screen, shapes)
+        draw_frame()
 
         delta_time = clock.tick(fps) / 100
 
@@ -140,8 +176,19 @@ def continous_program_loop(camera: Camera, screen: pygame.Surface, shapes: list[
     sys.exit()
 
 
-def event_based_program_loop(camera: Camera, screen: pygame.Surface, shapes: list[Shape]):
-    draw(camera, screen, shapes)
+def event_based_program_loop(camera: Camera,
+                             screen: pygame.Surface,
+                             shapes: list[Mesh],
+                             tiled_rasterizer: TiledRasterizer = None,
+                             scene_bvh: SceneBVH = None,
+                             instanced_meshes: list[InstancedMesh] = None):
+    # Camera keys redraw the whole frame, other keys redraw only what they change or nothing at all
+    stats_history = FrameStatsHistory()
+    settings = RenderSettings()
+    overlay_rects = []
+
+    frame_stats = draw(camera, screen, shapes, settings, tiled_rasterizer, stats_history, scene_bvh, instanced_meshes,
+                       overlay_rects=overlay_rects)
     while True:
         events = pygame.event.get()
         for event in events:
@@ -181,41 +228,65 @@ def event_based_program_loop(camera: Camera, screen: pygame.Surface, shapes: lis
                     case pygame.K_c:
                         camera.zoom_out()
 
-                    case _:
+                    case pygame.K_h:
+                        # The frame itself is unchanged, only the overlays are drawn again
+                        settings.show_hud = not settings.show_hud
+                        present(camera, screen, get_render_target(tiled_rasterizer), settings, frame_stats,
+                                stats_history, [], overlay_rects)
                         continue
-                draw(camera, screen, shapes)
-
-
-def main(is_continous: bool = False) -> None:
-    cuboid = Shape.read_shape_from_file("cuboid.txt")
+                    case pygame.K_o:
+                        # Same image, only the statistics on the HUD change
+                        settings.front_to_back = not settings.front_to_back
+                        if not settings.show_hud:
+                            continue
+                    case pygame.K_i:
+                        settings.occlusion_culling = not settings.occlusion_culling
+                        if not settings.show_hud:
+                            continue
+                    case pygame.K_l:
+                        # Only shapes with levels of detail can change
+                        settings.level_of_detail = not settings.level_of_detail
+                        dirty_rect = get_dirty_rect(camera, get_render_target(tiled_rasterizer),
+                                                    [shape for shape in shapes if shape.lods])
+                        if dirty_rect is not None:
+                            frame_stats = draw(camera, screen, shapes, settings, tiled_rasterizer, stats_history,
+                                               scene_bvh, instanced_meshes, dirty_rect, overlay_rects)
+                        continue
+                    case pygame.K_p:
+                        settings.subpixel_rasterization = not settings.subpixel_rasterization
+                    case pygame.K_m:
+                        # Filled, wireframe and point cloud in turn
+                        settings.render_mode = get_next_render_mode(settings.render_mode)
 
-    offsets = [Vector4.from_cords(1, 0, 1, 1),
-               Vector4.from_cords(-4, 0, 1, 1),
-               Vector4.from_cords(1, 0, 5, 1),
-               Vector4.from_cords(-4, 0, 5, 1)]
+                    case _:
+                        continue
+                frame_stats = draw(camera, screen, shapes, settings, tiled_rasterizer, stats_history, scene_bvh,
+                                   instanced_meshes, overlay_rects=overlay_rects)
 
-    shapes = []
-    for os in offsets:
-        shape = cuboid.copy()
-        shape.set_offset(os)
-        shapes.append(shape)
 
-    colors = [(127, 0, 127),
-              (0, 255, 0),
-              (0, 0, 255),
-              (127, 127, 0)]
-    for i, color in enumerate(colors):
-        shapes[i].set_color(color)
+def main(is_continous: bool = False, rasterizer_workers: int = 0, instancing: bool = False) -> None:
+    # With instancing the cuboids are drawn as instances of one mesh, which only the frustum culling applies to
+    shapes, instanced_meshes = get_cuboid_scene(instancing=instancing)
+    scene_bvh = SceneBVH(shapes) if shapes else None
 
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Hello world")
 
     camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
 
-    if is_continous:
-        continous_program_loop(camera, screen, shapes)
-    else:
-        event_based_program_loop(camera, screen, shapes)
+    # With rasterizer_workers > 0 tiles are rasterized in parallel by that many worker processes
+    tiled_rasterizer = None
+    if rasterizer_workers > 0:
+        tiled_rasterizer = TiledRasterizer(SCREEN_WIDTH, SCREEN_HEIGHT, workers=rasterizer_workers)
+
+    try:
+        if is_continous:
+            continous_program_loop(camera, screen, shapes, tiled_rasterizer, scene_bvh, instanced_meshes)
+        else:
+            event_based_program_loop(camera, screen, shapes, tiled_rasterizer, scene_bvh, instanced_meshes)
+    finally:
+        if tiled_rasterizer is not None:
+            tiled_rasterizer.close()
 
 
 if __name__ == "__main__":
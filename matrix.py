@@ -3,7 +3,7 @@ from math import sin, cos
 
 import numpy as np
 
-from vector import Vector4, NUMPY_ARRAY_TYPE
+from vector import Vector4, Vec4, NUMPY_ARRAY_TYPE
 
 
 class Matrix4:
@@ -31,6 +31,12 @@ class Matrix4:
             result.vector_np[:3] /= result.get_w()
         return result
 
+    def multiply_by_vectors(self, vectors_np: np.ndarray, divide_by_w: bool = True) -> np.ndarray:
+        result = vectors_np @ self.matrix_np.T
+        if divide_by_w:
+            perspective_divide(result)
+        return result
+
     def get_column(self, j: int) -> Vector4:
         return Vector4(self.matrix_np[:, j].reshape(-1, 1))
 
@@ -44,6 +50,88 @@ class Matrix4:
         self.matrix_np[i, j] = value
 
 
+class Mat4:
+    # Scalar counterpart of Matrix4 for per-object math, 16 floats in row-major order. Products return new
+    # matrices. Conversions to and from NumPy are explicit and only needed at the edge of batch paths
+    __slots__ = ("m",)
+    m: tuple[float, ...]
+
+    def __init__(self, m: tuple[float, ...]):
+        if len(m) != 16:
+            raise ValueError
+        self.m = m
+
+    def __str__(self):
+        return str(self.to_numpy())
+
+    @staticmethod
+    def from_translation(translation: Vec4) -> 'Mat4':
+        return Mat4((1.0, 0.0, 0.0, translation.x,
+                     0.0, 1.0, 0.0, translation.y,
+                     0.0, 0.0, 1.0, translation.z,
+                     0.0, 0.0, 0.0, 1.0))
+
+    @staticmethod
+    def from_numpy(matrix_np: np.ndarray) -> 'Mat4':
+        return Mat4(tuple(matrix_np.reshape(16).tolist()))
+
+    @staticmethod
+    def from_matrix4(matrix: Matrix4) -> 'Mat4':
+        return Mat4.from_numpy(matrix.matrix_np)
+
+    def to_numpy(self) -> np.ndarray:
+        return np.array(self.m, dtype=NUMPY_ARRAY_TYPE).reshape(4, 4)
+
+    def to_matrix4(self) -> Matrix4:
+        return Matrix4(self.to_numpy())
+
+    def multiply_by_matrix(self, matrix: 'Mat4') -> 'Mat4':
+        a00, a01, a02, a03, a10, a11, a12, a13, a20, a21, a22, a23, a30, a31, a32, a33 = self.m
+        b00, b01, b02, b03, b10, b11, b12, b13, b20, b21, b22, b23, b30, b31, b32, b33 = matrix.m
+        return Mat4((a00 * b00 + a01 * b10 + a02 * b20 + a03 * b30,
+                     a00 * b01 + a01 * b11 + a02 * b21 + a03 * b31,
+                     a00 * b02 + a01 * b12 + a02 * b22 + a03 * b32,
+                     a00 * b03 + a01 * b13 + a02 * b23 + a03 * b33,
+                     a10 * b00 + a11 * b10 + a12 * b20 + a13 * b30,
+                     a10 * b01 + a11 * b11 + a12 * b21 + a13 * b31,
+                     a10 * b02 + a11 * b12 + a12 * b22 + a13 * b32,
+                     a10 * b03 + a11 * b13 + a12 * b23 + a13 * b33,
+                     a20 * b00 + a21 * b10 + a22 * b20 + a23 * b30,
+                     a20 * b01 + a21 * b11 + a22 * b21 + a23 * b31,
+                     a20 * b02 + a21 * b12 + a22 * b22 + a23 * b32,
+                     a20 * b03 + a21 * b13 + a22 * b23 + a23 * b33,
+                     a30 * b00 + a31 * b10 + a32 * b20 + a33 * b30,
+                     a30 * b01 + a31 * b11 + a32 * b21 + a33 * b31,
+                     a30 * b02 + a31 * b12 + a32 * b22 + a33 * b32,
+                     a30 * b03 + a31 * b13 + a32 * b23 + a33 * b33))
+
+    def multiply_by_vector(self, vector: Vec4) -> Vec4:
+        # Same rule as Matrix4.multiply_by_vector: xyz are divided by w unless it is 0
+        m = self.m
+        x, y, z, w = vector.x, vector.y, vector.z, vector.w
+        rx = m[0] * x + m[1] * y + m[2] * z + m[3] * w
+        ry = m[4] * x + m[5] * y + m[6] * z + m[7] * w
+        rz = m[8] * x + m[9] * y + m[10] * z + m[11] * w
+        rw = m[12] * x + m[13] * y + m[14] * z + m[15] * w
+        if rw != 0:
+            return Vec4(rx / rw, ry / rw, rz / rw, rw)
+        return Vec4(rx, ry, rz, rw)
+
+    def transpose(self) -> 'Mat4':
+        m = self.m
+        return Mat4((m[0], m[4], m[8], m[12],
+                     m[1], m[5], m[9], m[13],
+                     m[2], m[6], m[10], m[14],
+                     m[3], m[7], m[11], m[15]))
+
+
+def perspective_divide(vectors_np: np.ndarray) -> np.ndarray:
+    # Same rule as multiply_by_vector: vectors with w == 0 keep their xyz untouched
+    w = vectors_np[..., 3:]
+    np.divide(vectors_np[..., :3], w, out=vectors_np[..., :3], where=w != 0)
+    return vectors_np
+
+
 def get_rotation_matrix_over_x(orientation_x_angle: int):
     o_x = math.radians(orientation_x_angle)
     s_x = sin(o_x)
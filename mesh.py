@@ -0,0 +1,157 @@
+import numpy as np
+
+from shape import Shape
+from vector import Vector4, NUMPY_ARRAY_TYPE
+
+NUMPY_INDEX_TYPE = np.int64
+
+
+class Mesh:
+    vertices: np.ndarray
+    faces: np.ndarray
+    face_normals: np.ndarray
+    color: tuple[int, int, int]
+    # Unique (E, 2) vertex index pairs of the face edges, extracted on first use for the wireframe mode
+    edges: np.ndarray | None
+
+    bounding_box_min: np.ndarray
+    bounding_box_max: np.ndarray
+    bounding_sphere_center: np.ndarray
+    bounding_sphere_radius: float
+
+    # Coarser versions of the mesh, lods[k - 1] is level k, and the level selected in the last frame
+    lods: list['Mesh']
+    lod_level: int
+
+    # Incremented whenever the vertices move, transformed triangles of an older version are outdated
+    version: int
+
+    def __init__(self,
+                 vertices: np.ndarray,
+                 faces: np.ndarray,
+                 color: tuple[int, int, int],
+                 face_normals: np.ndarray = None):
+        if vertices.ndim != 2 or vertices.shape[1] != 4:
+            raise ValueError("Vertices must be an (V, 4) array")
+        if faces.ndim != 2 or faces.shape[1] != 3:
+            raise ValueError("Faces must be an (F, 3) array")
+        self.vertices = vertices
+        self.faces = faces
+        self.color = color
+        if face_normals is None:
+            self.update_face_normals()
+        else:
+            self.face_normals = face_normals
+        self.edges = None
+        self.version = 0
+        self.update_bounds()
+        self.lods = []
+        self.lod_level = 0
+
+    def copy(self) -> 'Mesh':
+        # Faces and face normals are never modified in place, so copies can share them
+        mesh = Mesh(self.vertices.copy(), self.faces, self.color, self.face_normals)
+        mesh.edges = self.edges
+        mesh.lods = [lod.copy() for lod in self.lods]
+        mesh.lod_level = self.lod_level
+        return mesh
+
+    def get_lod(self, level: int) -> 'Mesh':
+        return self if level == 0 else self.lods[level - 1]
+
+    def update_bounds(self) -> None:
+        # World-space bounding box and sphere, recompute after modifying vertices other than by set_offset
+        self.version += 1
+        if self.vertices.shape[0] == 0:
+            self.bounding_box_min = np.full(3, np.inf)
+            self.bounding_box_max = np.full(3, -np.inf)
+            self.bounding_sphere_center = np.zeros(3)
+            self.bounding_sphere_radius = -np.inf
+            return
+
+        self.bounding_box_min = self.vertices[:, :3].min(axis=0)
+        self.bounding_box_max = self.vertices[:, :3].max(axis=0)
+        self.bounding_sphere_center = (self.bounding_box_min + self.bounding_box_max) / 2
+        self.bounding_sphere_radius = float(np.sqrt(
+            ((self.vertices[:, :3] - self.bounding_sphere_center) ** 2).sum(axis=1).max()))
+
+    def update_face_normals(self) -> None:
+        # Object-space normals, recompute after modifying vertices other than by set_offset
+        triangles = self.get_triangles()
+        edge1 = triangles[:, 1, :3] - triangles[:, 0, :3]
+        edge2 = triangles[:, 2, :3] - triangles[:, 0, :3]
+        self.face_normals = np.cross(edge1, edge2)
+
+    def get_edges(self) -> np.ndarray:
+        if self.edges is None:
+            edges = self.faces[:, [[0, 1], [1, 2], [2, 0]]].reshape(-1, 2)
+            self.edges = np.unique(np.sort(edges, axis=1), axis=0)
+        return self.edges
+
+    def get_face_points(self) -> np.ndarray:
+        return self.vertices[self.faces[:, 0], :3]
+
+    def set_offset(self, offset: Vector4) -> None:
+        # Translation keeps face normals unchanged and moves the bounds along
+        self.vertices[:, :3] += offset.vector_np[:3, 0]
+        self.bounding_box_min = self.bounding_box_min + offset.vector_np[:3, 0]
+        self.bounding_box_max = self.bounding_box_max + offset.vector_np[:3, 0]
+        self.bounding_sphere_center = self.bounding_sphere_center + offset.vector_np[:3, 0]
+        self.version += 1
+        for lod in self.lods:
+            lod.set_offset(offset)
+
+    def set_color(self, color: tuple[int, int, int]) -> None:
+        self.color = color
+        for lod in self.lods:
+            lod.set_color(color)
+
+    def get_triangles(self) -> np.ndarray:
+        return self.vertices[self.faces]
+
+    def to_shape(self) -> Shape:
+        return Shape([(Vector4(self.vertices[i0].reshape(-1, 1).copy()),
+                       Vector4(self.vertices[i1].reshape(-1, 1).copy()),
+                       Vector4(self.vertices[i2].reshape(-1, 1).copy())) for i0, i1, i2 in self.faces],
+                     self.color)
+
+    @staticmethod
+    def from_shape(shape: Shape) -> 'Mesh':
+        if len(shape.triangles) == 0:
+            return Mesh(np.empty((0, 4), dtype=NUMPY_ARRAY_TYPE), np.empty((0, 3), dtype=NUMPY_INDEX_TYPE),
+                        shape.color)
+
+        points = shape.get_triangles_np().reshape(-1, 4)
+        vertices, inverse = np.unique(points, axis=0, return_inverse=True)
+        faces = inverse.reshape(-1, 3).astype(NUMPY_INDEX_TYPE)
+        return Mesh(vertices, faces, shape.color)
+
+    @staticmethod
+    def read_mesh_from_file(filename: str) -> 'Mesh':
+        with open(filename, "r") as f:
+            num_of_points = int(f.readline())
+            point_indices = {}
+            vertices = np.ones((num_of_points, 4), dtype=NUMPY_ARRAY_TYPE)
+
+            for i in range(num_of_points):
+                args = f.readline().strip().split()
+                point_indices[args[0]] = i
+                vertices[i, :3] = [float(x) for x in args[1:4]]
+
+            num_of_lines = int(f.readline())
+            faces = np.empty((num_of_lines, 3), dtype=NUMPY_INDEX_TYPE)
+            for i in range(num_of_lines):
+                args = f.readline().strip().split()
+                faces[i] = [point_indices[args[0]], point_indices[args[1]], point_indices[args[2]]]
+
+            return Mesh(vertices, faces, color=(0, 0, 0))
+
+    def write_mesh_to_file(self, filename: str) -> None:
+        # Same format as read_mesh_from_file, points are named by their index
+        with open(filename, "w") as f:
+            f.write(f"{self.vertices.shape[0]}\n")
+            for i, (x, y, z) in enumerate(self.vertices[:, :3]):
+                f.write(f"{i} {float(x)!r} {float(y)!r} {float(z)!r}\n")
+            f.write(f"{self.faces.shape[0]}\n")
+            for i0, i1, i2 in self.faces:
+                f.write(f"{i0} {i1} {i2}\n")
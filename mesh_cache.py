@@ -0,0 +1,119 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from mesh import Mesh
+
+# Binary mesh file: a HEADER_SIZE bytes header followed by the (V, 4) little-endian float64 vertex buffer
+# and the (F, 3) little-endian int64 index buffer. Both buffers are used in place through memory maps
+MESH_MAGIC = b"MESH"
+MESH_FORMAT_VERSION = 1
+HEADER_SIZE = 64
+HEADER_TYPE = np.dtype([("magic", "S4"), ("version", "<u4"), ("vertex_count", "<u8"), ("face_count", "<u8")])
+VERTEX_TYPE = np.dtype("<f8")
+INDEX_TYPE = np.dtype("<i8")
+
+BINARY_MESH_EXTENSION = ".mesh"
+
+
+def get_binary_mesh_filename(filename: str) -> str:
+    return os.path.splitext(filename)[0] + BINARY_MESH_EXTENSION
+
+
+def write_binary_mesh(mesh: Mesh, filename: str) -> None:
+    # Written next to the target and renamed, readers never see a partial file
+    header = np.zeros(1, dtype=HEADER_TYPE)
+    header["magic"] = MESH_MAGIC
+    header["version"] = MESH_FORMAT_VERSION
+    header["vertex_count"] = mesh.vertices.shape[0]
+    header["face_count"] = mesh.faces.shape[0]
+
+    temporary_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(temporary_filename, "wb") as f:
+        f.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+        f.write(np.ascontiguousarray(mesh.vertices, dtype=VERTEX_TYPE).tobytes())
+        f.write(np.ascontiguousarray(mesh.faces, dtype=INDEX_TYPE).tobytes())
+    os.replace(temporary_filename, filename)
+
+
+def get_binary_mesh_buffers(filename: str) -> tuple[np.ndarray, np.ndarray]:
+    # (V, 4) vertex and (F, 3) index buffers mapping the file copy-on-write, nothing is read until used
+    header = np.fromfile(filename, dtype=HEADER_TYPE, count=1)
+    if header.shape[0] == 0 or header["magic"][0] != MESH_MAGIC:
+        raise ValueError(f"{filename} is not a binary mesh file")
+    if header["version"][0] != MESH_FORMAT_VERSION:
+        raise ValueError(f"{filename} has unsupported mesh format version {header['version'][0]}")
+
+    vertex_count = int(header["vertex_count"][0])
+    face_count = int(header["face_count"][0])
+    expected_size = HEADER_SIZE + vertex_count * 4 * VERTEX_TYPE.itemsize + face_count * 3 * INDEX_TYPE.itemsize
+    if os.path.getsize(filename) != expected_size:
+        raise ValueError(f"{filename} is truncated or corrupted")
+
+    # numpy.memmap can not map zero bytes
+    if vertex_count == 0:
+        vertices = np.empty((0, 4), dtype=VERTEX_TYPE)
+    else:
+        vertices = np.memmap(filename, dtype=VERTEX_TYPE, mode="c", offset=HEADER_SIZE, shape=(vertex_count, 4))
+    if face_count == 0:
+        faces = np.empty((0, 3), dtype=INDEX_TYPE)
+    else:
+        faces = np.memmap(filename, dtype=INDEX_TYPE, mode="c",
+                          offset=HEADER_SIZE + vertex_count * 4 * VERTEX_TYPE.itemsize, shape=(face_count, 3))
+    return vertices, faces
+
+
+def read_binary_mesh(filename: str) -> Mesh:
+    # The buffers map the file copy-on-write, set_offset changes the mesh in memory and never the file
+    vertices, faces = get_binary_mesh_buffers(filename)
+    return Mesh(vertices, faces, color=(0, 0, 0))
+
+
+def convert_mesh_file(filename: str, binary_filename: str = None) -> str:
+    # Converts a text mesh file in the format of cuboid.txt, returns the name of the binary file
+    binary_filename = binary_filename if binary_filename is not None else get_binary_mesh_filename(filename)
+    write_binary_mesh(Mesh.read_mesh_from_file(filename), binary_filename)
+    return binary_filename
+
+
+def is_binary_mesh_outdated(filename: str, binary_filename: str) -> bool:
+    return (not os.path.exists(binary_filename)
+            or os.path.getmtime(binary_filename) < os.path.getmtime(filename))
+
+
+def load_mesh(filename: str) -> Mesh:
+    # Loads a text mesh file through its binary cache, which is rebuilt when missing, older than the text file
+    # or unreadable. Without write access to the cache the text file is parsed directly
+    binary_filename = get_binary_mesh_filename(filename)
+    if not is_binary_mesh_outdated(filename, binary_filename):
+        try:
+            return read_binary_mesh(binary_filename)
+        except ValueError:
+            # Truncated, corrupted or of another format version, the cache is built again
+            try:
+                os.remove(binary_filename)
+            except OSError:
+                pass
+    try:
+        convert_mesh_file(filename, binary_filename)
+    except OSError:
+        return Mesh.read_mesh_from_file(filename)
+    return read_binary_mesh(binary_filename)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Convert text mesh files to the binary mesh format")
+    parser.add_argument("input", help="mesh file in the format of cuboid.txt")
+    parser.add_argument("output", nargs="?", help=f"defaults to the input with the {BINARY_MESH_EXTENSION} extension")
+    args = parser.parse_args()
+
+    binary_filename = convert_mesh_file(args.input, args.output)
+    mesh = read_binary_mesh(binary_filename)
+    print(f"{binary_filename}: {mesh.vertices.shape[0]} vertices, {mesh.faces.shape[0]} faces")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
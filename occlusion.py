@@ -0,0 +1,135 @@
+import numpy as np
+
+from camera import Camera
+from depth_buffer import DepthBuffer
+from frame_stats import FrameStats, measure_stage
+from mesh import Mesh
+from pipeline import get_shape_triangles, TransformCache
+from rasterizer import get_screen_triangles, rasterize_triangles, get_screen_scissor
+
+# Shapes whose screen bounds cover at least this fraction of the screen are drawn into the occluder depth
+# pre-pass, nearest first and at most MAX_OCCLUDERS of them
+OCCLUDER_MIN_SCREEN_FRACTION = 1 / 64
+MAX_OCCLUDERS = 16
+
+# Box corners nearer than this are not projected, such boxes are never considered occluded
+MIN_CORNER_DEPTH = 1e-6
+
+BOX_CORNERS = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=float)
+
+
+class DepthPyramid:
+    # Hierarchical Z-buffer: level 0 is the depth buffer of the screen, every further level keeps the farthest
+    # depth of 2x2 texels of the level below
+    levels: list[np.ndarray]
+
+    def __init__(self, depths: np.ndarray, width: int, height: int):
+        # Depths are indexed [x, y]
+        level = depths[:width, :height]
+        self.levels = [level]
+        while level.shape[0] > 1 or level.shape[1] > 1:
+            padded = np.full((level.shape[0] + level.shape[0] % 2, level.shape[1] + level.shape[1] % 2), -np.inf)
+            padded[:level.shape[0], :level.shape[1]] = level
+            level = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).max(axis=(1, 3))
+            self.levels.append(level)
+
+    def get_farthest_depths(self,
+                            min_x: np.ndarray,
+                            min_y: np.ndarray,
+                            max_x: np.ndarray,
+                            max_y: np.ndarray) -> np.ndarray:
+        # Farthest depth over each inclusive pixel rectangle, read from the coarsest level where the rectangle
+        # touches at most 2x2 texels. Rectangles have to lie inside the screen
+        farthest = np.full(min_x.shape[0], -np.inf)
+        level_indices = np.zeros(min_x.shape[0], dtype=np.int64)
+        for level_index in range(len(self.levels)):
+            too_wide = ((max_x >> level_index) - (min_x >> level_index) > 1) | \
+                       ((max_y >> level_index) - (min_y >> level_index) > 1)
+            level_indices[too_wide] = level_index + 1
+
+        for level_index, level in enumerate(self.levels):
+            selected = np.nonzero(level_indices == level_index)[0]
+            if selected.shape[0] == 0:
+                continue
+            x0 = min_x[selected] >> level_index
+            y0 = min_y[selected] >> level_index
+            x1 = max_x[selected] >> level_index
+            y1 = max_y[selected] >> level_index
+            farthest[selected] = np.maximum(np.maximum(level[x0, y0], level[x1, y0]),
+                                            np.maximum(level[x0, y1], level[x1, y1]))
+        return farthest
+
+
+def get_shape_screen_bounds(camera: Camera,
+                            shapes: list[Mesh],
+                            width: int,
+                            height: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray,
+                                                  np.ndarray]:
+    # Inclusive pixel rectangles (min_x, min_y, max_x, max_y) holding every pixel the shapes may cover, the
+    # nearest depth of their bounding boxes and a mask of the shapes whose boxes are fully in front of the camera
+    boxes_min = np.array([mesh.bounding_box_min for mesh in shapes]).reshape(-1, 3)
+    boxes_max = np.array([mesh.bounding_box_max for mesh in shapes]).reshape(-1, 3)
+    corners = np.ones((len(shapes), 8, 4))
+    corners[:, :, :3] = boxes_min[:, np.newaxis] + BOX_CORNERS * (boxes_max - boxes_min)[:, np.newaxis]
+
+    view_projection_matrix = camera.get_view_projection_matrix()
+    corners = corners @ view_projection_matrix.matrix_np.T
+    depths = corners[:, :, 3]
+    in_front = np.all(depths > MIN_CORNER_DEPTH, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xs = (corners[:, :, 0] / depths + 1) * width / 2
+        ys = (corners[:, :, 1] / depths + 1) * height / 2
+    # One pixel of margin against rounding differences with the clipped triangles
+    min_x = np.clip(np.floor(np.nan_to_num(xs.min(axis=1))) - 1, 0, width - 1).astype(np.int64)
+    min_y = np.clip(np.floor(np.nan_to_num(ys.min(axis=1))) - 1, 0, height - 1).astype(np.int64)
+    max_x = np.clip(np.floor(np.nan_to_num(xs.max(axis=1))) + 1, 0, width - 1).astype(np.int64)
+    max_y = np.clip(np.floor(np.nan_to_num(ys.max(axis=1))) + 1, 0, height - 1).astype(np.int64)
+    return min_x, min_y, max_x, max_y, depths.min(axis=1), in_front
+
+
+def get_unoccluded_shapes(camera: Camera,
+                          shapes: list[Mesh],
+                          width: int,
+                          height: int,
+                          frame_stats: FrameStats = None,
+                          transform_cache: TransformCache = None,
+                          subpixel: bool = False) -> tuple[list[Mesh], list[np.ndarray]]:
+    # Draws the depth of the nearest large shapes into a scratch buffer, builds a depth pyramid from it and
+    # drops the other shapes whose bounds are entirely behind it. Returns the remaining shapes in their order
+    # and, for each of them, its triangles after the perspective divide when the pre-pass already computed
+    # them and None otherwise. Occluders are rasterized like the frame will be, with subpixel as in
+    # rasterize_triangles
+    if not shapes:
+        return [], []
+
+    with measure_stage(frame_stats, "transform_cull"):
+        min_x, min_y, max_x, max_y, nearest_depths, in_front = get_shape_screen_bounds(camera, shapes, width, height)
+        screen_fractions = (max_x - min_x + 1) * (max_y - min_y + 1) / (width * height)
+        candidates = np.nonzero(in_front & (screen_fractions >= OCCLUDER_MIN_SCREEN_FRACTION))[0]
+        occluders = candidates[np.argsort(nearest_depths[candidates], kind='stable')][:MAX_OCCLUDERS]
+
+    transformed = [None] * len(shapes)
+    if occluders.shape[0] == 0:
+        return shapes, transformed
+
+    depth_buffer = DepthBuffer(width, height)
+    for i in occluders:
+        transformed[i] = get_shape_triangles(camera, shapes[i], frame_stats, transform_cache)
+        with measure_stage(frame_stats, "raster"):
+            rasterize_triangles(None, depth_buffer, get_screen_triangles(transformed[i], width, height), None,
+                                get_screen_scissor(width, height), subpixel)
+
+    with measure_stage(frame_stats, "transform_cull"):
+        depth_pyramid = DepthPyramid(depth_buffer.get_depths(), width, height)
+        # Fragments are never nearer than the nearest depth of their box, truncated unless vertex depths are
+        # kept with subpixel. On equal depth the shape drawn first wins, which may be the occludee, so only
+        # strictly farther boxes are occluded
+        fragment_depths = nearest_depths if subpixel else np.floor(nearest_depths)
+        occluded = in_front & (fragment_depths > depth_pyramid.get_farthest_depths(min_x, min_y, max_x, max_y))
+        occluded[occluders] = False
+
+    if frame_stats is not None:
+        frame_stats.add_occlusion_culling(int(np.count_nonzero(occluded)), occluders.shape[0])
+    return ([mesh for mesh, is_occluded in zip(shapes, occluded) if not is_occluded],
+            [triangles for triangles, is_occluded in zip(transformed, occluded) if not is_occluded])
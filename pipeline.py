@@ -0,0 +1,188 @@
+import numpy as np
+
+from camera import Camera
+from clipping import clip_triangles_in_clip_space, GUARD_BAND
+from culling import get_visible_faces_mask
+from depth_buffer import DepthBuffer
+from frame_stats import FrameStats, measure_stage
+from frustum import get_frustum_planes, get_boxes_outside_mask
+from instancing import InstancedMesh
+from matrix import perspective_divide
+from mesh import Mesh
+from rasterizer import get_screen_triangles, rasterize_triangles, rasterize_triangles_front_to_back
+
+
+def get_visible_triangles_in_clip_space(camera: Camera,
+                                        mesh: Mesh,
+                                        frame_stats: FrameStats = None) -> np.ndarray:
+    with measure_stage(frame_stats, "transform_cull"):
+        view_projection_matrix = camera.get_view_projection_matrix()
+
+        visible_faces_mask = get_visible_faces_mask(mesh, camera.get_eye_position())
+        if frame_stats is not None:
+            frame_stats.add_culling(visible_faces_mask)
+
+        vertices_in_clip_space = view_projection_matrix.multiply_by_vectors(mesh.vertices, divide_by_w=False)
+        return vertices_in_clip_space[mesh.faces[visible_faces_mask]]
+
+
+def update_shape(camera: Camera,
+                 mesh: Mesh,
+                 frame_stats: FrameStats = None,
+                 guard_band: float = GUARD_BAND) -> np.ndarray:
+    visible_triangles = get_visible_triangles_in_clip_space(camera, mesh, frame_stats)
+    with measure_stage(frame_stats, "clip"):
+        clipped_triangles = clip_triangles_in_clip_space(visible_triangles, guard_band, frame_stats)
+        return perspective_divide(clipped_triangles)
+
+
+class TransformCache:
+    # Triangles of meshes after the perspective divide, kept across frames and reused while neither the camera
+    # nor the mesh changed. Reused triangles are not counted in the frame statistics again. A changed camera
+    # or guard band outdates every entry, so they are all dropped at once
+    camera: Camera
+    camera_version: int
+    guard_band: float | None
+    entries: dict[int, tuple[Mesh, int, np.ndarray]]
+
+    def __init__(self):
+        self.camera = None
+        self.camera_version = -1
+        self.guard_band = None
+        self.entries = {}
+
+    def clear(self) -> None:
+        self.entries = {}
+
+    def update_shape(self,
+                     camera: Camera,
+                     mesh: Mesh,
+                     frame_stats: FrameStats = None,
+                     guard_band: float = GUARD_BAND) -> np.ndarray:
+        if camera is not self.camera or camera.version != self.camera_version or guard_band != self.guard_band:
+            self.camera = camera
+            self.camera_version = camera.version
+            self.guard_band = guard_band
+            self.entries = {}
+
+        # The mesh is kept in the entry, so its id can not be reused by another mesh
+        entry = self.entries.get(id(mesh))
+        if entry is not None and entry[0] is mesh and entry[1] == mesh.version:
+            return entry[2]
+        triangles = update_shape(camera, mesh, frame_stats, guard_band)
+        self.entries[id(mesh)] = (mesh, mesh.version, triangles)
+        return triangles
+
+
+def get_shape_triangles(camera: Camera,
+                        mesh: Mesh,
+                        frame_stats: FrameStats = None,
+                        transform_cache: TransformCache = None) -> np.ndarray:
+    if transform_cache is None:
+        return update_shape(camera, mesh, frame_stats)
+    return transform_cache.update_shape(camera, mesh, frame_stats)
+
+
+def get_instances_in_frustum(camera: Camera,
+                             instanced_mesh: InstancedMesh,
+                             frame_stats: FrameStats = None) -> np.ndarray:
+    # Indices of the instances whose bounding boxes are not outside the frustum
+    boxes_min, boxes_max = instanced_mesh.get_bounding_boxes()
+    instances = np.nonzero(~get_boxes_outside_mask(get_frustum_planes(camera), boxes_min, boxes_max))[0]
+    if frame_stats is not None:
+        frame_stats.add_shape_culling(instanced_mesh.get_instance_count(), instances.shape[0])
+    return instances
+
+
+def get_instance_vertices_in_clip_space(camera: Camera,
+                                        instanced_mesh: InstancedMesh,
+                                        instances: np.ndarray) -> np.ndarray:
+    # (I, V, 4) clip-space vertices of the instances, all transformed at once with their model-view-projection
+    # matrices
+    model_view_projection_matrices = (camera.get_view_projection_matrix().matrix_np
+                                      @ instanced_mesh.model_matrices[instances])
+    return np.einsum('ijk,vk->ivj', model_view_projection_matrices, instanced_mesh.mesh.vertices)
+
+
+def get_visible_instance_triangles_in_clip_space(camera: Camera,
+                                                 instanced_mesh: InstancedMesh,
+                                                 frame_stats: FrameStats = None) -> np.ndarray:
+    # (N, 3, 5) clip-space triangles of all instances inside the frustum, the fifth component holds the index
+    # of the instance
+    with measure_stage(frame_stats, "transform_cull"):
+        mesh = instanced_mesh.mesh
+        instances = get_instances_in_frustum(camera, instanced_mesh, frame_stats)
+        model_matrices = instanced_mesh.model_matrices[instances]
+
+        # Faces are culled in object space, mirroring model matrices turn the faces around
+        eye_positions = instanced_mesh.get_eye_positions(camera.get_eye_position().vector_np[:3, 0])[instances]
+        face_points = mesh.get_face_points()
+        facing = (np.einsum('ij,ij->i', mesh.face_normals, face_points)[np.newaxis]
+                  - eye_positions @ mesh.face_normals.T) > 0
+        visible_faces_mask = facing != (np.linalg.det(model_matrices) < 0)[:, np.newaxis]
+        if frame_stats is not None:
+            frame_stats.add_culling(visible_faces_mask.reshape(-1))
+
+        vertices_in_clip_space = get_instance_vertices_in_clip_space(camera, instanced_mesh, instances)
+
+        triangle_instances, triangle_faces = np.nonzero(visible_faces_mask)
+        triangles = np.empty((triangle_faces.shape[0], 3, 5), dtype=vertices_in_clip_space.dtype)
+        triangles[:, :, :4] = vertices_in_clip_space[triangle_instances[:, np.newaxis], mesh.faces[triangle_faces]]
+        triangles[:, :, 4] = instances[triangle_instances, np.newaxis]
+        return triangles
+
+
+def update_instanced_mesh(camera: Camera,
+                          instanced_mesh: InstancedMesh,
+                          frame_stats: FrameStats = None,
+                          guard_band: float = GUARD_BAND) -> tuple[np.ndarray, np.ndarray]:
+    # Triangles of all instances after the perspective divide, in instance order, and their (N, 3) colors
+    visible_triangles = get_visible_instance_triangles_in_clip_space(camera, instanced_mesh, frame_stats)
+    with measure_stage(frame_stats, "clip"):
+        clipped_triangles = clip_triangles_in_clip_space(visible_triangles, guard_band, frame_stats)
+        # Clipping moves the split triangles to the end, the instances are drawn one after the other
+        triangle_instances = clipped_triangles[:, 0, 4].astype(np.int64)
+        order = np.argsort(triangle_instances, kind='stable')
+        triangles = perspective_divide(clipped_triangles[order, :, :4])
+        return triangles, instanced_mesh.colors[triangle_instances[order]]
+
+
+def draw_shape(color_buffer: np.ndarray,
+               depth_buffer: DepthBuffer,
+               triangles: np.ndarray,
+               color: tuple[int, int, int] | np.ndarray,
+               frame_stats: FrameStats = None,
+               scissor: tuple[int, int, int, int] = None,
+               subpixel: bool = False) -> tuple[int, int]:
+    # The color is shared by all triangles or given per triangle as an (N, 3) array
+    with measure_stage(frame_stats, "raster"):
+        screen_triangles = get_screen_triangles(triangles, color_buffer.shape[0], color_buffer.shape[1])
+        pixels_tested, pixels_written = rasterize_triangles(color_buffer, depth_buffer, screen_triangles, color,
+                                                            scissor, subpixel)
+    if frame_stats is not None:
+        frame_stats.add_raster(triangles.shape[0], pixels_tested, pixels_written)
+    return pixels_tested, pixels_written
+
+
+def draw_shapes_front_to_back(color_buffer: np.ndarray,
+                              depth_buffer: DepthBuffer,
+                              triangles: list[np.ndarray],
+                              colors: list[tuple[int, int, int] | np.ndarray],
+                              frame_stats: FrameStats = None,
+                              scissor: tuple[int, int, int, int] = None,
+                              subpixel: bool = False) -> tuple[int, int]:
+    # Draws the triangles of all shapes in one batch sorted nearest first, hidden spans are rejected early.
+    # Every shape has one color or an (N, 3) array of triangle colors
+    with measure_stage(frame_stats, "raster"):
+        screen_triangles = get_screen_triangles(np.concatenate(triangles) if triangles else np.empty((0, 3, 4)),
+                                                color_buffer.shape[0], color_buffer.shape[1])
+        triangle_colors = np.concatenate([np.broadcast_to(np.asarray(color, dtype=np.uint8),
+                                                          (shape_triangles.shape[0], 3))
+                                          for shape_triangles, color in zip(triangles, colors)]
+                                         ) if triangles else np.empty((0, 3), dtype=np.uint8)
+        pixels_tested, pixels_written = rasterize_triangles_front_to_back(color_buffer, depth_buffer,
+                                                                          screen_triangles, triangle_colors, scissor,
+                                                                          subpixel=subpixel)
+    if frame_stats is not None:
+        frame_stats.add_raster(screen_triangles.shape[0], pixels_tested, pixels_written)
+    return pixels_tested, pixels_written
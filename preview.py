@@ -0,0 +1,102 @@
+import numpy as np
+
+from camera import Camera
+from clipping import clip_lines_in_clip_space, get_points_in_view_mask, GUARD_BAND
+from frame_stats import FrameStats, measure_stage
+from instancing import InstancedMesh
+from matrix import perspective_divide
+from mesh import Mesh
+from pipeline import get_instances_in_frustum, get_instance_vertices_in_clip_space
+from rasterizer import get_screen_triangles, rasterize_lines, rasterize_points
+from render_target import RenderTarget
+from streaming import StreamedMesh
+
+RENDER_MODE_FILLED = "filled"
+# Unique edges of every mesh drawn as depth-tested lines
+RENDER_MODE_WIREFRAME = "wireframe"
+# Vertices of every mesh splatted as depth-tested squares
+RENDER_MODE_POINTS = "points"
+RENDER_MODES = [RENDER_MODE_FILLED, RENDER_MODE_WIREFRAME, RENDER_MODE_POINTS]
+
+# Vertex index pairs of the edges of a triangle
+TRIANGLE_EDGES = np.array([[0, 1], [1, 2], [2, 0]])
+
+
+def get_next_render_mode(render_mode: str) -> str:
+    return RENDER_MODES[(RENDER_MODES.index(render_mode) + 1) % len(RENDER_MODES)]
+
+
+def draw_primitives(render_target: RenderTarget,
+                    primitives: np.ndarray,
+                    color: tuple[int, int, int] | np.ndarray,
+                    render_mode: str,
+                    frame_stats: FrameStats = None,
+                    guard_band: float = GUARD_BAND) -> None:
+    # Clips and draws (N, 2, 4) clip-space lines or (N, 4) clip-space points with one color or (N, 3) colors
+    with measure_stage(frame_stats, "clip"):
+        if render_mode == RENDER_MODE_WIREFRAME:
+            # The fifth component holds the index of the line, clipping drops lines
+            if isinstance(color, np.ndarray):
+                lines = np.empty(primitives.shape[:2] + (5,), dtype=primitives.dtype)
+                lines[:, :, :4] = primitives
+                lines[:, :, 4] = np.arange(primitives.shape[0])[:, np.newaxis]
+                primitives = clip_lines_in_clip_space(lines, guard_band)
+                color = color[primitives[:, 0, 4].astype(np.int64)]
+                primitives = primitives[:, :, :4]
+            else:
+                primitives = clip_lines_in_clip_space(primitives, guard_band)
+        else:
+            inside = get_points_in_view_mask(primitives)
+            primitives = primitives[inside]
+            color = color[inside] if isinstance(color, np.ndarray) else color
+        primitives = perspective_divide(primitives)
+
+    with measure_stage(frame_stats, "raster"):
+        screen_primitives = get_screen_triangles(primitives, render_target.width, render_target.height)
+        rasterize = rasterize_lines if render_mode == RENDER_MODE_WIREFRAME else rasterize_points
+        pixels_tested, pixels_written = rasterize(render_target.color_buffer, render_target.depth_buffer,
+                                                  screen_primitives, color)
+    if frame_stats is not None:
+        frame_stats.add_raster(primitives.shape[0], pixels_tested, pixels_written)
+
+
+def get_primitives(vertices: np.ndarray, edges: np.ndarray, render_mode: str) -> np.ndarray:
+    # (..., E, 2, 4) lines along the edges or (..., V, 4) points of (..., V, 4) vertices
+    if render_mode == RENDER_MODE_WIREFRAME:
+        return vertices[..., edges, :]
+    return vertices
+
+
+def render_preview(camera: Camera,
+                   shapes: list[Mesh],
+                   instanced_meshes: list[InstancedMesh],
+                   streamed_meshes: list[StreamedMesh],
+                   render_target: RenderTarget,
+                   render_mode: str,
+                   frame_stats: FrameStats = None) -> None:
+    # Draws the wireframe or the point cloud of the scene into the cleared render target. Vertices go through
+    # the same transform and clip stages as triangles, but nothing is culled per face and the cost grows with
+    # the vertices and edges instead of the filled pixels. Streamed meshes have no shared vertices, every
+    # chunk triangle contributes its three edges or vertices
+    for mesh in shapes:
+        with measure_stage(frame_stats, "transform_cull"):
+            vertices = camera.get_view_projection_matrix().multiply_by_vectors(mesh.vertices, divide_by_w=False)
+            primitives = get_primitives(vertices, mesh.get_edges(), render_mode)
+        draw_primitives(render_target, primitives, mesh.color, render_mode, frame_stats)
+
+    for instanced_mesh in instanced_meshes:
+        with measure_stage(frame_stats, "transform_cull"):
+            instances = get_instances_in_frustum(camera, instanced_mesh, frame_stats)
+            vertices = get_instance_vertices_in_clip_space(camera, instanced_mesh, instances)
+            primitives = get_primitives(vertices, instanced_mesh.mesh.get_edges(), render_mode)
+            colors = np.repeat(instanced_mesh.colors[instances], primitives.shape[1], axis=0)
+            primitives = primitives.reshape((-1,) + primitives.shape[2:])
+        draw_primitives(render_target, primitives, colors, render_mode, frame_stats)
+
+    for streamed_mesh in streamed_meshes:
+        for triangles in streamed_mesh.get_chunks():
+            with measure_stage(frame_stats, "transform_cull"):
+                vertices = camera.get_view_projection_matrix().multiply_by_vectors(triangles, divide_by_w=False)
+                primitives = get_primitives(vertices, TRIANGLE_EDGES, render_mode)
+                primitives = primitives.reshape((-1,) + primitives.shape[2:])
+            draw_primitives(render_target, primitives, streamed_mesh.color, render_mode, frame_stats)
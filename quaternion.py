@@ -0,0 +1,84 @@
+import math
+
+from matrix import Matrix4, Mat4
+from vector import Vector4, Vec4
+
+
+class Quaternion:
+    # Unit quaternion (w, x, y, z) of a rotation, products are normalized again so that long chains of
+    # small rotations do not drift away from a rotation. Kept as scalars like Vec4, it is updated on every
+    # camera event
+    __slots__ = ("w", "x", "y", "z")
+    w: float
+    x: float
+    y: float
+    z: float
+
+    def __init__(self, w: float, x: float, y: float, z: float):
+        self.w = w
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def __str__(self):
+        return f"[{self.w} {self.x} {self.y} {self.z}]"
+
+    @staticmethod
+    def identity() -> 'Quaternion':
+        return Quaternion(1.0, 0.0, 0.0, 0.0)
+
+    @staticmethod
+    def from_axis_angle(axis: tuple[float, float, float], angle_degrees: float) -> 'Quaternion':
+        # The axis has to be of unit length
+        half_angle = math.radians(angle_degrees) / 2
+        s = math.sin(half_angle)
+        return Quaternion(math.cos(half_angle), axis[0] * s, axis[1] * s, axis[2] * s)
+
+    @staticmethod
+    def from_euler_angles(orientation: Vector4 | Vec4) -> 'Quaternion':
+        # Same rotation as get_rotation_matrix(orientation), angles in degrees
+        return (Quaternion.from_axis_angle((1, 0, 0), orientation.get_x())
+                .multiply(Quaternion.from_axis_angle((0, 1, 0), orientation.get_y()))
+                .multiply(Quaternion.from_axis_angle((0, 0, 1), orientation.get_z())))
+
+    def copy(self) -> 'Quaternion':
+        return Quaternion(self.w, self.x, self.y, self.z)
+
+    def get_normalized(self) -> 'Quaternion':
+        length = math.sqrt(self.w * self.w + self.x * self.x + self.y * self.y + self.z * self.z)
+        return Quaternion(self.w / length, self.x / length, self.y / length, self.z / length)
+
+    def multiply(self, other: 'Quaternion') -> 'Quaternion':
+        # Rotation by other followed by self
+        w1, x1, y1, z1 = self.w, self.x, self.y, self.z
+        w2, x2, y2, z2 = other.w, other.x, other.y, other.z
+        return Quaternion(w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                          w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                          w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                          w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2).get_normalized()
+
+    def slerp(self, other: 'Quaternion', t: float) -> 'Quaternion':
+        # Rotation a fraction t of the way from self to other along the shorter arc, at constant angular speed
+        q1 = (self.w, self.x, self.y, self.z)
+        q2 = (other.w, other.x, other.y, other.z)
+        cos_angle = sum(a * b for a, b in zip(q1, q2))
+        if cos_angle < 0:
+            q2 = tuple(-b for b in q2)
+            cos_angle = -cos_angle
+        if cos_angle > 1 - 1e-9:
+            s1, s2 = 1 - t, t
+        else:
+            angle = math.acos(cos_angle)
+            s1 = math.sin((1 - t) * angle) / math.sin(angle)
+            s2 = math.sin(t * angle) / math.sin(angle)
+        return Quaternion(*(s1 * a + s2 * b for a, b in zip(q1, q2))).get_normalized()
+
+    def get_rotation_mat4(self) -> Mat4:
+        w, x, y, z = self.w, self.x, self.y, self.z
+        return Mat4((1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y), 0.0,
+                     2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x), 0.0,
+                     2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y), 0.0,
+                     0.0, 0.0, 0.0, 1.0))
+
+    def get_rotation_matrix(self) -> Matrix4:
+        return self.get_rotation_mat4().to_matrix4()
@@ -0,0 +1,436 @@
+import numpy as np
+
+from depth_buffer import DepthBuffer
+
+# Upper bound of fragments generated at once, triangles are rasterized in batches below it
+FRAGMENT_BATCH_SIZE = 1 << 20
+# Fractional bits of the fixed-point vertex coordinates of the subpixel rasterizer, 1/16 of a pixel
+SUBPIXEL_BITS = 4
+# Side in pixels of the square a vertex covers in the point cloud mode
+POINT_SIZE = 2
+
+
+def get_screen_triangles(triangles: np.ndarray, width: int, height: int) -> np.ndarray:
+    # Maps (N, 3, 4) triangles after the perspective divide to (N, 3, 3) pixel x, y and depth. Lines and points
+    # map the same way, any leading shape is kept
+    screen_triangles = np.empty(triangles.shape[:-1] + (3,), dtype=triangles.dtype)
+    screen_triangles[..., 0] = (triangles[..., 0] + 1) * width / 2
+    screen_triangles[..., 1] = (triangles[..., 1] + 1) * height / 2
+    screen_triangles[..., 2] = triangles[..., 3]
+    return screen_triangles
+
+
+def expand_ranges(starts: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Returns the owner index and value of every element of the ranges [start, start + count)
+    owners = np.repeat(np.arange(counts.shape[0]), counts)
+    range_offsets = np.cumsum(counts) - counts
+    values = starts[owners] + np.arange(owners.shape[0]) - range_offsets[owners]
+    return owners, values
+
+
+def sort_vertices_by_y(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> None:
+    # Same compare-and-swap sequence as draw_triangle, so vertices with equal y end up in the same order
+    for a, b in [(0, 1), (0, 2), (1, 2)]:
+        swap = y[:, b] < y[:, a]
+        for values in (x, y, z):
+            values[swap, a], values[swap, b] = values[swap, b], values[swap, a].copy()
+
+
+def get_triangle_spans(screen_triangles: np.ndarray,
+                       min_y: int,
+                       max_y: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Scanline spans (triangle, y, x_start, x_end, z_start, z_end) of draw_triangle, with rows
+    # scissored to [min_y, max_y]
+    x, y, z = (np.trunc(screen_triangles[:, :, i]).astype(np.int64) for i in range(3))
+    sort_vertices_by_y(x, y, z)
+
+    dy1 = y[:, 1] - y[:, 0]
+    dy2 = y[:, 2] - y[:, 0]
+    dy3 = y[:, 2] - y[:, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dax_step_upper = np.where(dy1 != 0, (x[:, 1] - x[:, 0]) / dy1, 0)
+        dz_step_upper = np.where(dy1 != 0, (z[:, 1] - z[:, 0]) / dy1, 0)
+        dbx_step = np.where(dy2 != 0, (x[:, 2] - x[:, 0]) / dy2, 0)
+        dz2_step = np.where(dy2 != 0, (z[:, 2] - z[:, 0]) / dy2, 0)
+        dax_step_lower = np.where(dy3 != 0, (x[:, 2] - x[:, 1]) / dy3, 0)
+        dz_step_lower = np.where(dy3 != 0, (z[:, 2] - z[:, 1]) / dy3, 0)
+
+    spans = []
+    for y_first, y_last, a, dax_step, dz_step in [(y[:, 0], y[:, 1], 0, dax_step_upper, dz_step_upper),
+                                                  (y[:, 1], y[:, 2], 1, dax_step_lower, dz_step_lower)]:
+        row_start = np.maximum(y_first, min_y)
+        row_count = np.maximum(np.minimum(y_last, max_y) - row_start + 1, 0)
+        owners, rows = expand_ranges(row_start, row_count)
+
+        ax = np.trunc(x[owners, a] + (rows - y[owners, a]) * dax_step[owners]).astype(np.int64)
+        bx = np.trunc(x[owners, 0] + (rows - y[owners, 0]) * dbx_step[owners]).astype(np.int64)
+        zs = z[owners, a] + (rows - y[owners, a]) * dz_step[owners]
+        ze = z[owners, 0] + (rows - y[owners, 0]) * dz2_step[owners]
+        spans.append((owners, rows, ax, bx, zs, ze))
+
+    # Spans in triangle order, so that on equal depth the earlier triangle wins like in draw_triangle
+    order = np.argsort(np.concatenate([owners for owners, *_ in spans]), kind='stable')
+    owners, rows, ax, bx, zs, ze = (np.concatenate(values)[order] for values in zip(*spans))
+    swap = ax > bx
+    x_start = np.where(swap, bx, ax)
+    x_end = np.where(swap, ax, bx)
+    z_start = np.where(swap, ze, zs)
+    z_end = np.where(swap, zs, ze)
+    return owners, rows, x_start, x_end, z_start, z_end
+
+
+def get_edge_bounds(coefficient: np.ndarray, constant: np.ndarray, scale: int) -> tuple[np.ndarray, np.ndarray]:
+    # Pixels px of a row with coefficient * (px * scale + scale / 2) + constant >= 0, as the bound on px of an
+    # edge whose function grows with x, shrinks with x or stays constant along the row
+    c = -constant - coefficient * (scale // 2)
+    divisor = coefficient * scale
+    safe_divisor = np.where(divisor != 0, divisor, 1)
+    lower = np.where(divisor > 0, -(-c // safe_divisor), np.iinfo(np.int64).min)
+    upper = np.where(divisor < 0, c // safe_divisor, np.iinfo(np.int64).max)
+    # Horizontal edges take in the whole row or none of it
+    upper = np.where((divisor == 0) & (c > 0), np.iinfo(np.int64).min, upper)
+    return lower, upper
+
+
+def get_triangle_spans_subpixel(screen_triangles: np.ndarray,
+                                min_y: int,
+                                max_y: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray,
+                                                     np.ndarray]:
+    # Scanline spans like get_triangle_spans, covering the pixels whose centers are inside the triangle. Vertices
+    # are snapped to SUBPIXEL_BITS fixed point and the edge functions are evaluated exactly in integers.
+    # Centers on an edge belong to the triangle only when it is a left edge or a horizontal top edge, so
+    # triangles sharing an edge cover each pixel along it exactly once. Depth is interpolated in float over the
+    # triangle's plane through the unrounded vertex depths
+    scale = 1 << SUBPIXEL_BITS
+    x = np.rint(screen_triangles[:, :, 0] * scale).astype(np.int64)
+    y = np.rint(screen_triangles[:, :, 1] * scale).astype(np.int64)
+    z = screen_triangles[:, :, 2].astype(np.float64)
+
+    # Wound so that the inside of every edge is where its function is positive, degenerate triangles cover nothing
+    area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0])
+    swap = area < 0
+    for values in (x, y, z):
+        values[swap, 1], values[swap, 2] = values[swap, 2], values[swap, 1].copy()
+    area = np.abs(area)
+
+    # Rows whose centers lie between the lowest and highest vertex
+    row_start = np.maximum(-(-(y.min(axis=1) - scale // 2) // scale), min_y)
+    row_end = np.minimum((y.max(axis=1) - scale // 2) // scale, max_y)
+    owners, rows = expand_ranges(row_start, np.where(area > 0, np.maximum(row_end - row_start + 1, 0), 0))
+    center_y = rows * scale + scale // 2
+
+    x_start = np.full(rows.shape[0], np.iinfo(np.int64).min)
+    x_end = np.full(rows.shape[0], np.iinfo(np.int64).max)
+    for a, b in [(0, 1), (1, 2), (2, 0)]:
+        # Edge function (x_b - x_a) * (py - y_a) - (y_b - y_a) * (px - x_a), required to be positive on edges
+        # that are neither left nor top edges
+        dx = (x[:, b] - x[:, a])[owners]
+        dy = (y[:, b] - y[:, a])[owners]
+        is_top_left = (dy < 0) | ((dy == 0) & (dx > 0))
+        constant = dx * (center_y - y[owners, a]) + dy * x[owners, a] - np.where(is_top_left, 0, 1)
+        lower, upper = get_edge_bounds(-dy, constant, scale)
+        x_start = np.maximum(x_start, lower)
+        x_end = np.minimum(x_end, upper)
+
+    # Depth plane z = z_0 + dz_dx * (x - x_0) + dz_dy * (y - y_0) in pixels
+    xf, yf = x / scale, y / scale
+    d1x, d1y, d1z = xf[:, 1] - xf[:, 0], yf[:, 1] - yf[:, 0], z[:, 1] - z[:, 0]
+    d2x, d2y, d2z = xf[:, 2] - xf[:, 0], yf[:, 2] - yf[:, 0], z[:, 2] - z[:, 0]
+    determinant = np.where(area > 0, d1x * d2y - d1y * d2x, 1)
+    dz_dx = ((d1z * d2y - d2z * d1y) / determinant)[owners]
+    dz_dy = ((d2z * d1x - d1z * d2x) / determinant)[owners]
+    row_z = z[owners, 0] + dz_dy * (rows + 0.5 - yf[owners, 0]) - dz_dx * xf[owners, 0]
+    # Spans of rows left empty keep a finite start and end
+    empty = x_start > x_end
+    x_start = np.where(empty, 0, x_start)
+    x_end = np.where(empty, -1, x_end)
+    return owners, rows, x_start, x_end, row_z + dz_dx * (x_start + 0.5), row_z + dz_dx * (x_end + 0.5)
+
+
+def get_span_fragments(rows: np.ndarray,
+                       x_start: np.ndarray,
+                       x_end: np.ndarray,
+                       z_start: np.ndarray,
+                       z_end: np.ndarray,
+                       min_x: int,
+                       max_x: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Fragments (span, x, y, z) of the spans, scissored to [min_x, max_x]
+    first_x = np.maximum(x_start, min_x)
+    pixel_count = np.maximum(np.minimum(x_end, max_x) - first_x + 1, 0)
+    owners, xs = expand_ranges(first_x, pixel_count)
+
+    span_length = (x_end - x_start)[owners]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(span_length != 0, (xs - x_start[owners]) / span_length, 0)
+    zs = (1 - t) * z_start[owners] + t * z_end[owners]
+    return owners, xs, rows[owners], zs
+
+
+def write_fragments(color_buffer: np.ndarray,
+                    depth_buffer: DepthBuffer,
+                    xs: np.ndarray,
+                    ys: np.ndarray,
+                    zs: np.ndarray,
+                    color: tuple[int, int, int] | np.ndarray) -> int:
+    # Only the nearest fragment per pixel can pass the depth test, on equal depth the earliest one wins.
+    # The color is shared by all fragments or given per fragment as a (K, 3) array. Without a color buffer
+    # only depth is written. Fragments are sorted in the row-major order of the depth buffer
+    pixel_indices = depth_buffer.get_flat_indices(xs, ys)
+    order = np.lexsort((zs, pixel_indices))
+    pixel_indices = pixel_indices[order]
+    nearest = np.ones(pixel_indices.shape[0], dtype=bool)
+    nearest[1:] = pixel_indices[1:] != pixel_indices[:-1]
+    pixel_indices = pixel_indices[nearest]
+    depths = depth_buffer.encode(zs[order][nearest])
+
+    passed = depths < depth_buffer.get_values(pixel_indices)
+    pixel_indices = pixel_indices[passed]
+    depth_buffer.set_values(pixel_indices, depths[passed])
+    if color_buffer is None:
+        return pixel_indices.shape[0]
+    if isinstance(color, np.ndarray):
+        color = color[order][nearest][passed]
+    row_length = depth_buffer.values.shape[1]
+    color_buffer[pixel_indices % row_length, pixel_indices // row_length] = color
+    return pixel_indices.shape[0]
+
+
+def get_screen_scissor(width: int, height: int) -> tuple[int, int, int, int]:
+    return 0, 0, width - 1, height - 1
+
+
+def get_fragment_batches(screen_triangles: np.ndarray) -> list[slice]:
+    bounding_box_size = np.ptp(screen_triangles[:, :, :2], axis=1) + 2
+    return get_batches_by_fragments(bounding_box_size[:, 0] * bounding_box_size[:, 1])
+
+
+def get_batches_by_fragments(fragment_counts: np.ndarray) -> list[slice]:
+    # Consecutive slices of primitives with up to FRAGMENT_BATCH_SIZE estimated fragments, at least one each
+    estimated_fragments = np.cumsum(fragment_counts)
+
+    batches = []
+    start = 0
+    while start < fragment_counts.shape[0]:
+        done = estimated_fragments[start - 1] if start > 0 else 0
+        end = max(int(np.searchsorted(estimated_fragments, done + FRAGMENT_BATCH_SIZE, side='right')), start + 1)
+        batches.append(slice(start, end))
+        start = end
+    return batches
+
+
+def rasterize_triangles(color_buffer: np.ndarray,
+                        depth_buffer: DepthBuffer,
+                        screen_triangles: np.ndarray,
+                        color: tuple[int, int, int] | np.ndarray,
+                        scissor: tuple[int, int, int, int] = None,
+                        subpixel: bool = False) -> tuple[int, int]:
+    # Vectorized equivalent of draw_triangle over (N, 3, 3) screen triangles, the color buffer is indexed [x, y].
+    # The color is shared by all triangles or given per triangle as an (N, 3) array. Only pixels inside
+    # the inclusive scissor rectangle (min_x, min_y, max_x, max_y) are touched. With subpixel the spans come
+    # from get_triangle_spans_subpixel instead of draw_triangle's truncated vertices.
+    # Returns the number of pixels tested and written
+    get_spans = get_triangle_spans_subpixel if subpixel else get_triangle_spans
+    if scissor is None:
+        scissor = get_screen_scissor(depth_buffer.width, depth_buffer.height)
+    min_x, min_y, max_x, max_y = scissor
+
+    pixels_tested = 0
+    pixels_written = 0
+    for batch in get_fragment_batches(screen_triangles):
+        span_triangles, *spans = get_spans(screen_triangles[batch], min_y, max_y)
+        fragment_spans, xs, ys, zs = get_span_fragments(*spans, min_x, max_x)
+        fragment_color = color[batch][span_triangles[fragment_spans]] if isinstance(color, np.ndarray) else color
+        pixels_tested += xs.shape[0]
+        pixels_written += write_fragments(color_buffer, depth_buffer, xs, ys, zs, fragment_color)
+    return pixels_tested, pixels_written
+
+
+def rasterize_lines(color_buffer: np.ndarray,
+                    depth_buffer: DepthBuffer,
+                    screen_lines: np.ndarray,
+                    color: tuple[int, int, int] | np.ndarray,
+                    scissor: tuple[int, int, int, int] = None) -> tuple[int, int]:
+    # Depth-tested lines between (N, 2, 3) screen points, one fragment per pixel step along the longer axis and
+    # depth interpolated linearly. The color is shared by all lines or given per line as an (N, 3) array.
+    # Returns the number of pixels tested and written
+    if scissor is None:
+        scissor = get_screen_scissor(depth_buffer.width, depth_buffer.height)
+    min_x, min_y, max_x, max_y = scissor
+
+    steps = np.ceil(np.abs(screen_lines[:, 1, :2] - screen_lines[:, 0, :2]).max(axis=1)).astype(np.int64)
+    pixels_tested = 0
+    pixels_written = 0
+    for batch in get_batches_by_fragments(steps + 1):
+        start = screen_lines[batch, 0]
+        delta = screen_lines[batch, 1] - start
+        owners, step = expand_ranges(np.zeros(start.shape[0], dtype=np.int64), steps[batch] + 1)
+        points = start[owners] + delta[owners] * (step / np.maximum(steps[batch][owners], 1))[:, np.newaxis]
+        xs = np.floor(points[:, 0]).astype(np.int64)
+        ys = np.floor(points[:, 1]).astype(np.int64)
+        inside = (xs >= min_x) & (xs <= max_x) & (ys >= min_y) & (ys <= max_y)
+        fragment_color = color[batch][owners[inside]] if isinstance(color, np.ndarray) else color
+        pixels_tested += int(np.count_nonzero(inside))
+        pixels_written += write_fragments(color_buffer, depth_buffer, xs[inside], ys[inside], points[inside, 2],
+                                          fragment_color)
+    return pixels_tested, pixels_written
+
+
+def rasterize_points(color_buffer: np.ndarray,
+                     depth_buffer: DepthBuffer,
+                     screen_points: np.ndarray,
+                     color: tuple[int, int, int] | np.ndarray,
+                     scissor: tuple[int, int, int, int] = None,
+                     point_size: int = POINT_SIZE) -> tuple[int, int]:
+    # Depth-tested squares of point_size pixels around (N, 3) screen points. The color is shared by all points
+    # or given per point as an (N, 3) array. Returns the number of pixels tested and written
+    if scissor is None:
+        scissor = get_screen_scissor(depth_buffer.width, depth_buffer.height)
+    min_x, min_y, max_x, max_y = scissor
+    offsets = np.arange(point_size) - (point_size - 1) // 2
+
+    pixels_tested = 0
+    pixels_written = 0
+    for batch in get_batches_by_fragments(np.full(screen_points.shape[0], point_size * point_size)):
+        points = screen_points[batch]
+        xs = (np.floor(points[:, 0]).astype(np.int64)[:, np.newaxis, np.newaxis]
+              + offsets[np.newaxis, :, np.newaxis])
+        ys = (np.floor(points[:, 1]).astype(np.int64)[:, np.newaxis, np.newaxis]
+              + offsets[np.newaxis, np.newaxis, :])
+        xs, ys = (values.reshape(-1) for values in np.broadcast_arrays(xs, ys))
+        owners = np.repeat(np.arange(points.shape[0]), point_size * point_size)
+        inside = (xs >= min_x) & (xs <= max_x) & (ys >= min_y) & (ys <= max_y)
+        fragment_color = color[batch][owners[inside]] if isinstance(color, np.ndarray) else color
+        pixels_tested += int(np.count_nonzero(inside))
+        pixels_written += write_fragments(color_buffer, depth_buffer, xs[inside], ys[inside],
+                                          points[owners[inside], 2], fragment_color)
+    return pixels_tested, pixels_written
+
+
+def get_triangle_bounds(screen_triangles: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Inclusive pixel bounding boxes (min_x, min_y, max_x, max_y) of the pixels a triangle may cover
+    pixels = np.trunc(screen_triangles[:, :, :2]).astype(np.int64)
+    min_corner = pixels.min(axis=1)
+    max_corner = pixels.max(axis=1)
+    return min_corner[:, 0], min_corner[:, 1], max_corner[:, 0], max_corner[:, 1]
+
+
+def get_screen_bounds(triangles: np.ndarray, width: int, height: int) -> tuple[int, int, int, int] | None:
+    # Inclusive pixel rectangle (min_x, min_y, max_x, max_y) holding every pixel the (N, 3, 4) triangles after the
+    # perspective divide may cover on screen, None when they cover none
+    if triangles.shape[0] == 0:
+        return None
+    min_x, min_y, max_x, max_y = get_triangle_bounds(get_screen_triangles(triangles, width, height))
+    rect = (max(int(min_x.min()), 0), max(int(min_y.min()), 0),
+            min(int(max_x.max()), width - 1), min(int(max_y.max()), height - 1))
+    return rect if rect[0] <= rect[2] and rect[1] <= rect[3] else None
+
+
+def get_union_rect(a: tuple[int, int, int, int] | None,
+                   b: tuple[int, int, int, int] | None) -> tuple[int, int, int, int] | None:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def are_rects_overlapping(a: tuple[int, int, int, int], b: tuple[int, int, int, int]) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+EARLY_Z_TILE_SIZE = 8
+FRONT_TO_BACK_FIRST_CHUNK_SIZE = 64
+
+
+def get_front_to_back_order(screen_triangles: np.ndarray) -> np.ndarray:
+    return np.argsort(screen_triangles[:, :, 2].min(axis=1), kind='stable')
+
+
+def get_tile_max_depth_table(depths: np.ndarray, width: int, height: int, tile_size: int) -> np.ndarray:
+    # Farthest depth per (tile_size x tile_size) tile, as a sparse table over tile columns:
+    # table[k, c, r] is the farthest depth of tiles c .. c + 2^k - 1 in tile row r
+    columns = -(-width // tile_size)
+    rows = -(-height // tile_size)
+    padded = np.full((columns * tile_size, rows * tile_size), -np.inf)
+    padded[:width, :height] = depths[:width, :height]
+    tile_max = padded.reshape(columns, tile_size, rows, tile_size).max(axis=(1, 3))
+
+    levels = max(int(columns).bit_length(), 1)
+    table = np.full((levels, columns, rows), -np.inf)
+    table[0] = tile_max
+    for k in range(1, levels):
+        step = 1 << (k - 1)
+        table[k, :columns - step] = np.maximum(table[k - 1, :columns - step], table[k - 1, step:])
+    return table
+
+
+def get_visible_spans_mask(table: np.ndarray,
+                           tile_size: int,
+                           rows: np.ndarray,
+                           x_start: np.ndarray,
+                           x_end: np.ndarray,
+                           z_start: np.ndarray,
+                           z_end: np.ndarray,
+                           min_x: int,
+                           max_x: int) -> np.ndarray:
+    # A span is hidden when its nearest depth is not nearer than the farthest depth of every tile it touches
+    first_x = np.maximum(x_start, min_x)
+    last_x = np.minimum(x_end, max_x)
+    non_empty = first_x <= last_x
+
+    first_column = first_x[non_empty] // tile_size
+    last_column = last_x[non_empty] // tile_size
+    tile_rows = rows[non_empty] // tile_size
+    k = np.floor(np.log2(last_column - first_column + 1)).astype(np.int64)
+    farthest = np.maximum(table[k, first_column, tile_rows], table[k, last_column - (1 << k) + 1, tile_rows])
+
+    visible = np.zeros(rows.shape[0], dtype=bool)
+    visible[non_empty] = np.minimum(z_start, z_end)[non_empty] < farthest
+    return visible
+
+
+def rasterize_triangles_front_to_back(color_buffer: np.ndarray,
+                                      depth_buffer: DepthBuffer,
+                                      screen_triangles: np.ndarray,
+                                      colors: np.ndarray,
+                                      scissor: tuple[int, int, int, int] = None,
+                                      first_chunk_size: int = FRONT_TO_BACK_FIRST_CHUNK_SIZE,
+                                      tile_size: int = EARLY_Z_TILE_SIZE,
+                                      subpixel: bool = False) -> tuple[int, int]:
+    # Rasterizes (N, 3, 3) screen triangles with per-triangle (N, 3) colors nearest first. Before every chunk
+    # the farthest depth per tile is taken from the depth buffer and spans behind it are skipped entirely.
+    # Chunks double in size, the nearest triangles establish the occluders for the many farther ones.
+    # Spans come from get_triangle_spans_subpixel with subpixel. Returns the number of pixels tested and written
+    get_spans = get_triangle_spans_subpixel if subpixel else get_triangle_spans
+    if scissor is None:
+        scissor = get_screen_scissor(color_buffer.shape[0], color_buffer.shape[1])
+    min_x, min_y, max_x, max_y = scissor
+    width, height = color_buffer.shape[0], color_buffer.shape[1]
+
+    order = get_front_to_back_order(screen_triangles)
+    screen_triangles = screen_triangles[order]
+    colors = np.asarray(colors, dtype=np.uint8)[order]
+
+    pixels_tested = 0
+    pixels_written = 0
+    chunk_start = 0
+    chunk_size = first_chunk_size
+    while chunk_start < screen_triangles.shape[0]:
+        chunk = slice(chunk_start, chunk_start + chunk_size)
+        chunk_start += chunk_size
+        chunk_size *= 2
+        chunk_triangles = screen_triangles[chunk]
+        chunk_colors = colors[chunk]
+        table = get_tile_max_depth_table(depth_buffer.get_depths(), width, height, tile_size)
+
+        for batch in get_fragment_batches(chunk_triangles):
+            span_triangles, *spans = get_spans(chunk_triangles[batch], min_y, max_y)
+            visible = get_visible_spans_mask(table, tile_size, *spans, min_x, max_x)
+            span_triangles = span_triangles[visible]
+            spans = [values[visible] for values in spans]
+
+            fragment_spans, xs, ys, zs = get_span_fragments(*spans, min_x, max_x)
+            pixels_tested += xs.shape[0]
+            pixels_written += write_fragments(color_buffer, depth_buffer, xs, ys, zs,
+                                              chunk_colors[batch][span_triangles[fragment_spans]])
+    return pixels_tested, pixels_written
@@ -0,0 +1,46 @@
+import numpy as np
+
+from depth_buffer import DepthBuffer
+
+BACKGROUND_COLOR = (255, 255, 255)
+
+
+class RenderTarget:
+    # Color and depth buffers of one frame, the color buffer is indexed [x, y] like pygame.surfarray and the
+    # depth buffer is a float64 DepthBuffer unless given. shape_bounds maps the id of every
+    # drawn shape to the inclusive pixel rectangle its triangles touched in the last frame
+    width: int
+    height: int
+    color_buffer: np.ndarray
+    depth_buffer: DepthBuffer
+    shape_bounds: dict[int, tuple[int, int, int, int]]
+
+    def __init__(self, width: int, height: int, color_buffer: np.ndarray = None, depth_buffer: DepthBuffer = None):
+        self.width = width
+        self.height = height
+        self.color_buffer = color_buffer if color_buffer is not None else np.empty((width, height, 3), dtype=np.uint8)
+        self.depth_buffer = depth_buffer if depth_buffer is not None else DepthBuffer(width, height)
+        self.shape_bounds = {}
+
+    def clear(self,
+              background_color: tuple[int, int, int] = BACKGROUND_COLOR,
+              rect: tuple[int, int, int, int] = None) -> None:
+        # Clears the inclusive rectangle (min_x, min_y, max_x, max_y) or the whole target
+        if rect is None:
+            self.color_buffer[:] = background_color
+            self.depth_buffer.clear()
+            self.shape_bounds = {}
+            return
+
+        min_x, min_y, max_x, max_y = rect
+        self.color_buffer[min_x:max_x + 1, min_y:max_y + 1] = background_color
+        self.depth_buffer.clear(rect)
+
+    def get_pixels_covered(self) -> int:
+        return self.depth_buffer.get_covered_count()
+
+    def get_color_array(self) -> np.ndarray:
+        return self.color_buffer.copy()
+
+    def get_depth_array(self) -> np.ndarray:
+        return self.depth_buffer.get_depths().copy()
@@ -0,0 +1,226 @@
+import numpy as np
+
+from bvh import SceneBVH
+from camera import Camera
+from frame_stats import FrameStats, measure_stage
+from frustum import get_frustum_planes, get_spheres_outside_mask
+from instancing import InstancedMesh
+from lod import select_lods
+from mesh import Mesh
+from occlusion import get_unoccluded_shapes, get_shape_screen_bounds
+from pipeline import get_shape_triangles, update_instanced_mesh, TransformCache, draw_shape, draw_shapes_front_to_back
+from preview import render_preview, RENDER_MODE_FILLED
+from rasterizer import get_screen_triangles, get_screen_bounds, get_union_rect, are_rects_overlapping
+from render_target import RenderTarget, BACKGROUND_COLOR
+from streaming import StreamedMesh, render_streamed_mesh
+from tiled_rasterizer import TiledRasterizer
+
+
+class RenderSettings:
+    # With front_to_back the triangles of all shapes are sorted nearest first before rasterization,
+    # it is ignored by the tiled rasterizer. With occlusion_culling shapes hidden behind the nearest
+    # large shapes are skipped before they are transformed. With level_of_detail shapes with simplified
+    # levels are drawn at the level matching their size on screen. With subpixel_rasterization triangles are
+    # rasterized from fixed-point vertices with the top-left fill rule instead of draw_triangle's truncated ones.
+    # The render mode draws filled triangles or one of the wireframe and point cloud previews
+    front_to_back: bool
+    show_hud: bool
+    occlusion_culling: bool
+    level_of_detail: bool
+    subpixel_rasterization: bool
+    render_mode: str
+
+    def __init__(self,
+                 front_to_back: bool = False,
+                 show_hud: bool = False,
+                 occlusion_culling: bool = False,
+                 level_of_detail: bool = True,
+                 subpixel_rasterization: bool = False,
+                 render_mode: str = RENDER_MODE_FILLED):
+        self.front_to_back = front_to_back
+        self.show_hud = show_hud
+        self.occlusion_culling = occlusion_culling
+        self.level_of_detail = level_of_detail
+        self.subpixel_rasterization = subpixel_rasterization
+        self.render_mode = render_mode
+
+
+def get_shapes_in_frustum(camera: Camera,
+                          shapes: list[Mesh],
+                          scene_bvh: SceneBVH = None,
+                          frame_stats: FrameStats = None) -> list[Mesh]:
+    # Drops shapes whose bounds are outside the camera frustum before any of their vertices is transformed,
+    # through the scene BVH when there is one and by testing every bounding sphere otherwise
+    with measure_stage(frame_stats, "transform_cull"):
+        frustum_planes = get_frustum_planes(camera)
+        if scene_bvh is not None:
+            visible_shapes = scene_bvh.get_visible_shapes(frustum_planes)
+        elif shapes:
+            centers = np.array([mesh.bounding_sphere_center for mesh in shapes])
+            radii = np.array([mesh.bounding_sphere_radius for mesh in shapes])
+            outside_mask = get_spheres_outside_mask(frustum_planes, centers, radii)
+            visible_shapes = [mesh for mesh, is_outside in zip(shapes, outside_mask) if not is_outside]
+        else:
+            visible_shapes = []
+
+    if frame_stats is not None:
+        frame_stats.add_shape_culling(len(shapes), len(visible_shapes))
+    return visible_shapes
+
+
+def is_shape_outside_rect(render_target: RenderTarget, shape, rect: tuple[int, int, int, int] = None) -> bool:
+    # Whether a shape drawn in the last frame stayed away from the rectangle, then it does not need to be
+    # drawn again when only the rectangle is redrawn
+    if rect is None or id(shape) not in render_target.shape_bounds:
+        return False
+    return not are_rects_overlapping(render_target.shape_bounds[id(shape)], rect)
+
+
+def get_draw_batches(camera: Camera,
+                     shapes: list[Mesh],
+                     transformed: list[np.ndarray],
+                     instanced_meshes: list[InstancedMesh],
+                     render_target: RenderTarget,
+                     frame_stats: FrameStats = None,
+                     dirty_rect: tuple[int, int, int, int] = None,
+                     transform_cache: TransformCache = None):
+    # Yields (triangles after the perspective divide, color or (N, 3) triangle colors) in drawing order, the
+    # shapes first and then the instanced meshes, and records their screen bounds in the render target.
+    # Triangles already transformed earlier in the frame, or in an earlier frame through the transform cache,
+    # are not transformed again. Shapes outside the dirty rectangle are skipped
+    for mesh, triangles in zip(shapes, transformed):
+        if is_shape_outside_rect(render_target, mesh, dirty_rect):
+            continue
+        triangles = (triangles if triangles is not None
+                     else get_shape_triangles(camera, mesh, frame_stats, transform_cache))
+        update_shape_bounds(render_target, mesh, triangles)
+        yield triangles, mesh.color
+    for instanced_mesh in instanced_meshes:
+        if is_shape_outside_rect(render_target, instanced_mesh, dirty_rect):
+            continue
+        triangles, colors = update_instanced_mesh(camera, instanced_mesh, frame_stats)
+        update_shape_bounds(render_target, instanced_mesh, triangles)
+        yield triangles, colors
+
+
+def update_shape_bounds(render_target: RenderTarget, shape, triangles: np.ndarray) -> None:
+    bounds = get_screen_bounds(triangles, render_target.width, render_target.height)
+    if bounds is None:
+        render_target.shape_bounds.pop(id(shape), None)
+    else:
+        render_target.shape_bounds[id(shape)] = bounds
+
+
+def get_dirty_rect(camera: Camera,
+                   render_target: RenderTarget,
+                   changed_shapes: list) -> tuple[int, int, int, int] | None:
+    # Inclusive pixel rectangle covering where the changed shapes were drawn in the last frame and where
+    # they may be drawn now, None when nothing on screen changes. Shapes are meshes, instanced or streamed
+    # meshes, only meshes have known bounds before they are transformed
+    dirty_rect = None
+    full_rect = (0, 0, render_target.width - 1, render_target.height - 1)
+    for shape in changed_shapes:
+        for drawn_shape in [shape] + getattr(shape, "lods", []):
+            dirty_rect = get_union_rect(dirty_rect, render_target.shape_bounds.get(id(drawn_shape)))
+        if not isinstance(shape, Mesh):
+            return full_rect
+        min_x, min_y, max_x, max_y, _, in_front = get_shape_screen_bounds(camera, [shape], render_target.width,
+                                                                          render_target.height)
+        if not in_front[0]:
+            return full_rect
+        dirty_rect = get_union_rect(dirty_rect, (int(min_x[0]), int(min_y[0]), int(max_x[0]), int(max_y[0])))
+    return dirty_rect
+
+
+def render(camera: Camera,
+           shapes: list[Mesh],
+           render_target: RenderTarget,
+           frame_stats: FrameStats = None,
+           tiled_rasterizer: TiledRasterizer = None,
+           settings: RenderSettings = None,
+           background_color: tuple[int, int, int] = BACKGROUND_COLOR,
+           scene_bvh: SceneBVH = None,
+           instanced_meshes: list[InstancedMesh] = None,
+           streamed_meshes: list[StreamedMesh] = None,
+           dirty_rect: tuple[int, int, int, int] = None,
+           transform_cache: TransformCache = None) -> RenderTarget:
+    # Renders one frame without any display, with a tiled rasterizer the frame is rendered into its
+    # shared render target instead. Returns the render target holding the frame. A scene BVH has to be
+    # built over shapes and refit after any of them moved. Instanced meshes are drawn after the shapes and
+    # streamed meshes last, chunk by chunk and never sorted front to back.
+    # With a dirty rectangle from get_dirty_rect only that part of the last frame is redrawn, the camera has
+    # to be unchanged since. The tiled rasterizer always redraws the whole frame. A transform cache kept across
+    # frames skips transforming and clipping meshes while they and the camera are unchanged
+    settings = settings if settings is not None else RenderSettings()
+    instanced_meshes = instanced_meshes if instanced_meshes is not None else []
+    streamed_meshes = streamed_meshes if streamed_meshes is not None else []
+    shapes = get_shapes_in_frustum(camera, shapes, scene_bvh, frame_stats)
+    if tiled_rasterizer is not None:
+        render_target = tiled_rasterizer.render_target
+        dirty_rect = None
+    if settings.level_of_detail:
+        shapes = select_lods(camera, shapes, render_target.height)
+
+    if settings.render_mode != RENDER_MODE_FILLED:
+        # Previews are always drawn whole and record no shape bounds
+        render_target.clear(background_color)
+        render_preview(camera, shapes, instanced_meshes, streamed_meshes, render_target, settings.render_mode,
+                       frame_stats)
+        update_render_stats(render_target, frame_stats)
+        return render_target
+
+    transformed = [None] * len(shapes)
+    if settings.occlusion_culling:
+        shapes, transformed = get_unoccluded_shapes(camera, shapes, render_target.width, render_target.height,
+                                                    frame_stats, transform_cache, settings.subpixel_rasterization)
+
+    render_target.clear(background_color, dirty_rect)
+    batches = get_draw_batches(camera, shapes, transformed, instanced_meshes, render_target, frame_stats, dirty_rect,
+                               transform_cache)
+    if tiled_rasterizer is not None:
+        batches = [(get_screen_triangles(triangles, render_target.width, render_target.height), color)
+                   for triangles, color in batches]
+        with measure_stage(frame_stats, "raster"):
+            pixels_tested, pixels_written = tiled_rasterizer.rasterize(batches, settings.subpixel_rasterization)
+        if frame_stats is not None:
+            frame_stats.add_raster(sum(triangles.shape[0] for triangles, _ in batches), pixels_tested, pixels_written)
+    elif settings.front_to_back:
+        batches = list(batches)
+        draw_shapes_front_to_back(render_target.color_buffer, render_target.depth_buffer,
+                                  [triangles for triangles, _ in batches], [color for _, color in batches],
+                                  frame_stats, dirty_rect, settings.subpixel_rasterization)
+    else:
+        for triangles, color in batches:
+            draw_shape(render_target.color_buffer, render_target.depth_buffer, triangles, color, frame_stats,
+                       dirty_rect, settings.subpixel_rasterization)
+
+    for streamed_mesh in streamed_meshes:
+        if not is_shape_outside_rect(render_target, streamed_mesh, dirty_rect):
+            render_streamed_mesh(camera, streamed_mesh, render_target, frame_stats, tiled_rasterizer,
+                                 scissor=dirty_rect, subpixel=settings.subpixel_rasterization)
+
+    update_render_stats(render_target, frame_stats)
+    return render_target
+
+
+def update_render_stats(render_target: RenderTarget, frame_stats: FrameStats = None) -> None:
+    if frame_stats is not None:
+        frame_stats.pixels_covered = render_target.get_pixels_covered()
+        frame_stats.render_width = render_target.width
+        frame_stats.render_height = render_target.height
+
+
+def render_to_array(camera: Camera,
+                    shapes: list[Mesh],
+                    width: int = None,
+                    height: int = None,
+                    background_color: tuple[int, int, int] = BACKGROUND_COLOR,
+                    instanced_meshes: list[InstancedMesh] = None) -> tuple[np.ndarray, np.ndarray]:
+    # Returns the (width, height, 3) color and (width, height) depth arrays, indexed [x, y] like
+    # pygame.surfarray. The resolution defaults to the camera's, its aspect ratio should match the camera's
+    width = width if width is not None else camera.screen_width
+    height = height if height is not None else camera.screen_height
+
+    render_target = render(camera, shapes, RenderTarget(width, height), background_color=background_color,
+                           instanced_meshes=instanced_meshes)
+    return render_target.get_color_array(), render_target.get_depth_array()
@@ -0,0 +1,83 @@
+from collections import deque
+
+from depth_buffer import DepthBuffer, DEPTH_FLOAT32
+from render_target import RenderTarget
+
+# Seconds a frame may take to render and present, the render resolution is lowered when frames take longer
+FRAME_TIME_BUDGET = 1 / 60
+MIN_RESOLUTION_SCALE = 0.25
+MAX_RESOLUTION_SCALE = 1.0
+# Scales are rounded down to multiples of this step, so only a few render target sizes are ever allocated
+RESOLUTION_SCALE_STEP = 0.05
+# Frame times within this fraction of the budget keep the current scale
+RESOLUTION_HYSTERESIS = 0.2
+# Frames averaged before the scale is changed, the frames after a change are measured at the new scale
+RESOLUTION_FRAME_WINDOW = 8
+
+
+class DynamicResolution:
+    # Picks the render resolution of the next frame from the times of the last frames. Rendering time is
+    # mostly spent on pixels, so the scale of both sides is changed by the square root of the time ratio.
+    # The frames are rendered into a render target of the scaled size and stretched over the screen
+    screen_width: int
+    screen_height: int
+    frame_time_budget: float
+    min_scale: float
+    max_scale: float
+    hysteresis: float
+
+    scale: float
+    frame_seconds: deque[float]
+    render_target: RenderTarget
+
+    def __init__(self,
+                 screen_width: int,
+                 screen_height: int,
+                 frame_time_budget: float = FRAME_TIME_BUDGET,
+                 min_scale: float = MIN_RESOLUTION_SCALE,
+                 max_scale: float = MAX_RESOLUTION_SCALE,
+                 hysteresis: float = RESOLUTION_HYSTERESIS,
+                 frame_window: int = RESOLUTION_FRAME_WINDOW):
+        if not 0 < min_scale <= max_scale <= 1:
+            raise ValueError("Resolution scales must satisfy 0 < min_scale <= max_scale <= 1")
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.frame_time_budget = frame_time_budget
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.hysteresis = hysteresis
+
+        self.scale = max_scale
+        self.frame_seconds = deque(maxlen=frame_window)
+        self.render_target = None
+
+    def add_frame_time(self, frame_seconds: float) -> None:
+        self.frame_seconds.append(frame_seconds)
+        if len(self.frame_seconds) < self.frame_seconds.maxlen:
+            return
+
+        average_seconds = sum(self.frame_seconds) / len(self.frame_seconds)
+        lower_seconds = self.frame_time_budget * (1 - self.hysteresis)
+        upper_seconds = self.frame_time_budget * (1 + self.hysteresis)
+        if lower_seconds <= average_seconds <= upper_seconds:
+            return
+
+        if average_seconds > 0:
+            scale = self.scale * (self.frame_time_budget / average_seconds) ** 0.5
+        else:
+            scale = self.max_scale
+        scale = min(max(RESOLUTION_SCALE_STEP * int(scale / RESOLUTION_SCALE_STEP), self.min_scale), self.max_scale)
+        if scale != self.scale:
+            self.scale = scale
+            self.frame_seconds.clear()
+
+    def get_render_size(self) -> tuple[int, int]:
+        return max(round(self.screen_width * self.scale), 1), max(round(self.screen_height * self.scale), 1)
+
+    def get_render_target(self) -> RenderTarget:
+        # Allocated again only when the scale changed
+        width, height = self.get_render_size()
+        if self.render_target is None or (self.render_target.width, self.render_target.height) != (width, height):
+            self.render_target = RenderTarget(width, height,
+                                              depth_buffer=DepthBuffer(width, height, DEPTH_FLOAT32, clear_free=True))
+        return self.render_target
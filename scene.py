@@ -0,0 +1,83 @@
+import json
+import os
+
+import numpy as np
+
+from instancing import InstancedMesh
+from matrix import get_translation_matrix
+from mesh import Mesh
+from mesh_cache import load_mesh
+from simplification import build_lods
+from vector import Vector4
+
+CUBOID_OFFSETS = [(1, 0, 1), (-4, 0, 1), (1, 0, 5), (-4, 0, 5)]
+CUBOID_COLORS = [(127, 0, 127), (0, 255, 0), (0, 0, 255), (127, 127, 0)]
+
+
+def get_cuboid_scene(filename: str = "cuboid.txt", instancing: bool = False) -> tuple[list[Mesh], list[InstancedMesh]]:
+    # The scene of main.py: four cuboids, as offset copies of the mesh with levels of detail or, with instancing,
+    # as instances sharing one mesh and differing only by their model matrix and color. Bounding volume,
+    # occlusion culling and levels of detail only apply to the copies
+    cuboid = load_mesh(filename)
+    if instancing:
+        cuboids = InstancedMesh(cuboid)
+        for offset, color in zip(CUBOID_OFFSETS, CUBOID_COLORS):
+            cuboids.add_instance(get_translation_matrix(Vector4.from_cords(*offset, 1)), color)
+        return [], [cuboids]
+
+    build_lods(cuboid)
+    shapes = []
+    for offset, color in zip(CUBOID_OFFSETS, CUBOID_COLORS):
+        shape = cuboid.copy()
+        shape.set_offset(Vector4.from_cords(*offset, 1))
+        shape.set_color(color)
+        shapes.append(shape)
+    return shapes, []
+
+
+def get_instance_arrays(entries: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    # (I, 4, 4) model matrices and (I, 3) colors of scene entries with an offset and a color
+    model_matrices = np.array([get_translation_matrix(Vector4.from_cords(*entry.get("offset", (0, 0, 0)), 1))
+                               .matrix_np for entry in entries]).reshape(-1, 4, 4)
+    colors = np.array([entry["color"] for entry in entries], dtype=np.uint8).reshape(-1, 3)
+    return model_matrices, colors
+
+
+def load_scene(filename: str, instance_meshes: bool = False) -> tuple[list[Mesh], list[InstancedMesh]]:
+    # Returns the shapes and instanced meshes of a JSON scene file like
+    #   {"meshes": [{"mesh": "cuboid.txt", "offset": [0, 0, 5], "color": [255, 0, 0]}],
+    #    "instanced_meshes": [{"mesh": "cuboid.txt", "instances": [{"offset": [1, 0, 1], "color": [0, 0, 255]}]}]}
+    # Mesh files are in the format of cuboid.txt, relative to the scene file, and loaded through their binary
+    # cache. Offsets default to the origin. Every shape is a copy of its mesh moved by its offset, with
+    # instance_meshes the shapes of each mesh file become instances of one instanced mesh instead, all sharing
+    # the loaded arrays
+    with open(filename, "r") as f:
+        description = json.load(f)
+    directory = os.path.dirname(filename)
+
+    meshes = {}
+
+    def get_mesh(mesh_filename: str) -> Mesh:
+        path = os.path.join(directory, mesh_filename)
+        if path not in meshes:
+            meshes[path] = load_mesh(path)
+        return meshes[path]
+
+    shapes = []
+    instanced_meshes = []
+    if instance_meshes:
+        entries_by_mesh = {}
+        for entry in description.get("meshes", []):
+            entries_by_mesh.setdefault(entry["mesh"], []).append(entry)
+        for mesh_filename, entries in entries_by_mesh.items():
+            instanced_meshes.append(InstancedMesh(get_mesh(mesh_filename), *get_instance_arrays(entries)))
+    else:
+        for entry in description.get("meshes", []):
+            mesh = get_mesh(entry["mesh"]).copy()
+            mesh.set_offset(Vector4.from_cords(*entry.get("offset", (0, 0, 0)), 1))
+            mesh.set_color(tuple(entry["color"]))
+            shapes.append(mesh)
+
+    for entry in description.get("instanced_meshes", []):
+        instanced_meshes.append(InstancedMesh(get_mesh(entry["mesh"]), *get_instance_arrays(entry["instances"])))
+    return shapes, instanced_meshes
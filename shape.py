@@ -1,4 +1,4 @@
-from vector import Vector4
+from vector import Vector4, NUMPY_ARRAY_TYPE
 import numpy as np
 
 
@@ -10,6 +10,10 @@ class Shape:
         self.triangles = triangles
         self.color = color
 
+    def get_triangles_np(self) -> np.ndarray:
+        return np.array([[point.vector_np[:, 0] for point in triangle] for triangle in self.triangles],
+                        dtype=NUMPY_ARRAY_TYPE).reshape(-1, 3, 4)
+
     def copy(self):
         return Shape([(point1.copy(), point2.copy(), point3.copy()) for point1, point2, point3 in self.triangles],
                      self.color)
@@ -0,0 +1,206 @@
+import argparse
+import heapq
+import sys
+
+import numpy as np
+
+from mesh import Mesh, NUMPY_INDEX_TYPE
+from vector import NUMPY_ARRAY_TYPE
+
+# Quadric error metric edge collapse (Garland and Heckbert). Collapsed vertices are placed on the collapsed
+# edge, so every level stays inside the bounding box and sphere of the original mesh
+
+LOD_LEVEL_COUNT = 4
+LOD_REDUCTION = 0.5
+# Meshes with fewer faces are not simplified any further
+LOD_MIN_FACES = 32
+
+# Weight of the planes that keep open borders in place
+BORDER_WEIGHT = 1000.0
+
+
+def get_plane_quadrics(points: np.ndarray, normals: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # (K, 4, 4) quadrics of the planes through points with the given unit normals
+    planes = np.concatenate([normals, -np.einsum('ij,ij->i', normals, points)[:, np.newaxis]], axis=1)
+    return weights[:, np.newaxis, np.newaxis] * planes[:, :, np.newaxis] * planes[:, np.newaxis, :]
+
+
+def get_vertex_quadrics(positions: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    quadrics = np.zeros((positions.shape[0], 4, 4))
+    triangles = positions[faces]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    areas = np.linalg.norm(normals, axis=1)
+    non_degenerate = areas > 0
+    normals = normals[non_degenerate] / areas[non_degenerate, np.newaxis]
+    face_quadrics = get_plane_quadrics(triangles[non_degenerate, 0], normals, areas[non_degenerate] / 2)
+    for corner in range(3):
+        np.add.at(quadrics, faces[non_degenerate, corner], face_quadrics)
+
+    # Edges used by a single face lie on a border, planes perpendicular to the face hold them in place
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    edge_faces = np.tile(np.arange(faces.shape[0]), 3)
+    sorted_edges = np.sort(edges, axis=1)
+    _, inverse, counts = np.unique(sorted_edges, axis=0, return_inverse=True, return_counts=True)
+    border = (counts[inverse.reshape(-1)] == 1) & non_degenerate[edge_faces]
+    if np.any(border):
+        face_normals = np.zeros((faces.shape[0], 3))
+        face_normals[non_degenerate] = normals
+        border_edges = edges[border]
+        directions = positions[border_edges[:, 1]] - positions[border_edges[:, 0]]
+        border_normals = np.cross(directions, face_normals[edge_faces[border]])
+        lengths = np.linalg.norm(border_normals, axis=1)
+        valid = lengths > 0
+        border_quadrics = get_plane_quadrics(positions[border_edges[valid, 0]],
+                                             border_normals[valid] / lengths[valid, np.newaxis],
+                                             BORDER_WEIGHT * np.ones(np.count_nonzero(valid)))
+        np.add.at(quadrics, border_edges[valid, 0], border_quadrics)
+        np.add.at(quadrics, border_edges[valid, 1], border_quadrics)
+    return quadrics
+
+
+def get_collapses(quadrics: np.ndarray, p1: np.ndarray, p2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Points of the (K,) segments p1 p2 with the lowest error of the (K, 4, 4) quadrics, and those errors.
+    # Candidates are both ends, the middle and the minimum along the segment
+    h1 = np.concatenate([p1, np.ones((p1.shape[0], 1))], axis=1)
+    directions = np.concatenate([p2 - p1, np.zeros((p1.shape[0], 1))], axis=1)
+    q_directions = np.einsum('kij,kj->ki', quadrics, directions)
+    curvatures = np.einsum('ki,ki->k', directions, q_directions)
+    slopes = np.einsum('ki,ki->k', h1, q_directions)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_min = np.where(curvatures > 0, -slopes / curvatures, 0.0)
+
+    ts = np.stack([np.clip(t_min, 0, 1), np.zeros_like(t_min), np.full_like(t_min, 0.5), np.ones_like(t_min)],
+                  axis=1)
+    points = h1[:, np.newaxis] + ts[:, :, np.newaxis] * directions[:, np.newaxis]
+    costs = np.einsum('kci,kij,kcj->kc', points, quadrics, points)
+    best = np.argmin(costs, axis=1)
+    k = np.arange(p1.shape[0])
+    return costs[k, best], points[k, best, :3]
+
+
+def is_flipping(positions: np.ndarray,
+                faces: np.ndarray,
+                face_indices: list[int],
+                moved: list[int],
+                new_position: np.ndarray) -> bool:
+    # Whether moving the vertices in moved to new_position turns any of the faces around
+    if not face_indices:
+        return False
+    face_vertices = faces[face_indices]
+    triangles = positions[face_vertices]
+    moved_triangles = np.where(np.isin(face_vertices, moved)[:, :, np.newaxis], new_position, triangles)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    moved_normals = np.cross(moved_triangles[:, 1] - moved_triangles[:, 0],
+                             moved_triangles[:, 2] - moved_triangles[:, 0])
+    return bool(np.any(np.einsum('ij,ij->i', normals, moved_normals) <= 0))
+
+
+def simplify_mesh(mesh: Mesh, target_face_count: int) -> Mesh:
+    # Collapses the cheapest edges until at most target_face_count faces are left or no edge can be
+    # collapsed without turning faces around. Face winding is kept
+    positions = mesh.vertices[:, :3].astype(float)
+    faces = mesh.faces.copy()
+    quadrics = get_vertex_quadrics(positions, faces)
+
+    vertex_faces = [set() for _ in range(positions.shape[0])]
+    for face_index, face in enumerate(faces):
+        for vertex in face:
+            vertex_faces[vertex].add(face_index)
+    face_alive = np.ones(faces.shape[0], dtype=bool)
+    face_count = faces.shape[0]
+    versions = np.zeros(positions.shape[0], dtype=np.int64)
+
+    # Heap entries are (cost, v1, v2, version of v1, version of v2) and outdated once either vertex changed
+    edges = np.unique(np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1),
+                      axis=0)
+    costs, _ = get_collapses(quadrics[edges[:, 0]] + quadrics[edges[:, 1]], positions[edges[:, 0]],
+                             positions[edges[:, 1]])
+    heap = [(cost, v1, v2, 0, 0) for cost, (v1, v2) in zip(costs.tolist(), edges.tolist())]
+    heapq.heapify(heap)
+
+    while face_count > target_face_count and heap:
+        _, v1, v2, version1, version2 = heapq.heappop(heap)
+        if versions[v1] != version1 or versions[v2] != version2:
+            continue
+
+        quadric = quadrics[v1] + quadrics[v2]
+        _, new_positions = get_collapses(quadric[np.newaxis], positions[v1][np.newaxis], positions[v2][np.newaxis])
+        new_position = new_positions[0]
+        shared_faces = vertex_faces[v1] & vertex_faces[v2]
+        if is_flipping(positions, faces, list((vertex_faces[v1] | vertex_faces[v2]) - shared_faces), [v1, v2],
+                       new_position):
+            continue
+
+        # v2 is merged into v1
+        for face_index in shared_faces:
+            face_alive[face_index] = False
+            face_count -= 1
+            for vertex in faces[face_index]:
+                vertex_faces[vertex].discard(face_index)
+        for face_index in vertex_faces[v2]:
+            faces[face_index][faces[face_index] == v2] = v1
+            vertex_faces[v1].add(face_index)
+        vertex_faces[v2] = set()
+        positions[v1] = new_position
+        quadrics[v1] = quadric
+        versions[v1] += 1
+        versions[v2] += 1
+
+        neighbours = np.array(sorted({int(vertex) for face_index in vertex_faces[v1]
+                                      for vertex in faces[face_index]} - {v1}), dtype=NUMPY_INDEX_TYPE)
+        if neighbours.shape[0] == 0:
+            continue
+        costs, _ = get_collapses(quadrics[v1] + quadrics[neighbours], positions[np.minimum(neighbours, v1)],
+                                 positions[np.maximum(neighbours, v1)])
+        for cost, neighbour in zip(costs.tolist(), neighbours.tolist()):
+            edge = (v1, neighbour) if v1 < neighbour else (neighbour, v1)
+            heapq.heappush(heap, (cost, *edge, int(versions[edge[0]]), int(versions[edge[1]])))
+
+    # Compact the vertices still referenced by faces
+    faces = faces[face_alive]
+    used, inverse = np.unique(faces, return_inverse=True)
+    vertices = np.ones((used.shape[0], 4), dtype=NUMPY_ARRAY_TYPE)
+    vertices[:, :3] = positions[used]
+    return Mesh(vertices, inverse.reshape(-1, 3).astype(NUMPY_INDEX_TYPE), mesh.color)
+
+
+def build_lods(mesh: Mesh,
+               level_count: int = LOD_LEVEL_COUNT,
+               reduction: float = LOD_REDUCTION,
+               min_faces: int = LOD_MIN_FACES) -> list[Mesh]:
+    # Sets and returns up to level_count - 1 coarser levels, each with about reduction times the faces of
+    # the previous one. Levels stop early once a mesh is small enough or can not be simplified further
+    lods = []
+    previous = mesh
+    for _ in range(level_count - 1):
+        if previous.faces.shape[0] < min_faces:
+            break
+        lod = simplify_mesh(previous, int(previous.faces.shape[0] * reduction))
+        if lod.faces.shape[0] >= previous.faces.shape[0]:
+            break
+        lods.append(lod)
+        previous = lod
+
+    mesh.lods = lods
+    mesh.lod_level = 0
+    return lods
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate simplified levels of detail of a mesh file")
+    parser.add_argument("input", help="mesh file in the format of cuboid.txt")
+    parser.add_argument("--levels", type=int, default=LOD_LEVEL_COUNT, help="levels including the original")
+    parser.add_argument("--reduction", type=float, default=LOD_REDUCTION, help="face ratio between levels")
+    args = parser.parse_args()
+
+    mesh = Mesh.read_mesh_from_file(args.input)
+    base_name = args.input[:-4] if args.input.endswith(".txt") else args.input
+    for level, lod in enumerate(build_lods(mesh, args.levels, args.reduction), start=1):
+        filename = f"{base_name}.lod{level}.txt"
+        lod.write_mesh_to_file(filename)
+        print(f"{filename}: {lod.faces.shape[0]} faces")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+
+from camera import Camera
+from clipping import clip_triangles_in_clip_space, GUARD_BAND
+from culling import get_backface_culling_mask
+from frame_stats import FrameStats, measure_stage
+from matrix import perspective_divide
+from mesh import Mesh
+from mesh_cache import get_binary_mesh_buffers
+from pipeline import draw_shape
+from rasterizer import get_screen_triangles, get_screen_bounds, get_union_rect
+from render_target import RenderTarget
+from tiled_rasterizer import TiledRasterizer
+
+# Triangles pulled from a source at once, buffers of the streaming pipeline are bounded by it
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+class StreamedMesh:
+    # A mesh that is never held in memory as a whole. get_chunks returns a new iterator over (C, 3, 4)
+    # world-space triangles every time it is called, every frame pulls the chunks once
+    get_chunks: Callable[[], Iterable[np.ndarray]]
+    color: tuple[int, int, int]
+
+    def __init__(self, get_chunks: Callable[[], Iterable[np.ndarray]], color: tuple[int, int, int]):
+        self.get_chunks = get_chunks
+        self.color = color
+
+    @staticmethod
+    def from_binary_mesh_file(filename: str,
+                              color: tuple[int, int, int],
+                              chunk_size: int = STREAM_CHUNK_SIZE) -> 'StreamedMesh':
+        # Only the pages of the memory-mapped file touched by the current chunk need to be resident
+        def get_chunks() -> Iterator[np.ndarray]:
+            vertices, faces = get_binary_mesh_buffers(filename)
+            for start in range(0, faces.shape[0], chunk_size):
+                yield np.asarray(vertices[np.asarray(faces[start:start + chunk_size])])
+
+        return StreamedMesh(get_chunks, color)
+
+    @staticmethod
+    def from_mesh(mesh: Mesh, chunk_size: int = STREAM_CHUNK_SIZE) -> 'StreamedMesh':
+        def get_chunks() -> Iterator[np.ndarray]:
+            for start in range(0, mesh.faces.shape[0], chunk_size):
+                yield mesh.vertices[mesh.faces[start:start + chunk_size]]
+
+        return StreamedMesh(get_chunks, mesh.color)
+
+
+def get_visible_chunk_triangles_in_clip_space(camera: Camera,
+                                              triangles: np.ndarray,
+                                              frame_stats: FrameStats = None) -> np.ndarray:
+    # Same culling and transform as get_visible_triangles_in_clip_space, with the normals of the chunk
+    # computed on the fly instead of kept for the whole mesh
+    with measure_stage(frame_stats, "transform_cull"):
+        view_projection_matrix = camera.get_view_projection_matrix()
+
+        face_normals = np.cross(triangles[:, 1, :3] - triangles[:, 0, :3], triangles[:, 2, :3] - triangles[:, 0, :3])
+        visible_faces_mask = get_backface_culling_mask(face_normals, triangles[:, 0, :3],
+                                                       camera.get_eye_position().vector_np[:3, 0])
+        if frame_stats is not None:
+            frame_stats.add_culling(visible_faces_mask)
+
+        visible_triangles = triangles[visible_faces_mask]
+        return (visible_triangles.reshape(-1, 4) @ view_projection_matrix.matrix_np.T).reshape(-1, 3, 4)
+
+
+def render_streamed_mesh(camera: Camera,
+                         streamed_mesh: StreamedMesh,
+                         render_target: RenderTarget,
+                         frame_stats: FrameStats = None,
+                         tiled_rasterizer: TiledRasterizer = None,
+                         guard_band: float = GUARD_BAND,
+                         scissor: tuple[int, int, int, int] = None,
+                         subpixel: bool = False) -> None:
+    # Culls, transforms, clips and rasterizes one chunk at a time into the buffers of the render target,
+    # which is the tiled rasterizer's render target when there is one. The scissor is ignored by the tiled
+    # rasterizer. Records the screen bounds of the mesh in the render target
+    bounds = None
+    for triangles in streamed_mesh.get_chunks():
+        visible_triangles = get_visible_chunk_triangles_in_clip_space(camera, triangles, frame_stats)
+        with measure_stage(frame_stats, "clip"):
+            triangles = perspective_divide(clip_triangles_in_clip_space(visible_triangles, guard_band, frame_stats))
+        bounds = get_union_rect(bounds, get_screen_bounds(triangles, render_target.width, render_target.height))
+
+        if tiled_rasterizer is None:
+            draw_shape(render_target.color_buffer, render_target.depth_buffer, triangles, streamed_mesh.color,
+                       frame_stats, scissor, subpixel)
+            continue
+
+        with measure_stage(frame_stats, "raster"):
+            screen_triangles = get_screen_triangles(triangles, render_target.width, render_target.height)
+            pixels_tested, pixels_written = tiled_rasterizer.rasterize([(screen_triangles, streamed_mesh.color)],
+                                                                          subpixel)
+        if frame_stats is not None:
+            frame_stats.add_raster(triangles.shape[0], pixels_tested, pixels_written)
+
+    if bounds is not None:
+        render_target.shape_bounds[id(streamed_mesh)] = bounds
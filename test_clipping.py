@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from clipping import triangle_clip_against_plane, triangles_clip_against_plane
+from vector import Vector4, Vec4
+
+PLANES = [((0.0, 0.0, 0.1, 1.0), (0.0, 0.0, 1.0, 0.0)),
+          ((-1.0, 0.0, 0.0, 1.0), (1.0, 0.0, 0.0, 0.0)),
+          ((0.0, 1.0, 0.0, 1.0), (0.0, -1.0, 0.0, 0.0)),
+          ((0.5, 0.5, 0.0, 1.0), (-2.0, 1.0, 0.5, 0.0))]
+
+
+def get_random_triangles(count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    triangles = np.ones((count, 3, 4))
+    triangles[:, :, :3] = rng.uniform(-2, 2, (count, 3, 3))
+    return triangles
+
+
+def clip_scalar(plane_p: tuple, plane_n: tuple, triangles: np.ndarray) -> np.ndarray:
+    clipped = []
+    for triangle in triangles:
+        points = tuple(Vec4(*point.tolist()) for point in triangle)
+        for output in triangle_clip_against_plane(Vec4(*plane_p), Vec4(*plane_n), points):
+            clipped.append([[point.x, point.y, point.z, point.w] for point in output])
+    return np.array(clipped).reshape(-1, 3, 4)
+
+
+@pytest.mark.parametrize("seed, plane_p, plane_n", [(seed, *plane) for seed, plane in enumerate(PLANES)])
+def test_batched_clipping_matches_scalar_clipping(seed, plane_p, plane_n):
+    triangles = get_random_triangles(500, seed)
+
+    expected = clip_scalar(plane_p, plane_n, triangles)
+    clipped = triangles_clip_against_plane(Vector4.from_cords(*plane_p), Vector4.from_cords(*plane_n), triangles)
+
+    # Same count, order and vertex order, so winding is kept too
+    assert clipped.shape == expected.shape
+    np.testing.assert_allclose(clipped, expected, atol=1e-9)
+
+
+def test_batched_clipping_keeps_triangles_inside_and_drops_triangles_outside():
+    plane_p, plane_n = Vector4.from_cords(0, 0, 0, 1), Vector4.from_cords(0, 0, 1, 0)
+    inside = get_random_triangles(10, seed=1)
+    inside[:, :, 2] = np.abs(inside[:, :, 2]) + 0.1
+    outside = inside.copy()
+    outside[:, :, 2] *= -1
+
+    np.testing.assert_array_equal(triangles_clip_against_plane(plane_p, plane_n, inside), inside)
+    assert triangles_clip_against_plane(plane_p, plane_n, outside).shape == (0, 3, 4)
+
+
+def test_clipped_vertices_lie_on_the_plane():
+    plane_p, plane_n = Vector4.from_cords(0, 0, 0.5, 1), Vector4.from_cords(0, 0, 1, 0)
+    clipped = triangles_clip_against_plane(plane_p, plane_n, get_random_triangles(200, seed=2))
+
+    assert np.all(clipped[:, :, 2] >= 0.5 - 1e-9)
+
+
+def test_scalar_clipping_accepts_vector4_points():
+    plane_p, plane_n = PLANES[0]
+    triangles = get_random_triangles(100, seed=3)
+    expected = clip_scalar(plane_p, plane_n, triangles)
+
+    clipped = []
+    for triangle in triangles:
+        points = tuple(Vector4.from_cords(*point.tolist()) for point in triangle)
+        for output in triangle_clip_against_plane(Vector4.from_cords(*plane_p), Vector4.from_cords(*plane_n), points):
+            assert all(isinstance(point, Vector4) for point in output)
+            clipped.append([point.vector_np[:, 0] for point in output])
+
+    np.testing.assert_allclose(np.array(clipped).reshape(-1, 3, 4), expected, atol=1e-12)
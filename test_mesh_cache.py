@@ -0,0 +1,43 @@
+import os
+import shutil
+
+import numpy as np
+
+from mesh import Mesh
+from mesh_cache import load_mesh, get_binary_mesh_filename, get_binary_mesh_buffers, HEADER_SIZE, HEADER_TYPE
+
+CUBOID_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cuboid.txt")
+
+
+def get_cached_cuboid(directory) -> tuple[str, str]:
+    # A copy of cuboid.txt with its binary cache next to it
+    filename = str(directory / "cuboid.txt")
+    shutil.copy(CUBOID_FILENAME, filename)
+    load_mesh(filename)
+    return filename, get_binary_mesh_filename(filename)
+
+
+def assert_cuboid_loads(filename: str, binary_filename: str) -> None:
+    mesh = load_mesh(filename)
+    expected = Mesh.read_mesh_from_file(filename)
+    np.testing.assert_array_equal(mesh.vertices, expected.vertices)
+    np.testing.assert_array_equal(mesh.faces, expected.faces)
+    # The cache is readable again
+    get_binary_mesh_buffers(binary_filename)
+
+
+def test_truncated_cache_is_rebuilt(tmp_path):
+    filename, binary_filename = get_cached_cuboid(tmp_path)
+    with open(binary_filename, "r+b") as f:
+        f.truncate(HEADER_SIZE + 10)
+
+    assert_cuboid_loads(filename, binary_filename)
+
+
+def test_cache_of_another_format_version_is_rebuilt(tmp_path):
+    filename, binary_filename = get_cached_cuboid(tmp_path)
+    with open(binary_filename, "r+b") as f:
+        f.seek(HEADER_TYPE.fields["version"][1])
+        f.write(np.array([99], dtype="<u4").tobytes())
+
+    assert_cuboid_loads(filename, binary_filename)
@@ -0,0 +1,86 @@
+import numpy as np
+
+from camera import Camera
+from frame_stats import FrameStats
+from mesh import Mesh
+from quaternion import Quaternion
+from render_target import RenderTarget
+from renderer import render, RenderSettings
+from vector import Vec4
+
+WIDTH = 64
+HEIGHT = 64
+OCCLUDER_COLOR = (0, 0, 255)
+OCCLUDEE_COLOR = (255, 0, 0)
+
+
+def get_two_sided_mesh(vertices: np.ndarray, faces: np.ndarray, color: tuple[int, int, int]) -> Mesh:
+    # Every face in both windings, so that no face is culled as a back face
+    homogeneous = np.ones((vertices.shape[0], 4))
+    homogeneous[:, :3] = vertices
+    return Mesh(homogeneous, np.concatenate([faces, faces[:, ::-1]]), color)
+
+
+def get_box(center: tuple[float, float, float], half_size: float, color: tuple[int, int, int]) -> Mesh:
+    corners = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=float)
+    faces = np.array([[0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5], [0, 4, 5], [0, 5, 1],
+                      [2, 3, 7], [2, 7, 6], [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3]])
+    return get_two_sided_mesh(np.array(center) + corners * half_size, faces, color)
+
+
+def get_wall(near_depth: float, far_depth: float, color: tuple[int, int, int], half_size: float = 20) -> Mesh:
+    # Square around the view axis, its depth goes from near_depth at the bottom to far_depth at the top. The
+    # default size covers the whole view
+    vertices = np.array([[-half_size, -half_size, near_depth], [half_size, -half_size, near_depth],
+                         [half_size, half_size, far_depth], [-half_size, half_size, far_depth]], dtype=float)
+    return get_two_sided_mesh(vertices, np.array([[0, 1, 2], [0, 2, 3]]), color)
+
+
+def get_camera() -> Camera:
+    camera = Camera(WIDTH, HEIGHT)
+    camera.set_pose(Vec4(0, 0, 0, 1), Quaternion.identity(), 90)
+    return camera
+
+
+def render_occludee_pixels(shapes: list[Mesh], settings: RenderSettings) -> tuple[int, FrameStats]:
+    frame_stats = FrameStats()
+    render_target = render(get_camera(), shapes, RenderTarget(WIDTH, HEIGHT), frame_stats, settings=settings)
+    return int(np.count_nonzero(np.all(render_target.color_buffer == OCCLUDEE_COLOR, axis=2))), frame_stats
+
+
+def test_occludee_winning_a_depth_tie_is_not_culled():
+    # Both truncate to depth 8, which interpolates exactly. The occludee is drawn first and wins the tie
+    # in the depth test
+    shapes = [get_box((0, 0, 8.15), 0.05, OCCLUDEE_COLOR), get_wall(8.3, 8.3, OCCLUDER_COLOR)]
+
+    expected_pixels, _ = render_occludee_pixels(shapes, RenderSettings(level_of_detail=False))
+    pixels, frame_stats = render_occludee_pixels(shapes, RenderSettings(occlusion_culling=True,
+                                                                        level_of_detail=False))
+
+    assert expected_pixels > 0
+    assert pixels == expected_pixels
+    assert frame_stats.occluders == 1 and frame_stats.shapes_occluded == 0
+
+
+def test_occludee_behind_the_occluder_is_culled():
+    shapes = [get_box((0, 0, 9.5), 0.1, OCCLUDEE_COLOR), get_wall(6.3, 6.3, OCCLUDER_COLOR)]
+
+    pixels, frame_stats = render_occludee_pixels(shapes, RenderSettings(occlusion_culling=True,
+                                                                        level_of_detail=False))
+
+    assert pixels == 0
+    assert frame_stats.shapes_occluded == 1
+
+
+def test_occlusion_culling_keeps_shapes_visible_with_subpixel_rasterization():
+    # Behind the wall truncated to depths 5 and 8 the box would be hidden, but the wall is really behind it
+    shapes = [get_box((0, 0, 7.2), 0.15, OCCLUDEE_COLOR), get_wall(5.99, 8.99, OCCLUDER_COLOR, half_size=5)]
+
+    expected_pixels, _ = render_occludee_pixels(shapes, RenderSettings(level_of_detail=False,
+                                                                       subpixel_rasterization=True))
+    pixels, frame_stats = render_occludee_pixels(shapes, RenderSettings(occlusion_culling=True, level_of_detail=False,
+                                                                        subpixel_rasterization=True))
+
+    assert expected_pixels > 0
+    assert pixels == expected_pixels
+    assert frame_stats.shapes_occluded == 0
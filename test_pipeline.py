@@ -0,0 +1,28 @@
+import numpy as np
+
+from camera import Camera
+from mesh import Mesh
+from pipeline import TransformCache, update_shape
+from quaternion import Quaternion
+from vector import Vec4
+
+
+def get_wall_across_the_view() -> Mesh:
+    # Reaches far beyond every guard band, so its clipped triangles depend on the guard band
+    vertices = np.array([[-50, -50, 5, 1], [50, -50, 5, 1], [50, 50, 5, 1], [-50, 50, 5, 1]], dtype=float)
+    faces = np.array([[0, 1, 2], [0, 2, 3], [2, 1, 0], [3, 2, 0]])
+    return Mesh(vertices, faces, (255, 0, 0))
+
+
+def test_transform_cache_reuses_triangles_until_the_guard_band_changes():
+    camera = Camera(64, 64)
+    camera.set_pose(Vec4(0, 0, 0, 1), Quaternion.identity(), 90)
+    mesh = get_wall_across_the_view()
+    transform_cache = TransformCache()
+
+    triangles = transform_cache.update_shape(camera, mesh, guard_band=2.0)
+    assert transform_cache.update_shape(camera, mesh, guard_band=2.0) is triangles
+
+    narrow_triangles = transform_cache.update_shape(camera, mesh, guard_band=1.0)
+    np.testing.assert_array_equal(narrow_triangles, update_shape(camera, mesh, guard_band=1.0))
+    assert np.abs(narrow_triangles[:, :, :2]).max() <= 1 + 1e-9 < np.abs(triangles[:, :, :2]).max()
@@ -0,0 +1,132 @@
+import numpy as np
+
+from depth_buffer import DepthBuffer
+from drawing import draw_triangle
+from rasterizer import rasterize_triangles
+
+WIDTH = 64
+HEIGHT = 48
+# Relative difference allowed between the depths of both rasterizers
+DEPTH_TOLERANCE = 1e-12
+
+
+def rasterize_both(screen_triangles: np.ndarray,
+                   colors: np.ndarray,
+                   scissor: tuple[int, int, int, int] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Color and depth buffers of rasterize_triangles and of the scanline reference draw_triangle
+    color_buffer = np.zeros((WIDTH, HEIGHT, 3), dtype=np.uint8)
+    depth_buffer = DepthBuffer(WIDTH, HEIGHT)
+    rasterize_triangles(color_buffer, depth_buffer, screen_triangles, colors, scissor)
+
+    reference_color_buffer = np.zeros((WIDTH, HEIGHT, 3), dtype=np.uint8)
+    reference_depth_buffer = DepthBuffer(WIDTH, HEIGHT)
+    for triangle, color in zip(screen_triangles, colors):
+        draw_triangle(reference_color_buffer, reference_depth_buffer, *triangle.reshape(-1).tolist(),
+                      tuple(color.tolist()))
+    return color_buffer, depth_buffer.get_depths(), reference_color_buffer, reference_depth_buffer.get_depths()
+
+
+def get_random_colors(count: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.integers(1, 256, (count, 3), dtype=np.uint8)
+
+
+def assert_same_pixels(screen_triangles: np.ndarray, colors: np.ndarray) -> None:
+    # Coverage and colors are exact, draw_triangle steps the depth along spans and may round differently
+    color_buffer, depths, reference_color_buffer, reference_depths = rasterize_both(screen_triangles, colors)
+    np.testing.assert_array_equal(np.isfinite(depths), np.isfinite(reference_depths))
+    np.testing.assert_array_equal(color_buffer, reference_color_buffer)
+    np.testing.assert_allclose(depths, reference_depths, rtol=DEPTH_TOLERANCE)
+    assert np.any(np.isfinite(depths))
+
+
+def test_random_triangles_match_the_scanline_rasterizer():
+    rng = np.random.default_rng(0)
+    screen_triangles = np.empty((200, 3, 3))
+    screen_triangles[:, :, 0] = rng.uniform(0, WIDTH, (200, 3))
+    screen_triangles[:, :, 1] = rng.uniform(0, HEIGHT, (200, 3))
+    screen_triangles[:, :, 2] = rng.uniform(1, 100, (200, 3))
+    assert_same_pixels(screen_triangles, get_random_colors(200, rng))
+
+
+def test_triangles_sharing_edges_match_the_scanline_rasterizer():
+    # A fan and a grid of split quads on integer and fractional vertices, horizontal and sloped edges
+    rng = np.random.default_rng(1)
+    center = np.array([WIDTH / 2, HEIGHT / 2, 0.0])
+    angles = np.linspace(0, 2 * np.pi, 13)
+    ring = np.stack([center[0] + 20 * np.cos(angles), center[1] + 20 * np.sin(angles), np.zeros(13)], axis=1)
+    fan = np.array([[center, ring[i], ring[i + 1]] for i in range(12)])
+
+    xs, ys = np.meshgrid(np.linspace(2, WIDTH - 2, 6), np.linspace(2.5, HEIGHT - 2.5, 5), indexing='ij')
+    points = np.stack([xs, ys, np.zeros(xs.shape)], axis=2)
+    quads = []
+    for i in range(xs.shape[0] - 1):
+        for j in range(xs.shape[1] - 1):
+            quads.append([points[i, j], points[i + 1, j], points[i + 1, j + 1]])
+            quads.append([points[i, j], points[i + 1, j + 1], points[i, j + 1]])
+
+    for screen_triangles in (fan, np.array(quads)):
+        # Along a shared edge both triangles have the same depth and rounding would pick the winner, so every
+        # triangle gets a flat depth of its own
+        screen_triangles[:, :, 2] = np.arange(screen_triangles.shape[0])[:, np.newaxis] + 5
+        assert_same_pixels(screen_triangles, get_random_colors(screen_triangles.shape[0], rng))
+
+
+def test_triangles_reaching_off_screen_are_scissored_like_the_scanline_rasterizer():
+    rng = np.random.default_rng(2)
+    screen_triangles = np.empty((100, 3, 3))
+    screen_triangles[:, :, 0] = rng.uniform(-WIDTH, 2 * WIDTH, (100, 3))
+    screen_triangles[:, :, 1] = rng.uniform(-HEIGHT, 2 * HEIGHT, (100, 3))
+    screen_triangles[:, :, 2] = rng.uniform(1, 100, (100, 3))
+    # Triangles entirely off screen draw nothing
+    screen_triangles[:5, :, 0] += 3 * WIDTH
+    assert_same_pixels(screen_triangles, get_random_colors(100, rng))
+
+
+def test_scissor_limits_the_written_pixels():
+    screen_triangles = np.array([[[-10.0, -10.0, 5.0], [2 * WIDTH, -10.0, 5.0], [-10.0, 2 * HEIGHT, 5.0]]])
+    color_buffer = np.zeros((WIDTH, HEIGHT, 3), dtype=np.uint8)
+    depth_buffer = DepthBuffer(WIDTH, HEIGHT)
+    scissor = (10, 5, 20, 15)
+
+    pixels_tested, pixels_written = rasterize_triangles(color_buffer, depth_buffer, screen_triangles,
+                                                        (255, 0, 0), scissor)
+
+    covered = np.any(color_buffer != 0, axis=2)
+    expected = np.zeros((WIDTH, HEIGHT), dtype=bool)
+    expected[10:21, 5:16] = True
+    np.testing.assert_array_equal(covered, expected)
+    assert pixels_tested == pixels_written == 11 * 11
+
+
+def get_subpixel_coverage_counts(screen_triangles: np.ndarray) -> np.ndarray:
+    # Number of triangles covering each pixel, every triangle rasterized alone into its own depth buffer
+    counts = np.zeros((WIDTH, HEIGHT), dtype=int)
+    for triangle in screen_triangles:
+        depth_buffer = DepthBuffer(WIDTH, HEIGHT)
+        rasterize_triangles(None, depth_buffer, triangle[np.newaxis], (255, 0, 0), subpixel=True)
+        counts += np.isfinite(depth_buffer.get_depths())
+    return counts
+
+
+def test_subpixel_triangles_sharing_an_edge_write_each_pixel_once():
+    # Quads whose vertices and diagonals pass through pixel centers, where the top-left rule picks the owner
+    quads = [np.array([[4.5, 2.5], [36.5, 2.5], [36.5, 26.5], [4.5, 26.5]]),
+             np.array([[30.5, 4.5], [50.5, 24.5], [30.5, 44.5], [10.5, 24.5]]),
+             np.array([[2.25, 30.5], [20.5, 33.0], [26.5, 45.5], [6.5, 44.125]])]
+    for i, quad in enumerate(quads):
+        points = np.concatenate([quad, np.full((4, 1), 5.0)], axis=1)
+        split_along_ac = np.array([points[[0, 1, 2]], points[[0, 2, 3]]])
+        split_along_bd = np.array([points[[0, 1, 3]], points[[1, 2, 3]]])
+
+        counts = get_subpixel_coverage_counts(split_along_ac)
+        # No pixel is covered twice, and the other split covers the same pixels, so the diagonal leaves no gap
+        assert counts.max() == 1
+        np.testing.assert_array_equal(counts, get_subpixel_coverage_counts(split_along_bd))
+        if i == 0:
+            # The axis-aligned quad covers the pixels of its half-open rectangle
+            assert counts.sum() == 32 * 24
+
+        depth_buffer = DepthBuffer(WIDTH, HEIGHT)
+        pixels_tested, pixels_written = rasterize_triangles(None, depth_buffer, split_along_ac, (255, 0, 0),
+                                                            subpixel=True)
+        assert pixels_tested == pixels_written == counts.sum()
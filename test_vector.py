@@ -0,0 +1,17 @@
+import math
+
+from vector import Vector4, Vec4
+
+
+def test_both_vector_types_normalize_to_unit_length():
+    vector = Vector4.from_cords(3, -4, 12, 1).get_normalized_xyz()
+    vec = Vec4(3, -4, 12, 1).get_normalized_xyz()
+
+    assert math.isclose(math.sqrt(Vector4.dot_product_xyz(vector, vector)), 1)
+    assert [vector.get_x(), vector.get_y(), vector.get_z(), vector.get_w()] == [vec.x, vec.y, vec.z, vec.w]
+
+
+def test_vec4_converts_to_and_from_vector4():
+    vector = Vector4.from_cords(1.5, -2, 0.25, 1)
+
+    assert Vec4.from_vector4(vector).to_vector4().vector_np.tolist() == vector.vector_np.tolist()
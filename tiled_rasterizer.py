@@ -0,0 +1,123 @@
+import os
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from depth_buffer import DepthBuffer, DEPTH_FLOAT64, STORAGE_TYPES
+from rasterizer import rasterize_triangles, get_triangle_bounds
+from render_target import RenderTarget
+
+TILE_SIZE = 64
+
+# Buffers of the current worker process, attached to the shared memory in init_worker
+WORKER_BUFFERS: dict[str, np.ndarray] = {}
+
+
+def attach_buffers(color_memory: SharedMemory,
+                   depth_memory: SharedMemory,
+                   width: int,
+                   height: int,
+                   depth_precision: str) -> tuple[np.ndarray, DepthBuffer]:
+    # The depth buffer is never clear-free, the frame tags would have to be shared as well
+    color_buffer = np.ndarray((width, height, 3), dtype=np.uint8, buffer=color_memory.buf)
+    depth_values = np.ndarray((height + 1, width + 1), dtype=STORAGE_TYPES[depth_precision], buffer=depth_memory.buf)
+    return color_buffer, DepthBuffer(width, height, depth_precision, values=depth_values)
+
+
+def init_worker(color_memory_name: str, depth_memory_name: str, width: int, height: int, depth_precision: str) -> None:
+    color_memory = SharedMemory(name=color_memory_name)
+    depth_memory = SharedMemory(name=depth_memory_name)
+    # Keep the handles alive, the arrays only borrow their buffers
+    WORKER_BUFFERS["memory"] = (color_memory, depth_memory)
+    WORKER_BUFFERS["color"], WORKER_BUFFERS["depth"] = attach_buffers(color_memory, depth_memory, width, height,
+                                                                      depth_precision)
+
+
+def rasterize_tile(task: tuple[tuple[int, int, int, int], list[tuple[np.ndarray, tuple[int, int, int]]], bool]
+                   ) -> tuple[int, int]:
+    scissor, batches, subpixel = task
+    pixels_tested = 0
+    pixels_written = 0
+    for screen_triangles, color in batches:
+        tested, written = rasterize_triangles(WORKER_BUFFERS["color"], WORKER_BUFFERS["depth"],
+                                              screen_triangles, color, scissor, subpixel)
+        pixels_tested += tested
+        pixels_written += written
+    return pixels_tested, pixels_written
+
+
+class TiledRasterizer:
+    # Bins screen triangles into tiles and rasterizes the tiles in worker processes. Tiles never overlap
+    # and keep the submission order of their triangles, so the image is the same as rasterize_triangles'
+    width: int
+    height: int
+    tile_size: int
+    workers: int
+    depth_precision: str
+
+    render_target: RenderTarget
+
+    def __init__(self,
+                 width: int,
+                 height: int,
+                 tile_size: int = TILE_SIZE,
+                 workers: int = None,
+                 depth_precision: str = DEPTH_FLOAT64):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.depth_precision = depth_precision
+
+        self.color_memory = SharedMemory(create=True, size=width * height * 3)
+        self.depth_memory = SharedMemory(create=True, size=(width + 1) * (height + 1)
+                                         * np.dtype(STORAGE_TYPES[depth_precision]).itemsize)
+        self.render_target = RenderTarget(width, height, *attach_buffers(self.color_memory, self.depth_memory, width,
+                                                                         height, depth_precision))
+        self.pool = Pool(self.workers, initializer=init_worker,
+                         initargs=(self.color_memory.name, self.depth_memory.name, width, height, depth_precision))
+
+    def __enter__(self) -> 'TiledRasterizer':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+        del self.render_target
+        self.color_memory.close()
+        self.color_memory.unlink()
+        self.depth_memory.close()
+        self.depth_memory.unlink()
+
+    def get_tiles(self) -> list[tuple[int, int, int, int]]:
+        return [(x, y, min(x + self.tile_size, self.width) - 1, min(y + self.tile_size, self.height) - 1)
+                for y in range(0, self.height, self.tile_size)
+                for x in range(0, self.width, self.tile_size)]
+
+    def bin_triangles(self, batches: list[tuple[np.ndarray, tuple[int, int, int]]]
+                      ) -> list[tuple[tuple[int, int, int, int], list[tuple[np.ndarray, tuple[int, int, int]]]]]:
+        bounds = [get_triangle_bounds(screen_triangles) for screen_triangles, _ in batches]
+
+        tasks = []
+        for tile in self.get_tiles():
+            tile_min_x, tile_min_y, tile_max_x, tile_max_y = tile
+            tile_batches = []
+            for (screen_triangles, color), (min_x, min_y, max_x, max_y) in zip(batches, bounds):
+                overlaps = (min_x <= tile_max_x) & (max_x >= tile_min_x) & (min_y <= tile_max_y) & (max_y >= tile_min_y)
+                if np.any(overlaps):
+                    tile_batches.append((screen_triangles[overlaps],
+                                         color[overlaps] if isinstance(color, np.ndarray) else color))
+            if tile_batches:
+                tasks.append((tile, tile_batches))
+        return tasks
+
+    def rasterize(self, batches: list[tuple[np.ndarray, tuple[int, int, int]]], subpixel: bool = False
+                  ) -> tuple[int, int]:
+        # Batches of (N, 3, 3) screen triangles with their color or (N, 3) triangle colors, in drawing order
+        results = self.pool.map(rasterize_tile, [(tile, tile_batches, subpixel)
+                                                 for tile, tile_batches in self.bin_triangles(batches)])
+        return sum(tested for tested, _ in results), sum(written for _, written in results)
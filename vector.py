@@ -1,3 +1,5 @@
+import math
+
 import numpy as np
 
 NUMPY_ARRAY_TYPE = float
@@ -26,7 +28,7 @@ class Vector4:
 
     def get_normalized_xyz(self) -> 'Vector4':
         normalized = self.copy()
-        normalized.vector_np[:3] /= self.dot_product_xyz(normalized, normalized)
+        normalized.vector_np[:3] /= math.sqrt(self.dot_product_xyz(normalized, normalized))
 
         return normalized
 
@@ -87,3 +89,83 @@ class Vector4:
 
     def set_offset(self, offset: 'Vector4') -> None:
         self.vector_np[:3] += offset.vector_np[:3]
+
+
+class Vec4:
+    # Scalar counterpart of Vector4 for per-object math like camera updates and single triangle clipping, where
+    # allocating NumPy arrays costs more than the arithmetic. Operations return new vectors and, like Vector4's,
+    # only touch xyz. Conversions to and from NumPy are explicit and only needed at the edge of batch paths
+    __slots__ = ("x", "y", "z", "w")
+    x: float
+    y: float
+    z: float
+    w: float
+
+    def __init__(self, x: float, y: float, z: float, w: float):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.w = w
+
+    def __str__(self):
+        return f"[{self.x} {self.y} {self.z} {self.w}]"
+
+    @staticmethod
+    def from_numpy(vector_np: np.ndarray) -> 'Vec4':
+        # Accepts (4,) and (4, 1) arrays
+        x, y, z, w = vector_np.reshape(4).tolist()
+        return Vec4(x, y, z, w)
+
+    @staticmethod
+    def from_vector4(vector: Vector4) -> 'Vec4':
+        return Vec4.from_numpy(vector.vector_np)
+
+    def to_numpy(self) -> np.ndarray:
+        return np.array([[self.x], [self.y], [self.z], [self.w]], dtype=NUMPY_ARRAY_TYPE)
+
+    def to_vector4(self) -> Vector4:
+        return Vector4(self.to_numpy())
+
+    def copy(self) -> 'Vec4':
+        return Vec4(self.x, self.y, self.z, self.w)
+
+    def get_normalized_xyz(self) -> 'Vec4':
+        length = math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+        return Vec4(self.x / length, self.y / length, self.z / length, self.w)
+
+    @staticmethod
+    def dot_product_xyz(a: 'Vec4', b: 'Vec4') -> float:
+        return a.x * b.x + a.y * b.y + a.z * b.z
+
+    @staticmethod
+    def cross_product_xyz(a: 'Vec4', b: 'Vec4') -> 'Vec4':
+        return Vec4(a.y * b.z - a.z * b.y,
+                    a.z * b.x - a.x * b.z,
+                    a.x * b.y - a.y * b.x,
+                    1)
+
+    def __add__(self, other: 'Vec4') -> 'Vec4':
+        return Vec4(self.x + other.x, self.y + other.y, self.z + other.z, self.w)
+
+    def __sub__(self, other: 'Vec4') -> 'Vec4':
+        return Vec4(self.x - other.x, self.y - other.y, self.z - other.z, self.w)
+
+    def __mul__(self, other: float) -> 'Vec4':
+        return Vec4(self.x * other, self.y * other, self.z * other, self.w)
+
+    def __truediv__(self, other: float) -> 'Vec4':
+        if other == 0:
+            raise ValueError("Division by zero is not allowed")
+        return Vec4(self.x / other, self.y / other, self.z / other, self.w)
+
+    def get_x(self) -> float:
+        return self.x
+
+    def get_y(self) -> float:
+        return self.y
+
+    def get_z(self) -> float:
+        return self.z
+
+    def get_w(self) -> float:
+        return self.w